@@ -1,9 +1,14 @@
-from typing import Optional, List
+from typing import Any, AsyncIterator, Optional, List, Dict, Iterator, Tuple
 from datetime import datetime
+import threading
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, BaseMessage, SystemMessage, ToolMessage, trim_messages
+from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import create_react_agent
 
 # Tools
@@ -11,84 +16,216 @@ from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
 from langchain_community.tools.tavily_search.tool import TavilySearchResults
 from tools.real_estate_tools import RealEstateReserveTool, RealEstateSearchTool
 from tools.feng_shui_tools import FengShuiRecommendationTool
+from tools.web_search_tools import CachedWebSearchTool
+from functions.web_search_cache import WEB_SEARCH_CACHE_ENABLED
+
+# Checkpoint storage
+from functions.checkpointer import create_checkpointer
 
 #  SQL database
-from functions.postgresql_functions import save_data , get_user_messages
+from functions.postgresql_functions import save_data , get_user_messages, asave_data, aget_user_messages
+
+# Tracing
+from functions.tracing import span, traced, trace_request, tracing_callbacks
+
+# Answers reused for near-identical questions, see functions/response_cache.py
+from functions.response_cache import RESPONSE_CACHE_ENABLED, response_cache
+
+LINE_SYSTEM_PROMPT = '你是一位房地產輔助機器人負責協助使用者，不要使用 Markdown 語法'
+
+# Threads now live as long as the process, so only the most recent messages
+# of a conversation are sent to the model
+MAX_CONTEXT_MESSAGES = 40
+
+# Compiled agents shared by every request of this process
+_AGENT_REGISTRY: Dict[str, CompiledGraph] = {}
+_AGENT_REGISTRY_LOCK = threading.Lock()
 
-def create_agent():
+def trim_context(state) -> List[BaseMessage]:
+    """Keep the system prompt plus the latest messages, always starting on a user message."""
+    return trim_messages(
+        state["messages"],
+        max_tokens=MAX_CONTEXT_MESSAGES,
+        token_counter=len,
+        strategy="last",
+        start_on="human",
+        include_system=True,
+    )
+
+@traced("create_agent")
+def create_agent(
+    model: Optional[BaseChatModel] = None,
+    web_search_tool: Optional[BaseTool] = None,
+    checkpointer: Optional[BaseCheckpointSaver] = None
+) -> CompiledGraph:
     
     # Memory with session ID
-    memory = MemorySaver()
+    memory = checkpointer if checkpointer is not None else MemorySaver()
     # Load model (gpt-4o)
-    model = ChatOpenAI(model="gpt-4o",verbose = True)
+    if model is None:
+        model = ChatOpenAI(model="gpt-4o",verbose = True)
     # Load tools
-    search = TavilySearchAPIWrapper()
-    tavily_tool = TavilySearchResults(api_wrapper=search, max_results=2)
-    tools = [RealEstateReserveTool(), RealEstateSearchTool(), FengShuiRecommendationTool(),tavily_tool]
-    agent_executor = create_react_agent(model, tools, checkpointer=memory)
+    if web_search_tool is None:
+        search = TavilySearchAPIWrapper()
+        web_search_tool = TavilySearchResults(api_wrapper=search, max_results=2)
+        # Repeated queries are answered from the cache instead of a new Tavily call
+        if WEB_SEARCH_CACHE_ENABLED:
+            web_search_tool = CachedWebSearchTool.wrap(web_search_tool)
+    tools = [RealEstateReserveTool(), RealEstateSearchTool(), FengShuiRecommendationTool(), web_search_tool]
+    agent_executor = create_react_agent(model, tools, checkpointer=memory, state_modifier=trim_context)
     
     return agent_executor
 
+def get_agent(name: str = "default") -> CompiledGraph:
+    """
+    Return the process-wide compiled agent, building it on first use.
+
+    The model, its HTTP client, the tools and the compiled graph are shared by
+    every request; conversations are only isolated by the `thread_id` config.
+    Thread state lives in the checkpointer chosen by CHECKPOINTER_BACKEND.
+    """
+    agent = _AGENT_REGISTRY.get(name)
+    if agent is None:
+        with _AGENT_REGISTRY_LOCK:
+            agent = _AGENT_REGISTRY.get(name)
+            if agent is None:
+                agent = create_agent(checkpointer=create_checkpointer())
+                _AGENT_REGISTRY[name] = agent
+    return agent
+
+def register_agent(agent: CompiledGraph, name: str = "default") -> None:
+    """Install a prebuilt agent (e.g. one with a stub model) under a registry name."""
+    with _AGENT_REGISTRY_LOCK:
+        _AGENT_REGISTRY[name] = agent
+
+def agent_config(thread_id: str) -> Dict[str, Any]:
+    """Run config of a conversation, with the tracing callbacks when tracing is enabled."""
+    return {"configurable": {"thread_id": thread_id}, "callbacks": tracing_callbacks()}
+
+def _token_text(message: BaseMessage) -> str:
+    # Only text deltas count as tokens, tool call chunks arrive as tool_start later
+    if isinstance(message, AIMessageChunk) and isinstance(message.content, str):
+        return message.content
+    return ""
+
+def stream_agent(agent: CompiledGraph, inputs: Dict[str, Any], config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Run one agent turn and yield its progress as it happens.
+
+    Every event is a dict with an "event" key:
+      token       {"content"}        incremental text of the model
+      tool_start  {"name", "args"}   the model called a tool
+      tool_end    {"name", "output"} the tool answered
+      final       {"content"}        the answer of the turn, always last
+    Tokens only arrive from models that support streaming; others just
+    produce the final event.
+    """
+    answer = ""
+    for mode, chunk in agent.stream(inputs, config, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            message, metadata = chunk
+            token = _token_text(message) if metadata.get("langgraph_node") == "agent" else ""
+            if token:
+                yield {"event": "token", "content": token}
+            continue
+
+        for update in chunk.values():
+            for message in (update or {}).get("messages", []):
+                if isinstance(message, ToolMessage):
+                    yield {"event": "tool_end", "name": message.name, "output": message.content}
+                elif isinstance(message, AIMessage):
+                    for call in message.tool_calls:
+                        yield {"event": "tool_start", "name": call["name"], "args": call["args"]}
+                    answer = message.content
+    yield {"event": "final", "content": answer}
+
+async def astream_agent(agent: CompiledGraph, inputs: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """Coroutine version of stream_agent, built on astream_events; yields the same events."""
+    answer = ""
+    async for event in agent.astream_events(inputs, config, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            token = _token_text(event["data"]["chunk"])
+            if token:
+                yield {"event": "token", "content": token}
+        elif kind == "on_tool_start":
+            yield {"event": "tool_start", "name": event["name"], "args": event["data"].get("input")}
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            yield {"event": "tool_end", "name": event["name"], "output": getattr(output, "content", output)}
+        elif kind == "on_chain_end" and not event["parent_ids"]:
+            # End of the graph run itself, its output is the final state
+            answer = event["data"]["output"]["messages"][-1].content
+    yield {"event": "final", "content": answer}
+
 def run_agent(history: Optional[List[BaseMessage]] = None):
-    agent = create_agent()
+    agent = get_agent()
     print('Agent is now running')
 
     # Configuration for session ID
-    config = {"configurable": {"thread_id": 'tester'}}
+    config = agent_config('tester')
+
+    # The tester thread is durable, the system prompt is only added once to a new thread
+    if not agent.get_state(config).values.get("messages"):
+        sys_prompt = '你是一位房地產輔助機器人負責協助使用者'
+        agent.update_state(config, {"messages": [SystemMessage(content=sys_prompt)]})
 
     # 如果有提供歷史消息，將它們更新到代理的內存中
     if history:
         agent.update_state(config, {"messages": history})
-    
-    sys_prompt = '你是一位房地產輔助機器人負責協助使用者'
-    SystemMessage(content=sys_prompt)
-    agent.update_state(config, {"messages": sys_prompt})
 
     while True:
         question = input("Please enter your question (or 'Q' to quit): ")
         if question.upper() == "Q":
             break
 
-        # Invoke the agent with the provided session ID
-        response = agent.invoke({"messages": [HumanMessage(content=question)]}, config)
-        if response["messages"][-1].tool_calls:
-            print(response["messages"][-1].tool_calls)
-        print(response["messages"][-1].content)  # Print the agent's response
+        # Stream the turn, tokens are printed as soon as the model produces them
+        streamed = False
+        for event in stream_agent(agent, {"messages": [HumanMessage(content=question)]}, config):
+            if event["event"] == "token":
+                streamed = True
+                print(event["content"], end="", flush=True)
+            elif event["event"] == "tool_start":
+                print(f"[{event['name']}] {event['args']}")
+            elif event["event"] == "final":
+                print("" if streamed else event["content"])  # Print the agent's response
 
 
-def run_line_agent(user_id: str, question: str, timestamp: int):
-
-    # Initialize agent
-    agent = create_agent()
-    config = {"configurable": {"thread_id": user_id}}
-    
-    # Load chat history from the database
-    initial_history = []
-    chat_history = get_user_messages(user_id)
+def _initial_history(chat_history) -> List[BaseMessage]:
+    initial_history = [SystemMessage(content=LINE_SYSTEM_PROMPT)]
     # chat_history maximum numbers is 5 (can be adjust in get_user_messages() sql lang)
     if chat_history is not None :
-        for row_data in chat_history:
+        # Rows come back newest first
+        for row_data in reversed(chat_history):
             initial_history.append(HumanMessage(content=row_data[0]))
             initial_history.append(AIMessage(content=row_data[1]))
     else:
         print("No sufficient history messages from this user")
+    return initial_history
 
-    # Update agent state with initial chat history if available
-    if initial_history:
-        agent.update_state(config, {"messages": initial_history})
-    else:
-        agent.update_state(config, {"messages": []})
+def _has_earlier_turns(messages: List[BaseMessage]) -> bool:
+    return any(isinstance(message, HumanMessage) for message in messages)
 
-    # Load system prompt and add it to the chat history
-    sys_prompt = '你是一位房地產輔助機器人負責協助使用者，不要使用 Markdown 語法'
-    initial_history.append(SystemMessage(content=sys_prompt))
-    agent.update_state(config, {"messages": initial_history})
+def _prepare_line_thread(agent: CompiledGraph, config: Dict[str, Any], user_id: str) -> bool:
+    """Rehydrate the thread if needed; returns True if it holds earlier turns of the user."""
+    messages = agent.get_state(config).values.get("messages")
+    # Only a thread without any checkpoint needs its history rehydrated from Postgres
+    if not messages:
+        with span("rehydrate_history"):
+            messages = _initial_history(get_user_messages(user_id))
+            agent.update_state(config, {"messages": messages})
+    return _has_earlier_turns(messages)
 
-    # Process user question
-    response = agent.invoke({"messages": [HumanMessage(content=question)]}, config)
-    agent_answer = response["messages"][-1].content
+async def _aprepare_line_thread(agent: CompiledGraph, config: Dict[str, Any], user_id: str) -> bool:
+    state = await agent.aget_state(config)
+    messages = state.values.get("messages")
+    if not messages:
+        with span("rehydrate_history"):
+            messages = _initial_history(await aget_user_messages(user_id))
+            await agent.aupdate_state(config, {"messages": messages})
+    return _has_earlier_turns(messages)
 
-    # Save user message and agent response to the database
+def _line_records(user_id: str, question: str, timestamp: int, agent_answer: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     user_message = {
         'user_message': question,
         'user_id': user_id,
@@ -97,10 +234,148 @@ def run_line_agent(user_id: str, question: str, timestamp: int):
     agent_message = {
         'agent_message': agent_answer
     }
-    save_data(user=user_message, agent=agent_message)
+    return user_message, agent_message
+
+def _turn_tool_calls(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    # Tool calls made since the question of this turn
+    calls = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, AIMessage):
+            calls.extend(message.tool_calls)
+    return calls
+
+def _cached_exchange(question: str, answer: str) -> Dict[str, Any]:
+    # Written as the agent node, so the thread ends the turn like a real answer
+    return {"messages": [HumanMessage(content=question), AIMessage(content=answer)]}
+
+def _cache_scope(user_id: str, earlier_turns: bool) -> Optional[str]:
+    # An answer given with earlier messages in the thread may lean on them, it is only reused for this user
+    return user_id if earlier_turns else None
+
+def _cached_answer(agent: CompiledGraph, config: Dict[str, Any], question: str, user_id: str, earlier_turns: bool) -> Optional[str]:
+    """Answer from the response cache, recorded in the thread as if the agent had given it."""
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    with span("response_cache.lookup"):
+        answer = response_cache.lookup(question, _cache_scope(user_id, earlier_turns))
+    if answer is not None:
+        agent.update_state(config, _cached_exchange(question, answer), as_node="agent")
+    return answer
+
+async def _acached_answer(agent: CompiledGraph, config: Dict[str, Any], question: str, user_id: str, earlier_turns: bool) -> Optional[str]:
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    with span("response_cache.lookup"):
+        answer = response_cache.lookup(question, _cache_scope(user_id, earlier_turns))
+    if answer is not None:
+        await agent.aupdate_state(config, _cached_exchange(question, answer), as_node="agent")
+    return answer
+
+def _remember_answer(question: str, answer: str, tool_calls: List[Dict[str, Any]], user_id: str, earlier_turns: bool) -> None:
+    if RESPONSE_CACHE_ENABLED:
+        response_cache.store(question, answer, tool_calls, _cache_scope(user_id, earlier_turns))
+
+def run_line_agent(user_id: str, question: str, timestamp: int):
+
+    # Reuse the shared agent, per-user state is kept under thread_id
+    agent = get_agent()
+    config = agent_config(user_id)
+    with trace_request(), span("line_turn"):
+        earlier_turns = _prepare_line_thread(agent, config, user_id)
+
+        # Process user question, a cached answer skips the model entirely
+        agent_answer = _cached_answer(agent, config, question, user_id, earlier_turns)
+        if agent_answer is None:
+            response = agent.invoke({"messages": [HumanMessage(content=question)]}, config)
+            agent_answer = response["messages"][-1].content
+            _remember_answer(question, agent_answer, _turn_tool_calls(response["messages"]), user_id, earlier_turns)
+
+        # Save user message and agent response to the database
+        user_message, agent_message = _line_records(user_id, question, timestamp, agent_answer)
+        save_data(user=user_message, agent=agent_message)
 
     return agent_answer
 
+async def arun_line_agent(user_id: str, question: str, timestamp: int):
+    """
+    Coroutine version of run_line_agent.
+
+    Uses the async graph API, async tools and the asyncpg pool, so many LINE
+    conversations can be served concurrently on one event loop.
+    """
+    agent = get_agent()
+    config = agent_config(user_id)
+    with trace_request(), span("line_turn"):
+        earlier_turns = await _aprepare_line_thread(agent, config, user_id)
+
+        # Process user question, a cached answer skips the model entirely
+        agent_answer = await _acached_answer(agent, config, question, user_id, earlier_turns)
+        if agent_answer is None:
+            response = await agent.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+            agent_answer = response["messages"][-1].content
+            _remember_answer(question, agent_answer, _turn_tool_calls(response["messages"]), user_id, earlier_turns)
+
+        # Save user message and agent response to the database
+        user_message, agent_message = _line_records(user_id, question, timestamp, agent_answer)
+        await asave_data(user=user_message, agent=agent_message)
+
+    return agent_answer
+
+def stream_line_agent(user_id: str, question: str, timestamp: int) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming version of run_line_agent, yields the events of stream_agent.
+
+    The turn is saved to the database before the final event is yielded.
+    """
+    agent = get_agent()
+    config = agent_config(user_id)
+    # Traced like run_line_agent; the span stays open while the caller consumes the events
+    with trace_request(), span("line_turn"):
+        earlier_turns = _prepare_line_thread(agent, config, user_id)
+
+        cached = _cached_answer(agent, config, question, user_id, earlier_turns)
+        if cached is not None:
+            user_message, agent_message = _line_records(user_id, question, timestamp, cached)
+            save_data(user=user_message, agent=agent_message)
+            yield {"event": "final", "content": cached}
+            return
+
+        tool_calls = []
+        for event in stream_agent(agent, {"messages": [HumanMessage(content=question)]}, config):
+            if event["event"] == "tool_start":
+                tool_calls.append(event)
+            elif event["event"] == "final":
+                _remember_answer(question, event["content"], tool_calls, user_id, earlier_turns)
+                user_message, agent_message = _line_records(user_id, question, timestamp, event["content"])
+                save_data(user=user_message, agent=agent_message)
+            yield event
+
+async def astream_line_agent(user_id: str, question: str, timestamp: int) -> AsyncIterator[Dict[str, Any]]:
+    """Coroutine version of stream_line_agent, used by line_server to acknowledge long turns early."""
+    agent = get_agent()
+    config = agent_config(user_id)
+    with trace_request(), span("line_turn"):
+        earlier_turns = await _aprepare_line_thread(agent, config, user_id)
+
+        cached = await _acached_answer(agent, config, question, user_id, earlier_turns)
+        if cached is not None:
+            user_message, agent_message = _line_records(user_id, question, timestamp, cached)
+            await asave_data(user=user_message, agent=agent_message)
+            yield {"event": "final", "content": cached}
+            return
+
+        tool_calls = []
+        async for event in astream_agent(agent, {"messages": [HumanMessage(content=question)]}, config):
+            if event["event"] == "tool_start":
+                tool_calls.append(event)
+            elif event["event"] == "final":
+                _remember_answer(question, event["content"], tool_calls, user_id, earlier_turns)
+                user_message, agent_message = _line_records(user_id, question, timestamp, event["content"])
+                await asave_data(user=user_message, agent=agent_message)
+            yield event
+
 def test_line_agent():
     user_id = 'Baka!>///<'
 
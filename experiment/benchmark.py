@@ -0,0 +1,267 @@
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from pathlib import Path
+import argparse
+import tempfile
+import platform
+import random
+import json
+import time
+import sys
+import io
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+sys.path.insert(0, str(ROOT))  # for import modules
+
+DATA_DIR = ROOT / 'data'
+BENCHMARK_DIR = DATA_DIR / 'benchmarks'
+
+# Catalog sizes benchmarked by default; 1e6 and 1e7 work too but loading them needs minutes and several GB of RAM
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+# A metric more than this fraction worse than the baseline is reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+from initial.house_data_set import generate_house_chunks, generate_house_records, load_city_county_to_pandas, write_house_data
+from functions.feng_shui_functions import get_fengshui_advice
+from functions.search_log import SearchLogWriter
+from functions.compiled_catalog import compile_house_catalog, get_compiled_house_catalog
+import functions.real_estate_functions as real_estate_functions
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of a list of durations in seconds, reported in microseconds."""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+    return {
+        "p50_us": round(pick(0.50) * 1e6, 2),
+        "p95_us": round(pick(0.95) * 1e6, 2),
+        "p99_us": round(pick(0.99) * 1e6, 2),
+        "max_us": round(ordered[-1] * 1e6, 2),
+    }
+
+
+def time_calls(call: Callable[[int], Any], iterations: int, before: Optional[Callable[[], None]] = None) -> List[float]:
+    samples = []
+    for i in range(iterations):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        call(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def write_catalog(path: Path, size: int, seed: int) -> None:
+    # Streamed in chunks, so even 1e7 houses never sit in memory as dicts here
+    with redirect_stdout(io.StringIO()):
+        write_house_data(generate_house_chunks(total=size, distribution="uniform", seed=seed), path, "json")
+
+
+def bench_search_house(workdir: Path, size: int, iterations: int, seed: int) -> Dict[str, Any]:
+    """search_house on a synthetic catalog of `size` houses: load time, cold (uncached) and warm latencies, JSON and compiled."""
+    catalog_file = workdir / f"house_{size}.json"
+    write_catalog(catalog_file, size, seed)
+    real_estate_functions.HOUSE_FILE = catalog_file
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        real_estate_functions.get_house_catalog(catalog_file).refresh()
+    load_s = time.perf_counter() - started
+
+    df = load_city_county_to_pandas()
+    areas = list(zip(df["CityName"], df["AreaName"]))
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(iterations):
+        city, district = rng.choice(areas)
+        lower = rng.randint(0, 9000)
+        queries.append((city, district, lower + rng.randint(100, 2000), lower))
+
+    search = lambda i: real_estate_functions.search_house(*queries[i])
+    cold = time_calls(search, iterations, before=real_estate_functions.search_cache.clear)
+    warm = time_calls(search, iterations)
+    results = {"catalog_load_s": round(load_s, 3), "cold": percentiles(cold), "warm": percentiles(warm)}
+
+    # Whole-city queries, a heap merge over every district of the city
+    city_search = lambda i: real_estate_functions.search_house_page(queries[i][0], None, *queries[i][2:], limit=10)
+    cold = time_calls(city_search, iterations, before=real_estate_functions.search_cache.clear)
+    results["city_wide"] = {"cold": percentiles(cold)}
+
+    # Same queries against the memory-mapped build of the catalog
+    compiled_file = workdir / f"house_{size}.catalog"
+    with redirect_stdout(io.StringIO()):
+        compile_house_catalog(catalog_file, compiled_file)
+        started = time.perf_counter()
+        get_compiled_house_catalog(compiled_file).refresh()
+        map_s = time.perf_counter() - started
+    real_estate_functions.COMPILED_HOUSE_FILE = compiled_file
+
+    cold = time_calls(search, iterations, before=real_estate_functions.search_cache.clear)
+    results["compiled"] = {"catalog_map_s": round(map_s, 4), "cold": percentiles(cold)}
+    return results
+
+
+def bench_search_log(workdir: Path, entries: int) -> Dict[str, Any]:
+    """Throughput of log_search_results, including the background writer draining to disk."""
+    writer = SearchLogWriter(workdir / "search_house_log.jsonl")
+    entry = list(generate_house_records(3))
+
+    started = time.perf_counter()
+    for _ in range(entries):
+        writer.append(entry)
+    enqueue_s = time.perf_counter() - started
+    writer.flush()
+    total_s = time.perf_counter() - started
+    writer.close()
+    return {
+        "entries": entries,
+        "enqueue_per_s": round(entries / enqueue_s, 1),
+        "written_per_s": round(entries / total_s, 1),
+    }
+
+
+def bench_user_reserve(workdir: Path, reservations: int) -> Dict[str, Any]:
+    real_estate_functions.RESERVATION_DB_FILE = workdir / "reservations.sqlite3"
+
+    reserve = lambda i: real_estate_functions.user_reserve("2024-12-01", f"bench {i}", "0912345678", "benchmark")
+    with redirect_stdout(io.StringIO()):
+        samples = time_calls(reserve, reservations)
+    return {"reservations": reservations, "per_s": round(reservations / sum(samples), 1), "latency": percentiles(samples)}
+
+
+def bench_feng_shui(lookups: int) -> Dict[str, Any]:
+    problems = ["對門煞", "壓樑", "陽宅內六室", "大門對廚房", "床頭靠窗"]
+    with redirect_stdout(io.StringIO()):
+        samples = time_calls(lambda i: get_fengshui_advice(problems[i % len(problems)]), lookups)
+    return {"lookups": lookups, "per_s": round(lookups / sum(samples), 1), "latency": percentiles(samples)}
+
+
+def bench_web_search_cache(workdir: Path, lookups: int) -> Dict[str, Any]:
+    """CachedWebSearchTool over the stub search: misses go to the stub, repeats hit the LRU or the file."""
+    from functions.web_search_cache import WebSearchCache
+    from tools.web_search_tools import CachedWebSearchTool
+    from experiment.stub_backends import StubWebSearchTool
+
+    path = workdir / "web_search_cache.sqlite3"
+    queries = [f"對門煞 化解 {i}" for i in range(lookups)]
+    tool = CachedWebSearchTool.wrap(StubWebSearchTool(), WebSearchCache(path))
+    miss = time_calls(lambda i: tool.invoke({"query": queries[i]}), lookups)
+    memory_hit = time_calls(lambda i: tool.invoke({"query": queries[i]}), lookups)
+    # A new cache on the same file, as after a restart
+    tool = CachedWebSearchTool.wrap(StubWebSearchTool(), WebSearchCache(path))
+    disk_hit = time_calls(lambda i: tool.invoke({"query": queries[i]}), lookups)
+    return {"lookups": lookups, "miss": percentiles(miss), "memory_hit": percentiles(memory_hit), "disk_hit": percentiles(disk_hit)}
+
+
+def bench_agent_turns(turns: int) -> Dict[str, Any]:
+    """Full LangGraph turns (model -> search_house -> model) with the stub model, no network involved."""
+    from langchain_core.messages import HumanMessage
+    from agent_main import create_agent
+    from experiment.stub_backends import StubChatModel, StubWebSearchTool
+
+    agent = create_agent(model=StubChatModel(), web_search_tool=StubWebSearchTool())
+    turn = lambda i: agent.invoke(
+        {"messages": [HumanMessage(content="我要找臺北市中正區 900~2900")]},
+        {"configurable": {"thread_id": f"benchmark-{i}"}}
+    )
+    samples = time_calls(turn, turns)
+    return {"turns": turns, "per_s": round(turns / sum(samples), 1), "latency": percentiles(samples)}
+
+
+def run_benchmarks(sizes: List[int], iterations: int, seed: int, agent_turns: int) -> Dict[str, Any]:
+    # Every file the benchmark writes lives in a temporary directory
+    real_estate_functions.SAVE_SEARCH_LOG_FILE = False
+    results: Dict[str, Any] = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "search_house": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for size in sizes:
+            print(f"Benchmarking search_house on {size} houses ...")
+            results["search_house"][str(size)] = bench_search_house(workdir, size, iterations, seed)
+
+        print("Benchmarking log_search_results, user_reserve, get_fengshui_advice and the web search cache ...")
+        results["log_search_results"] = bench_search_log(workdir, iterations * 10)
+        results["user_reserve"] = bench_user_reserve(workdir, iterations)
+        results["get_fengshui_advice"] = bench_feng_shui(iterations * 10)
+        results["web_search_cache"] = bench_web_search_cache(workdir, iterations)
+
+        if agent_turns:
+            print(f"Benchmarking {agent_turns} agent turns ...")
+            results["agent_turn"] = bench_agent_turns(agent_turns)
+
+    return results
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    List the metrics that got worse than the baseline by more than `threshold`.
+
+    Latencies (`*_us`, `*_s`) regress when they grow, throughputs (`*per_s`)
+    when they shrink; counts and other fields are not compared. p99 and max
+    are reported but too noisy to gate on.
+    """
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for name, value in current.items():
+        old = previous.get(name)
+        if not old or name.endswith(("p99_us", "max_us")):
+            continue
+        if name.endswith("per_s"):
+            change = (old - value) / old
+        elif name.endswith("_us") or name.endswith("_s"):
+            change = (value - old) / old
+        else:
+            continue
+        if change > threshold:
+            regressions.append(f"{name}: {old} -> {value} ({change:+.0%} worse)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tool hot paths on synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="catalog sizes, e.g. 1000 100000 10000000")
+    parser.add_argument("--iterations", type=int, default=1000, help="calls timed per benchmark")
+    parser.add_argument("--agent-turns", type=int, default=50, help="stubbed agent turns to time, 0 to skip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="result file, defaults to data/benchmarks/benchmark_<time>.json")
+    parser.add_argument("--baseline", type=Path, default=None, help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.iterations, args.seed, args.agent_turns)
+
+    output = args.output or BENCHMARK_DIR / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+    print(json.dumps(results, ensure_ascii=False, indent=4))
+    print(f"Benchmark results saved to {output}")
+
+    if args.baseline is not None:
+        with args.baseline.open("r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline.name}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline.name}")
@@ -0,0 +1,228 @@
+from typing import Any, Dict, List, Optional, Sequence, Type
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain.tools import BaseTool
+from pydantic import BaseModel
+from pathlib import Path
+import threading
+import hashlib
+import json
+import sys
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+sys.path.insert(0, str(ROOT))  # for import modules
+
+DATA_DIR = ROOT / 'data'
+CASSETTE_DIR = DATA_DIR / 'cassettes'
+
+from experiment.stub_backends import StubWebSearchInput
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a model or tool call was never recorded."""
+
+
+def _message_fingerprint(message: BaseMessage) -> Dict[str, Any]:
+    # Message ids are random per run, everything else must match exactly
+    return {
+        "type": message.type,
+        "content": message.content,
+        "tool_calls": [
+            {"name": call["name"], "args": call["args"], "id": call["id"]}
+            for call in getattr(message, "tool_calls", None) or []
+        ],
+        "tool_call_id": getattr(message, "tool_call_id", None),
+    }
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    JSON file of recorded model responses and tool outputs.
+
+    Model calls are keyed by the input messages plus the bound tool names, and
+    tool calls by tool name plus arguments, so a replay returns exactly what
+    the recorded run saw.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.model_calls: Dict[str, Dict[str, Any]] = {}
+        self.tool_calls: Dict[str, Any] = {}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.model_calls = data.get("model_calls", {})
+            self.tool_calls = data.get("tool_calls", {})
+
+    @staticmethod
+    def model_key(messages: Sequence[BaseMessage], tool_names: Sequence[str]) -> str:
+        return _digest({"messages": [_message_fingerprint(m) for m in messages], "tools": sorted(tool_names)})
+
+    @staticmethod
+    def tool_key(tool_name: str, tool_input: Dict[str, Any]) -> str:
+        return _digest({"tool": tool_name, "input": tool_input})
+
+    def record_model(self, key: str, message: BaseMessage) -> None:
+        with self._lock:
+            self.model_calls.setdefault(key, message_to_dict(message))
+
+    def replay_model(self, key: str) -> BaseMessage:
+        if key not in self.model_calls:
+            raise CassetteMiss(f"model call {key[:12]} is not in cassette {self.path.name}")
+        return messages_from_dict([self.model_calls[key]])[0]
+
+    def record_tool(self, key: str, output: Any) -> None:
+        with self._lock:
+            self.tool_calls.setdefault(key, output)
+
+    def replay_tool(self, key: str) -> Any:
+        if key not in self.tool_calls:
+            raise CassetteMiss(f"tool call {key[:12]} is not in cassette {self.path.name}")
+        return self.tool_calls[key]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = {"model_calls": self.model_calls, "tool_calls": self.tool_calls}
+            with self.path.open("w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+        print(f"Cassette saved to {self.path} ({len(self.model_calls)} model calls, {len(self.tool_calls)} tool calls)")
+
+
+class RecordingChatModel(BaseChatModel):
+    """Passes every call to a real chat model and stores the response in the cassette."""
+
+    inner: Any
+    cassette: Any
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "RecordingChatModel":
+        return self.model_copy(update={
+            "inner": self.inner.bind_tools(tools, **kwargs),
+            "tool_names": [tool.name for tool in tools],
+        })
+
+    def _result(self, messages: List[BaseMessage], response: BaseMessage) -> ChatResult:
+        self.cassette.record_model(Cassette.model_key(messages, self.tool_names), response)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self._result(messages, self.inner.invoke(messages, stop=stop))
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self._result(messages, await self.inner.ainvoke(messages, stop=stop))
+
+
+class ReplayChatModel(BaseChatModel):
+    """Deterministic fake chat model answering from a cassette, no network involved."""
+
+    cassette: Any
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ReplayChatModel":
+        return self.model_copy(update={"tool_names": [tool.name for tool in tools]})
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.cassette.replay_model(Cassette.model_key(messages, self.tool_names))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class RecordingTool(BaseTool):
+    """Wraps a network tool (e.g. Tavily) and stores its outputs in the cassette."""
+
+    name: str = "tavily_search_results_json"
+    description: str = "A search engine. Input should be a search query."
+    args_schema: Type[BaseModel] = StubWebSearchInput
+    inner: Any = None
+    cassette: Any = None
+
+    def _run(self, **tool_input: Any) -> Any:
+        output = self.inner.invoke(tool_input)
+        self.cassette.record_tool(Cassette.tool_key(self.name, tool_input), output)
+        return output
+
+    async def _arun(self, **tool_input: Any) -> Any:
+        output = await self.inner.ainvoke(tool_input)
+        self.cassette.record_tool(Cassette.tool_key(self.name, tool_input), output)
+        return output
+
+
+class ReplayTool(BaseTool):
+    """Answers a network tool call from the cassette."""
+
+    name: str = "tavily_search_results_json"
+    description: str = "A search engine. Input should be a search query."
+    args_schema: Type[BaseModel] = StubWebSearchInput
+    cassette: Any = None
+
+    def _run(self, **tool_input: Any) -> Any:
+        return self.cassette.replay_tool(Cassette.tool_key(self.name, tool_input))
+
+    async def _arun(self, **tool_input: Any) -> Any:
+        return self._run(**tool_input)
+
+
+def create_cassette_agent(cassette: Cassette, mode: str, checkpointer=None):
+    """
+    Build the regular agent with its model and web search wired to a cassette.
+
+    In RECORD mode the real gpt-4o and Tavily calls go through and are stored;
+    in REPLAY mode both are served from the cassette. The house search,
+    reservation and feng shui tools always run for real, so replays exercise
+    our own code paths without any network access.
+    """
+    from agent_main import create_agent
+
+    if mode == RECORD:
+        from langchain_openai import ChatOpenAI
+        from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+        from langchain_community.tools.tavily_search.tool import TavilySearchResults
+
+        # temperature 0 keeps re-recordings close to each other
+        model = RecordingChatModel(inner=ChatOpenAI(model="gpt-4o", temperature=0), cassette=cassette)
+        tavily_tool = TavilySearchResults(api_wrapper=TavilySearchAPIWrapper(), max_results=2)
+        web_search_tool = RecordingTool(name=tavily_tool.name, description=tavily_tool.description, inner=tavily_tool, cassette=cassette)
+    elif mode == REPLAY:
+        model = ReplayChatModel(cassette=cassette)
+        web_search_tool = ReplayTool(cassette=cassette)
+    else:
+        raise ValueError(f"mode must be {RECORD!r} or {REPLAY!r}, got {mode!r}")
+
+    return create_agent(model=model, web_search_tool=web_search_tool, checkpointer=checkpointer)
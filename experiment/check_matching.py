@@ -0,0 +1,161 @@
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+import argparse
+import tempfile
+import sys
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+sys.path.insert(0, str(ROOT))  # for import modules
+
+from functions.feng_shui_functions import search_fengshui
+from functions.location_normalizer import get_location_normalizer
+from functions.response_cache import ResponseCache
+from functions.reservation_store import ReservationStore
+
+# (problem, name of the best entry, None when it has to fall through to the web search)
+FENG_SHUI_CASES: List[Tuple[str, Optional[str]]] = [
+    ("對門煞", "對門煞"),
+    ("門對門", "對門煞"),
+    ("對門殺", "對門煞"),
+    ("對門煞要怎麼化解", "對門煞"),
+    ("床頭壓梁", "壓樑"),
+    ("床頭靠窗戶", "床頭靠窗"),
+    ("我家大門對著後門怎麼辦", "穿堂煞"),
+    ("大門對電梯怎麼化解", "電梯對大門"),
+    ("門", None),
+    ("大門", None),
+    ("廁所", None),
+    ("窗戶", None),
+    ("樓梯", None),
+]
+
+# (city, district) input and the (City, District) it resolves to; places that do not exist come back as given
+LOCATION_CASES: List[Tuple[Tuple[str, str], Tuple[str, str]]] = [
+    (("台北", "中正"), ("臺北市", "中正區")),
+    (("台北市中正區", ""), ("臺北市", "中正區")),
+    (("taipei", "zhongzheng"), ("臺北市", "中正區")),
+    (("屏東縣", "三地們鄉"), ("屏東縣", "三地門鄉")),
+    (("臺中市", "中山區"), ("臺中市", "中山區")),
+    (("臺北縣", "板橋區"), ("臺北縣", "板橋區")),
+    (("臺北縣板橋區", ""), ("臺北縣板橋區", "")),
+    (("新北市", "蘆州區"), ("新北市", "蘆州區")),
+]
+
+# Questions answered first, with the tool calls of their turn
+RESPONSE_CACHE_STORED: List[Tuple[str, List[Dict[str, Any]]]] = [
+    ("我要找台北市中正區 900~2900", [{"name": "search_house", "args": {"city_county": "臺北市", "district": "中正區", "price_lower_limit": 900, "price_upper_limit": 2900}}]),
+    ("對門煞怎麼化解", [{"name": "FengShui_advice", "args": {"feng_shui_name": "對門煞"}}]),
+]
+
+# (question, the stored question whose answer it reuses, None when it must be answered anew)
+RESPONSE_CACHE_CASES: List[Tuple[str, Optional[str]]] = [
+    ("幫我找台北市中正區 900~2900", "我要找台北市中正區 900~2900"),
+    ("我要找台北中正 900~2900", "我要找台北市中正區 900~2900"),
+    ("請問臺北市中正區900到2900", "我要找台北市中正區 900~2900"),
+    ("對門煞要怎麼化解", "對門煞怎麼化解"),
+    ("門對門要怎麼化解", "對門煞怎麼化解"),
+    ("我要找台北市中正區 900~3000", None),
+    ("我要找台北市大安區 900~2900", None),
+    ("我要找台北市中正區 900~2900 有車位的", None),
+    ("我不要台北市中正區 900~2900", None),
+    ("對門煞是什麼", None),
+    ("壓樑怎麼化解", None),
+]
+
+
+def check_feng_shui() -> List[str]:
+    failures = []
+    for problem, expected in FENG_SHUI_CASES:
+        matches = search_fengshui(problem, top_k=1)
+        found = matches[0]["name"] if matches else None
+        if found != expected:
+            failures.append(f"FengShui {problem!r}: expected {expected}, got {found} ({matches[0]['score'] if matches else '-'})")
+    return failures
+
+
+def check_location() -> List[str]:
+    failures = []
+    normalizer = get_location_normalizer()
+    for (city, district), expected in LOCATION_CASES:
+        found = normalizer.normalize(city, district)
+        if found != expected:
+            failures.append(f"Location {city!r} {district!r}: expected {expected}, got {found}")
+    return failures
+
+
+def check_response_cache() -> List[str]:
+    failures = []
+    cache = ResponseCache()
+    for question, tool_calls in RESPONSE_CACHE_STORED:
+        cache.store(question, question, tool_calls)
+    for question, expected in RESPONSE_CACHE_CASES:
+        found = cache.lookup(question)
+        if found != expected:
+            failures.append(f"ResponseCache {question!r}: expected {expected}, got {found}")
+
+    # An answer given with earlier messages in the thread is only reused for that user
+    question, tool_calls = RESPONSE_CACHE_STORED[0]
+    cache = ResponseCache()
+    cache.store(question, question, tool_calls, user_id="user-a")
+    if cache.lookup(question, "user-b") is not None:
+        failures.append("ResponseCache: an answer stored for user-a was reused for user-b")
+    if cache.lookup(question) is not None:
+        failures.append("ResponseCache: an answer stored for user-a was reused for a fresh conversation")
+    if cache.lookup(question, "user-a") != question:
+        failures.append("ResponseCache: an answer stored for user-a was not reused for user-a")
+
+    # A follow-up of a user with earlier turns never gets an answer given without them
+    cache = ResponseCache()
+    cache.store(question, question, tool_calls)
+    if cache.lookup(question, "user-a") is not None:
+        failures.append("ResponseCache: a shared answer was reused for a follow-up of user-a")
+    return failures
+
+
+# Bookings (YYYY-MM-DD-HH as the reservation tool stores them) and the filters that must find them
+RESERVATION_DATES = ["2024-10-25-18", "2024-10-26-09", "2024-10-26-15", "2024-10-27-10"]
+RESERVATION_CASES: List[Tuple[Dict[str, str], List[str]]] = [
+    ({"date": "2024-10-26"}, ["2024-10-26-09", "2024-10-26-15"]),
+    ({"date": "2024-10-26-15"}, ["2024-10-26-15"]),
+    ({"date_to": "2024-10-26"}, ["2024-10-25-18", "2024-10-26-09", "2024-10-26-15"]),
+    ({"date_from": "2024-10-26", "date_to": "2024-10-26"}, ["2024-10-26-09", "2024-10-26-15"]),
+    ({"date_from": "2024-10-26-10", "date_to": "2024-10-27-10"}, ["2024-10-26-15", "2024-10-27-10"]),
+]
+
+
+def check_reservations() -> List[str]:
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReservationStore(Path(tmp) / "reservations.sqlite3")
+        for date in RESERVATION_DATES:
+            store.add(date, "check", "0900000000")
+        for filters, expected in RESERVATION_CASES:
+            found = [reservation["date"] for reservation in store.query(**filters)]
+            if found != expected:
+                failures.append(f"Reservations {filters}: expected {expected}, got {found}")
+    return failures
+
+
+CHECKS = {
+    "feng_shui": check_feng_shui,
+    "location": check_location,
+    "reservations": check_reservations,
+    "response_cache": check_response_cache,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check what the lookups and filters match and what they must miss.")
+    parser.add_argument("--only", choices=sorted(CHECKS), action="append", help="Run only these checks (repeatable).")
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.only or CHECKS:
+        failed = CHECKS[name]()
+        print(f"{name}: {'ok' if not failed else f'{len(failed)} failed'}")
+        failures.extend(failed)
+
+    for failure in failures:
+        print(f"Error {failure}")
+    sys.exit(1 if failures else 0)
@@ -1,33 +1,34 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import create_react_agent
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import asyncio
+import threading
 import json
 
 # Tools
 from pathlib import Path
 import sys
-from typing import Any
+from typing import Any, Dict, List
 
 FILE = Path(__file__).resolve()
-ROOT = FILE.parents[1]  
+ROOT = FILE.parents[1]
 sys.path.insert(0, str(ROOT))  # for import modules
 
 DATA_DIR = ROOT / 'data'
 EVALUATE_DATA = DATA_DIR / 'questions_answers.json'
 EVALUATE_RESULT= DATA_DIR / 'evaluate_result.json'
-SEARCH_LOG_FILE = DATA_DIR / "search_house_log.json"
+# One line per finished question, lets an interrupted run resume
+EVALUATE_CHECKPOINT = DATA_DIR / 'evaluate_checkpoint.jsonl'
 
+SYSTEM_PROMPT = '你是一位房地產輔助機器人負責協助使用者'
 
-from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
-from langchain_community.tools.tavily_search.tool import TavilySearchResults
-from tools.real_estate_tools import RealEstateReserveTool, RealEstateSearchTool
-from tools.feng_shui_tools import FengShuiRecommendationTool
+from agent_main import create_agent
+from functions.real_estate_functions import capture_search_results
 
 def ensure_file_exists(file_path: Path, default_data: Any):
     """
     確保文件存在。如果文件不存在，創建並寫入默認數據。
-    
+
     Args:
         file_path: 要檢查的文件路徑。
         default_data: 文件不存在時寫入的默認數據。
@@ -38,41 +39,36 @@ def ensure_file_exists(file_path: Path, default_data: Any):
         with file_path.open("w", encoding="utf-8") as f:
             json.dump(default_data, f, ensure_ascii=False, indent=4)
 
-def evaluate_and_log_results():
+def evaluate_and_log_results(actual_answers: Dict[str, Any]):
     """
-    比較 EVALUATE_DATA 和 SEARCH_LOG_FILE 的答案，計算總分與正確率，
+    比較 EVALUATE_DATA 與每題實際搜尋到的答案，計算總分與正確率，
     並將結果記錄到 evaluate_result.json。
+
+    結果依 EVALUATE_DATA 的題目順序產生，與各題完成的先後無關。
+
+    Args:
+        actual_answers: 題號 -> 該題最後一次 search_house 的結果。
     """
     # 確保文件存在
     ensure_file_exists(EVALUATE_DATA, {})
-    ensure_file_exists(SEARCH_LOG_FILE, [])
 
     # 讀取 EVALUATE_DATA
     with EVALUATE_DATA.open("r", encoding="utf-8") as f:
         evaluate_data = json.load(f)
 
-    # 讀取 SEARCH_LOG_FILE
-    with SEARCH_LOG_FILE.open("r", encoding="utf-8") as f:
-        search_log = json.load(f)
-
-    # 確保 SEARCH_LOG_FILE 是列表結構
-    if not isinstance(search_log, list):
-        print("SEARCH_LOG_FILE is not in the expected list format.")
-        return
-
     # 初始化結果記錄
     correct_questions = {}
     incorrect_questions = {}
     total_questions = len(evaluate_data)
     correct_count = 0
 
-    # 遍歷 EVALUATE_DATA 和 SEARCH_LOG_FILE，逐一比較答案
-    for idx, (qid, query_data) in enumerate(evaluate_data.items(), start=1):
+    # 遍歷 EVALUATE_DATA，逐一比較答案
+    for qid, query_data in evaluate_data.items():
         evaluate_answers = query_data["answer"]  # 獲取 EVALUATE_DATA 的答案
 
-        # 確認 SEARCH_LOG_FILE 是否有對應索引
-        if idx > len(search_log):
-            print(f"SEARCH_LOG_FILE is missing data for {qid}.")
+        # 確認這一題是否有結果
+        if qid not in actual_answers:
+            print(f"Evaluation is missing data for {qid}.")
             incorrect_questions[qid] = {
                 "question": query_data["question"],
                 "expected": evaluate_answers,
@@ -80,7 +76,7 @@ def evaluate_and_log_results():
             }
             continue
 
-        search_answers = search_log[idx - 1]  # 獲取 SEARCH_LOG_FILE 的答案
+        search_answers = actual_answers[qid]
 
         # 比較兩者是否相同
         if evaluate_answers == search_answers:
@@ -94,7 +90,6 @@ def evaluate_and_log_results():
             }
 
     # 計算總分與正確率
-    score = correct_count
     accuracy = correct_count / total_questions if total_questions > 0 else 0
 
     # 構造結果
@@ -113,104 +108,138 @@ def evaluate_and_log_results():
 
     print(f"Evaluation completed. Results saved to {EVALUATE_RESULT}")
 
-def create_agent():
-    # Memory with session ID
-    memory = MemorySaver()
-    # Load model (gpt-4o)
-    model = ChatOpenAI(model="gpt-4o",verbose = True)
-    # Load tools
-    search = TavilySearchAPIWrapper()
-    tavily_tool = TavilySearchResults(api_wrapper=search, max_results=2)
-    tools = [RealEstateReserveTool(), RealEstateSearchTool(), FengShuiRecommendationTool(),tavily_tool]
-    agent_executor = create_react_agent(model, tools, checkpointer=memory)
-    
-    return agent_executor
-
-def one_time_agent(question: str):
-    agent = create_agent()
-    print('Agent is now running')
-
-    # Configuration for session ID
-    config = {"configurable": {"thread_id": 'tester'}}
-
-    sys_prompt = '你是一位房地產輔助機器人負責協助使用者'
-    SystemMessage(content=sys_prompt)
-    agent.update_state(config, {"messages": sys_prompt})
-
-    # Invoke the agent with the provided session ID
-    response = agent.invoke({"messages": [HumanMessage(content=question)]}, config)
-
-    if response["messages"][-1].tool_calls:
-        print(response["messages"][-1].tool_calls)
-
-    print(response["messages"][-1].content)  # Print the agent's response
-
-def get_search_log_len():
-    # 讀取 SEARCH_LOG_FILE
-    with SEARCH_LOG_FILE.open("r", encoding="utf-8") as f:
-        search_log = json.load(f)
-    return len(search_log)
-
-def clear_search_log():
-    """
-    清空 SEARCH_LOG_FILE 的內容。
-    """
-    with SEARCH_LOG_FILE.open("w", encoding="utf-8") as f:
-        json.dump([], f, ensure_ascii=False, indent=4)
-    print("SEARCH_LOG_FILE has been cleared.")
-
 def clear_evaluate_log():
-   
+
     with EVALUATE_RESULT.open("w", encoding="utf-8") as f:
         json.dump([], f, ensure_ascii=False, indent=4)
     print("EVALUATE_RESULT has been cleared.")
 
-def append_null_in_search_log():
+def load_checkpoint() -> Dict[str, Any]:
+    """讀取已完成題目的結果 (題號 -> 實際答案)。"""
+    if not EVALUATE_CHECKPOINT.exists():
+        return {}
+    finished = {}
+    with EVALUATE_CHECKPOINT.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                finished[row["qid"]] = row["actual"]
+    return finished
+
+class CheckpointWriter:
+    """Thread-safe appender of finished questions to EVALUATE_CHECKPOINT."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, qid: str, searches: List[Any], actual: Any) -> None:
+        line = json.dumps({"qid": qid, "actual": actual, "searches": searches}, ensure_ascii=False)
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+def build_input(question: str) -> Dict[str, Any]:
+    return {"messages": [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=question)]}
+
+def evaluate_question(agent, qid: str, question: str) -> List[Any]:
     """
-    在 SEARCH_LOG_FILE 中加入一個空結果 []。
+    以獨立的 thread_id 回答一題，並回傳這一題所有 search_house 的結果。
     """
-    # 確保文件存在，並初始化為空列表（如文件不存在）
-    if not SEARCH_LOG_FILE.exists():
-        with SEARCH_LOG_FILE.open("w", encoding="utf-8") as f:
-            json.dump([], f, ensure_ascii=False, indent=4)
-
-    # 讀取 SEARCH_LOG_FILE
-    with SEARCH_LOG_FILE.open("r", encoding="utf-8") as f:
-        search_log = json.load(f)
-
-    # 確保文件是列表結構
-    if not isinstance(search_log, list):
-        raise ValueError("SEARCH_LOG_FILE is not a list. Please check the file format.")
-
-    # 添加一個空結果
-    search_log.append([])
-
-    # 將更新後的數據寫回 SEARCH_LOG_FILE
-    with SEARCH_LOG_FILE.open("w", encoding="utf-8") as f:
-        json.dump(search_log, f, ensure_ascii=False, indent=4)
-
-    print(f"Appended an empty entry to SEARCH_LOG_FILE. Current length: {len(search_log)}")
-
-def evaluate_questions():
+    config = {"configurable": {"thread_id": f"evaluate-{qid}"}}
+    with capture_search_results() as searches:
+        agent.invoke(build_input(question), config)
+    return searches
+
+async def aevaluate_question(agent, qid: str, question: str) -> List[Any]:
+    config = {"configurable": {"thread_id": f"evaluate-{qid}"}}
+    with capture_search_results() as searches:
+        await agent.ainvoke(build_input(question), config)
+    return searches
+
+def final_answer(searches: List[Any]) -> Any:
+    # The last search of a turn is the one the agent answered with; no search counts as []
+    return searches[-1] if searches else []
+
+def evaluate_questions(concurrency: int = 8, use_async: bool = False, resume: bool = False, agent=None) -> Dict[str, Any]:
+    """
+    並行回答 EVALUATE_DATA 的所有題目，回傳題號 -> 實際答案。
 
+    Args:
+        concurrency: 同時執行的題目數量。
+        use_async: 使用 agent.ainvoke 與 asyncio，而不是執行緒。
+        resume: 略過 EVALUATE_CHECKPOINT 中已完成的題目。
+        agent: 使用的 agent，預設為 create_agent()，所有題目共用。
+    """
     if not EVALUATE_DATA.exists():
         print(f"File {EVALUATE_DATA} does not exist.")
-        return 
-    
+        return {}
+
     with EVALUATE_DATA.open("r", encoding="utf-8") as f:
         data = json.load(f)
 
-    clear_search_log()
-    clear_evaluate_log()
-
-    question_count = 0
-    for _, query_data in data.items():
-        question_count += 1
-        question = query_data["question"]
-        one_time_agent(question)
-        if get_search_log_len() < question_count:
-            append_null_in_search_log()
+    if resume:
+        actual_answers = load_checkpoint()
+        print(f"Resuming evaluation, {len(actual_answers)} questions already finished.")
+    else:
+        EVALUATE_CHECKPOINT.unlink(missing_ok=True)
+        clear_evaluate_log()
+        actual_answers = {}
+
+    pending = [(qid, query_data["question"]) for qid, query_data in data.items() if qid not in actual_answers]
+    checkpoint = CheckpointWriter(EVALUATE_CHECKPOINT)
+    agent = agent if agent is not None else create_agent()
+
+    def record(qid: str, searches: List[Any]) -> None:
+        actual_answers[qid] = final_answer(searches)
+        checkpoint.write(qid, searches, actual_answers[qid])
+        print(f"{qid} finished ({len(actual_answers)}/{len(data)})")
+
+    if use_async:
+        async def run_all():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def run_one(qid: str, question: str):
+                async with semaphore:
+                    try:
+                        record(qid, await aevaluate_question(agent, qid, question))
+                    except Exception as error:
+                        print(f"{qid} failed: {error}")
+
+            await asyncio.gather(*(run_one(qid, question) for qid, question in pending))
+
+        asyncio.run(run_all())
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(evaluate_question, agent, qid, question): qid for qid, question in pending}
+            for future in as_completed(futures):
+                qid = futures[future]
+                try:
+                    record(qid, future.result())
+                except Exception as error:
+                    # Left out of the checkpoint, a resumed run retries it
+                    print(f"{qid} failed: {error}")
+
+    return actual_answers
 
 if __name__=="__main__":
-   evaluate_questions()
-   evaluate_and_log_results()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the agent's search answers against questions_answers.json.")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions evaluated at the same time")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use agent.ainvoke on one event loop instead of threads")
+    parser.add_argument("--resume", action="store_true", help="skip questions already in the evaluation checkpoint")
+    parser.add_argument("--cassette", type=Path, default=None, help="cassette file for recording or replaying model/Tavily calls")
+    parser.add_argument("--cassette-mode", choices=["record", "replay"], default="replay")
+    args = parser.parse_args()
+
+    cassette = None
+    agent = None
+    if args.cassette is not None:
+        from experiment.cassette import Cassette, create_cassette_agent
+        cassette = Cassette(args.cassette)
+        agent = create_cassette_agent(cassette, args.cassette_mode)
+
+    answers = evaluate_questions(concurrency=args.concurrency, use_async=args.use_async, resume=args.resume, agent=agent)
+    evaluate_and_log_results(answers)
+
+    if cassette is not None and args.cassette_mode == "record":
+        cassette.save()
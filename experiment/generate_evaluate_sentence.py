@@ -8,12 +8,12 @@ FILE = Path(__file__).resolve()
 ROOT = FILE.parents[1]  
 sys.path.insert(0, str(ROOT))  # for import modules
 from functions.real_estate_functions import search_house
+from functions.search_log import SEARCH_LOG_FILE, get_search_log_writer
 
 # Define path to house.json
 DATA_DIR = ROOT / 'data'
 CITY_COUNTY = DATA_DIR / 'CityCountyData.json'
 OUTPUT_FILE = DATA_DIR / 'questions_answers.json'
-SEARCH_LOG_FILE = DATA_DIR / "search_house_log.json"
 
 def get_city_county() -> List[Dict[str, str]]:
     """
@@ -38,8 +38,7 @@ def clear_search_log():
     """
     清空 SEARCH_LOG_FILE 的內容。
     """
-    with SEARCH_LOG_FILE.open("w", encoding="utf-8") as f:
-        json.dump([], f, ensure_ascii=False, indent=4)
+    get_search_log_writer(SEARCH_LOG_FILE).clear()
     print("SEARCH_LOG_FILE has been cleared.")
 
 def generate_find_house_normal_questions_json(output_file: Path):
@@ -0,0 +1,120 @@
+from langchain_core.messages import HumanMessage
+from typing import Any, Dict, List, Tuple
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+sys.path.insert(0, str(ROOT))  # for import modules
+
+from agent_main import create_agent
+from line_server import LineWebhookServer
+from experiment.stub_backends import StubChatModel, StubWebSearchTool
+import functions.real_estate_functions as real_estate_functions
+
+
+def line_payload(user_id: str, text: str) -> bytes:
+    """Build a LINE webhook body holding one text message."""
+    event = {
+        "type": "message",
+        "replyToken": f"reply-{user_id}-{text}",
+        "source": {"type": "user", "userId": user_id},
+        "timestamp": int(time.time() * 1000),
+        "message": {"type": "text", "id": text, "text": text},
+    }
+    return json.dumps({"events": [event]}, ensure_ascii=False).encode("utf-8")
+
+
+async def call_asgi(app, method: str, path: str, body: bytes = b"") -> Tuple[int, Dict[str, Any]]:
+    """Send one HTTP request straight into an ASGI app, without a socket."""
+    sent: List[Dict[str, Any]] = []
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": []}
+    await app(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+async def run_load_test(users: int, messages_per_user: int, workers: int, max_queue: int, model_latency: float) -> Dict[str, Any]:
+    # Keep the load test from filling the real search log
+    real_estate_functions.SAVE_SEARCH_LOG_FILE = False
+
+    agent = create_agent(model=StubChatModel(latency=model_latency), web_search_tool=StubWebSearchTool())
+
+    async def handler(user_id: str, question: str, timestamp: int) -> str:
+        # Same agent turn as arun_line_agent, without the Postgres round-trips
+        config = {"configurable": {"thread_id": user_id}}
+        response = await agent.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+        return response["messages"][-1].content
+
+    sent_at: Dict[str, float] = {}
+    latencies: List[float] = []
+    answered: Dict[str, List[int]] = {}
+
+    async def reply(message: Dict[str, Any], answer: str) -> None:
+        latencies.append(time.perf_counter() - sent_at[message["reply_token"]])
+        answered.setdefault(message["user_id"], []).append(int(message["question"].split("-")[-1]))
+
+    server = LineWebhookServer(handler=handler, reply=reply, workers=workers, max_queue=max_queue, channel_secret=None)
+    await server.start()
+
+    throttled = 0
+
+    async def user_session(user_index: int) -> None:
+        nonlocal throttled
+        user_id = f"U{user_index:05d}"
+        for seq in range(messages_per_user):
+            text = f"我要找臺北市中正區 900~2900-{seq}"
+            body = line_payload(user_id, text)
+            sent_at[f"reply-{user_id}-{text}"] = time.perf_counter()
+            # LINE retries throttled deliveries, so do we
+            while (await call_asgi(server, "POST", "/webhook", body))[0] == 429:
+                throttled += 1
+                await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(i) for i in range(users)))
+    await server.stop()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    out_of_order = sum(1 for seqs in answered.values() if seqs != sorted(seqs))
+    return {
+        "users": users,
+        "messages": users * messages_per_user,
+        "processed": server.processed,
+        "failed": server.failed,
+        "throttled_429": throttled,
+        "out_of_order_users": out_of_order,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_per_s": round(server.processed / elapsed, 1) if elapsed else None,
+        "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the LINE webhook server with stubbed OpenAI/Tavily backends.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=5, help="messages sent by every user")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--model-latency", type=float, default=0.05, help="seconds slept per stub model call")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load_test(args.users, args.messages, args.workers, args.max_queue, args.model_latency))
+    print(json.dumps(result, ensure_ascii=False, indent=4))
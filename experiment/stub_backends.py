@@ -0,0 +1,92 @@
+from typing import Any, Dict, List, Optional, Sequence, Type
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+import asyncio
+import time
+import uuid
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Local stand-in for ChatOpenAI used by load tests and benchmarks.
+
+    On a user message it calls `search_house` with `search_args`; once the tool
+    answered it replies with a short summary. `latency` seconds are slept per
+    call to mimic a remote model without any network traffic.
+    """
+
+    search_args: Dict[str, Any] = Field(default_factory=lambda: {
+        "city_county": "臺北市",
+        "district": "中正區",
+        "price_upper_limit": 2900,
+        "price_lower_limit": 900,
+    })
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "StubChatModel":
+        # The stub always knows which tool it is going to call
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=f"找到以下物件：{last.content}")
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": "search_house", "args": dict(self.search_args), "id": f"call_{uuid.uuid4().hex[:12]}"}],
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+class StubWebSearchInput(BaseModel):
+    query: str = Field(..., description="search query to look up")
+
+
+class StubWebSearchTool(BaseTool):
+    """Local stand-in for TavilySearchResults returning a canned result."""
+
+    name: str = "tavily_search_results_json"
+    description: str = "A search engine. Input should be a search query."
+    args_schema: Type[BaseModel] = StubWebSearchInput
+    latency: float = 0.0
+
+    def _run(self, query: str) -> List[Dict[str, str]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [{"url": "https://example.com", "content": f"stub result for {query}"}]
+
+    async def _arun(self, query: str) -> List[Dict[str, str]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [{"url": "https://example.com", "content": f"stub result for {query}"}]
@@ -0,0 +1,232 @@
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+from pathlib import Path
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+import asyncio
+import sqlite3
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.lru_cache import LRUCache
+
+DATA_DIR = ROOT / 'data'
+
+# memory | sqlite | postgres
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "sqlite")
+CHECKPOINT_SQLITE_FILE = Path(os.getenv("CHECKPOINT_SQLITE_FILE", DATA_DIR / 'checkpoints.sqlite3'))
+CHECKPOINT_SQL_URL = os.getenv("CHECKPOINT_SQL_URL", os.getenv("SQL_URL") or "")
+# Number of threads whose latest checkpoint is kept in memory
+CHECKPOINT_CACHE_SIZE = int(os.getenv("CHECKPOINT_CACHE_SIZE", "1024"))
+
+
+class LRUCheckpointSaver(BaseCheckpointSaver):
+    """
+    Bounded in-memory tier in front of a durable checkpoint saver.
+
+    The latest checkpoint of the most recently used threads is kept in an LRU,
+    so resuming an active conversation does not touch the backend at all.
+    Every write goes through to the backend, which stays the source of truth
+    and can be shared by several worker processes. Workers sharing a backend
+    should receive a given user sticky, or a cached checkpoint may be stale.
+    """
+
+    def __init__(self, backend: BaseCheckpointSaver, maxsize: int = CHECKPOINT_CACHE_SIZE):
+        super().__init__(serde=backend.serde)
+        self.backend = backend
+        self._latest = LRUCache(maxsize)
+
+    @property
+    def config_specs(self):
+        return self.backend.config_specs
+
+    @staticmethod
+    def _thread_key(config: RunnableConfig) -> Tuple[str, str]:
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _copy_tuple(checkpoint_tuple: CheckpointTuple) -> CheckpointTuple:
+        # The graph must never mutate the cached checkpoint
+        return checkpoint_tuple._replace(checkpoint=copy_checkpoint(checkpoint_tuple.checkpoint))
+
+    def _cached(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        cached = self._latest.get(self._thread_key(config))
+        if cached is None:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and checkpoint_id != cached.config["configurable"]["checkpoint_id"]:
+            # An older checkpoint was requested, only the backend has it
+            return None
+        return self._copy_tuple(cached)
+
+    def _remember(self, config: RunnableConfig, checkpoint_tuple: Optional[CheckpointTuple]) -> None:
+        if checkpoint_tuple is not None and not get_checkpoint_id(config):
+            self._latest.set(self._thread_key(config), self._copy_tuple(checkpoint_tuple))
+
+    def _remember_put(
+        self,
+        config: RunnableConfig,
+        next_config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata
+    ) -> None:
+        thread_id, checkpoint_ns = self._thread_key(config)
+        parent_id = config["configurable"].get("checkpoint_id")
+        parent_config = None
+        if parent_id:
+            parent_config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+        self._latest.set(
+            (thread_id, checkpoint_ns),
+            CheckpointTuple(
+                config=next_config,
+                checkpoint=copy_checkpoint(checkpoint),
+                metadata=metadata,
+                parent_config=parent_config,
+                pending_writes=[],
+            ),
+        )
+
+    def _forget_writes(self, config: RunnableConfig) -> None:
+        # Pending writes change the tuple of that checkpoint, reload it from the backend next time
+        cached = self._latest.peek(self._thread_key(config))
+        if cached is not None and cached.config["configurable"]["checkpoint_id"] == get_checkpoint_id(config):
+            self._latest.pop(self._thread_key(config))
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        cached = self._cached(config)
+        if cached is not None:
+            return cached
+        checkpoint_tuple = self.backend.get_tuple(config)
+        self._remember(config, checkpoint_tuple)
+        return checkpoint_tuple
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.backend.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = self.backend.put(config, checkpoint, metadata, new_versions)
+        self._remember_put(config, next_config, checkpoint, metadata)
+        return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        self.backend.put_writes(config, writes, task_id)
+        self._forget_writes(config)
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.backend.get_next_version(current, channel)
+
+    # The durable backends are synchronous; the async API runs them in a worker
+    # thread and only skips the thread hop on a cache hit.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        cached = self._cached(config)
+        if cached is not None:
+            return cached
+        checkpoint_tuple = await asyncio.to_thread(self.backend.get_tuple, config)
+        self._remember(config, checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.backend.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await asyncio.to_thread(self.backend.put, config, checkpoint, metadata, new_versions)
+        self._remember_put(config, next_config, checkpoint, metadata)
+        return next_config
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        await asyncio.to_thread(self.backend.put_writes, config, writes, task_id)
+        self._forget_writes(config)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._latest.stats()
+
+
+def create_checkpointer(backend: str = CHECKPOINTER_BACKEND) -> BaseCheckpointSaver:
+    """
+    Build the checkpointer used by the shared agent.
+
+    "memory" keeps the old per-process MemorySaver. "sqlite" and "postgres"
+    store checkpoints durably (langgraph-checkpoint-sqlite / -postgres) behind
+    an LRU tier of recently used threads.
+    """
+    if backend == "memory":
+        return MemorySaver()
+
+    if backend == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        CHECKPOINT_SQLITE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        # SqliteSaver serializes access with its own lock, so the connection can be shared
+        conn = sqlite3.connect(str(CHECKPOINT_SQLITE_FILE), check_same_thread=False)
+        saver = SqliteSaver(conn)
+        saver.setup()
+        print(f"Checkpointer: SQLite at {CHECKPOINT_SQLITE_FILE}")
+        return LRUCheckpointSaver(saver)
+
+    if backend == "postgres":
+        try:
+            from langgraph.checkpoint.postgres import PostgresSaver
+            from psycopg.rows import dict_row
+            from psycopg_pool import ConnectionPool
+        except ImportError as error:
+            raise ImportError(
+                "The postgres checkpointer needs `pip install langgraph-checkpoint-postgres psycopg[binary,pool]`"
+            ) from error
+
+        pool = ConnectionPool(
+            CHECKPOINT_SQL_URL,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        )
+        saver = PostgresSaver(pool)
+        saver.setup()
+        print("Checkpointer: PostgreSQL")
+        return LRUCheckpointSaver(saver)
+
+    raise ValueError(f"Unknown CHECKPOINTER_BACKEND {backend!r}, expected memory, sqlite or postgres")
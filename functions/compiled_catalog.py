@@ -0,0 +1,269 @@
+from typing import List, Dict, Any, Optional, Tuple
+from pathlib import Path
+import numpy as np
+import argparse
+import threading
+import struct
+import json
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.house_catalog import CatalogBackend, page_bounds
+
+# Define path to house.json and its compiled form
+DATA_DIR = ROOT / 'data'
+HOUSE_FILE = DATA_DIR / 'house.json'
+COMPILED_HOUSE_FILE = DATA_DIR / 'house.catalog'
+
+# File layout:
+#   MAGIC | uint32 format version | uint32 header length | JSON header | sections
+# The header holds the area table and the offset/dtype/count of every section;
+# sections start on 8-byte boundaries so they can be viewed straight from the mmap.
+MAGIC = b"HOUSECAT"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+
+def _file_signature(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_houses(source: Path) -> List[Dict[str, Any]]:
+    with source.open("r", encoding="utf-8") as f:
+        if source.suffix == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def compile_house_catalog(source: Path = HOUSE_FILE, target: Path = COMPILED_HOUSE_FILE) -> int:
+    """
+    Compile a JSON (or JSON Lines) house catalog into the columnar binary format.
+
+    Houses are sorted by (City, District) and then price, keeping the file
+    order for equal prices, so every district is one contiguous run:
+      area_offsets  int64, run boundaries per area of the header's area table
+      prices        int32
+      name_offsets  int64, start of each CaseName in name_blob (plus the end)
+      name_blob     UTF-8 CaseNames, each followed by a newline
+    Returns the number of houses compiled.
+    """
+    source, target = Path(source), Path(target)
+    signature = _file_signature(source)
+    houses = _load_houses(source)
+
+    # Dictionary-encode (City, District) in order of first appearance
+    area_codes: Dict[Tuple[str, str], int] = {}
+    codes = np.fromiter(
+        (area_codes.setdefault((house["City"], house["District"]), len(area_codes)) for house in houses),
+        dtype=np.int32, count=len(houses)
+    )
+    prices = np.fromiter((house["Price"] for house in houses), dtype=np.int32, count=len(houses))
+
+    # lexsort is stable: by area, then price, then file order
+    order = np.lexsort((prices, codes))
+    prices = prices[order]
+    area_offsets = np.searchsorted(codes[order], np.arange(len(area_codes) + 1), side="left").astype(np.int64)
+
+    # Newline-terminated, so a run of names decodes with one decode().split()
+    names = [houses[i]["CaseName"].encode("utf-8") + b"\n" for i in order]
+    if any(name.count(b"\n") > 1 for name in names):
+        raise ValueError("CaseName must not contain newlines")
+    name_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=name_offsets[1:])
+    name_blob = np.frombuffer(b"".join(names), dtype=np.uint8)
+
+    sections = {"area_offsets": area_offsets, "prices": prices, "name_offsets": name_offsets, "name_blob": name_blob}
+    header = {
+        "houses": len(houses),
+        "areas": [list(area) for area in area_codes],
+        "source": {"name": source.name, "mtime_ns": signature[0], "size": signature[1]},
+        "sections": {},
+    }
+
+    # Offsets depend on the header length, so lay out twice until the header size is stable
+    header_bytes = b""
+    while True:
+        offset = len(MAGIC) + 8 + len(header_bytes)
+        for name, array in sections.items():
+            offset += -offset % ALIGNMENT
+            header["sections"][name] = {"offset": offset, "dtype": array.dtype.str, "count": len(array)}
+            offset += array.nbytes
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        stable = len(encoded) == len(header_bytes)
+        header_bytes = encoded
+        if stable:
+            break
+
+    # Write next to the target and swap it in, processes mapping the old file keep their pages
+    tmp = target.with_name(target.name + ".tmp")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with tmp.open("wb") as f:
+        f.write(MAGIC + struct.pack("<II", FORMAT_VERSION, len(header_bytes)) + header_bytes)
+        for name, array in sections.items():
+            f.write(b"\0" * (header["sections"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp, target)
+
+    print(f"House catalog compiled from {source.name} to {target.name} ({len(houses)} houses, {len(area_codes)} areas)")
+    return len(houses)
+
+
+class CompiledHouseCatalog(CatalogBackend):
+    """
+    Memory-mapped view of a compiled house catalog, a drop-in for HouseCatalog.
+
+    Loading only maps the file and parses the small header, so startup does
+    not depend on the catalog size, and every worker process shares the same
+    page cache instead of holding its own copy of millions of dicts. A search
+    is an area lookup plus a binary search over that area's sorted prices;
+    rows are only turned into dicts for the houses actually returned.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(Path(path))
+        self.houses = 0
+        self.source: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._areas: List[Tuple[str, str]] = []
+        self._area_codes: Dict[Tuple[str, str], int] = {}
+        self._area_offsets = np.zeros(1, dtype=np.int64)
+        self._prices = np.zeros(0, dtype=np.int32)
+        self._name_offsets = np.zeros(1, dtype=np.int64)
+        self._name_blob = np.zeros(0, dtype=np.uint8)
+
+    def is_stale(self) -> bool:
+        """Return True if the catalog was never loaded or the file changed since the last load."""
+        return _file_signature(self.path) != self._signature
+
+    def matches_source(self, source: Path) -> bool:
+        """True if the catalog was compiled from the current version of `source` (or `source` is gone)."""
+        try:
+            mtime_ns, size = _file_signature(source)
+        except FileNotFoundError:
+            return True
+        return self.source.get("mtime_ns") == mtime_ns and self.source.get("size") == size
+
+    def refresh(self) -> None:
+        """Map the catalog if it has never been loaded or the file was recompiled."""
+        signature = _file_signature(self.path)
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            # Another thread may have reloaded while we were waiting
+            signature = _file_signature(self.path)
+            if signature == self._signature:
+                return
+
+            # Plain ndarray view of the mapping, slicing a np.memmap subclass is much slower
+            buffer = np.memmap(self.path, dtype=np.uint8, mode="r").view(np.ndarray)
+            if bytes(buffer[:len(MAGIC)]) != MAGIC:
+                raise ValueError(f"{self.path} is not a compiled house catalog")
+            version, header_length = struct.unpack("<II", bytes(buffer[len(MAGIC):len(MAGIC) + 8]))
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{self.path} has format version {version}, expected {FORMAT_VERSION}")
+            start = len(MAGIC) + 8
+            header = json.loads(bytes(buffer[start:start + header_length]).decode("utf-8"))
+
+            def section(name: str) -> np.ndarray:
+                spec = header["sections"][name]
+                dtype = np.dtype(spec["dtype"])
+                return buffer[spec["offset"]:spec["offset"] + spec["count"] * dtype.itemsize].view(dtype)
+
+            self._areas = [tuple(area) for area in header["areas"]]
+            self._area_codes = {area: code for code, area in enumerate(self._areas)}
+            self._area_offsets = section("area_offsets")
+            self._prices = section("prices")
+            self._name_offsets = section("name_offsets")
+            self._name_blob = section("name_blob")
+            self.houses = header["houses"]
+            self.source = header["source"]
+            self._signature = signature
+            self.version += 1
+            print(f"House catalog mapped from {self.path.name} ({self.houses} houses, version {self.version})")
+
+        self._notify_reload()
+
+    def _match_range(self, city_county: str, district: str, price_lower_limit: int, price_upper_limit: int) -> Tuple[int, int]:
+        code = self._area_codes.get((city_county, district))
+        if code is None:
+            return 0, 0
+        start, stop = int(self._area_offsets[code]), int(self._area_offsets[code + 1])
+        prices = self._prices[start:stop]
+        lo = start + int(np.searchsorted(prices, price_lower_limit, side="left"))
+        hi = start + int(np.searchsorted(prices, price_upper_limit, side="right"))
+        # An inverted price range matches nothing
+        return lo, max(hi, lo)
+
+    def _rows(self, lo: int, hi: int, city: str, district: str) -> List[Dict[str, Any]]:
+        # One bulk read per column instead of a NumPy scalar access per field
+        prices = self._prices[lo:hi].tolist()
+        names = self._name_blob[self._name_offsets[lo]:self._name_offsets[hi]].tobytes().decode("utf-8").split("\n")
+        return [
+            {"City": city, "District": district, "Price": price, "CaseName": name}
+            for price, name in zip(prices, names)
+        ]
+
+    def search(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int
+    ) -> List[Dict[str, Any]]:
+        """Return the houses of a (City, District) whose price lies in the inclusive range, cheapest first."""
+        self.refresh()
+
+        lo, hi = self._match_range(city_county, district, price_lower_limit, price_upper_limit)
+        return self._rows(lo, hi, city_county, district)
+
+    def search_page(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Total number of matches plus one page of them; only the page's rows are decoded."""
+        self.refresh()
+
+        lo, hi = self._match_range(city_county, district, price_lower_limit, price_upper_limit)
+        start, stop = page_bounds(lo, hi, offset, limit, descending)
+        page = self._rows(start, stop, city_county, district)
+        if descending:
+            page.reverse()
+        return hi - lo, page
+
+
+_CATALOGS: Dict[Path, CompiledHouseCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_compiled_house_catalog(path: Path = COMPILED_HOUSE_FILE) -> CompiledHouseCatalog:
+    """Return the shared CompiledHouseCatalog for a compiled file, creating it on first use."""
+    # Looked up by the path as given first, resolving it costs a few syscalls per search
+    catalog = _CATALOGS.get(path)
+    if catalog is None:
+        resolved = Path(path).resolve()
+        with _CATALOGS_LOCK:
+            catalog = _CATALOGS.get(resolved) or _CATALOGS.setdefault(resolved, CompiledHouseCatalog(resolved))
+            _CATALOGS[path] = catalog
+    return catalog
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile house.json into the memory-mapped columnar catalog used by search_house.")
+    parser.add_argument("--source", type=Path, default=HOUSE_FILE)
+    parser.add_argument("--target", type=Path, default=COMPILED_HOUSE_FILE)
+    args = parser.parse_args()
+
+    compile_house_catalog(args.source, args.target)
@@ -1,16 +1,249 @@
+from typing import List, Dict, Any, Optional, Tuple
+from collections import defaultdict
+from pathlib import Path
+import argparse
+import threading
+import asyncio
+import hashlib
+import math
+import json
 import re
+import os
 
-def get_fengshui_advice(problem:str):
-    fenshui_advice = {
-        '對門煞' : "以前人覺得門與門相對，會擾亂氣流，造成心煩意亂，因此容易發生衝突。嚴重的話，甚至會導致家庭失和，進而破財，或發生血光之災。若以較為科學的角度來看，兩門正對的確會引起較大的對流。若門沒有緩衝，可能會被大力關上，讓人嚇一跳，或是誤以為對方大聲關門。長期下來，會導致心神不寧、居者感情不和諧。"
-        , '壓樑' : "傳統風水認為，橫梁猶如一把刀，若是懸在常坐的沙發或是床上，就如同懸掛著危險，輕則損及健康，容易造成腦神經衰弱、頭痛，重則危及生命。"
-        , '陽宅內六室':"內六事，包括了門、灶、路、井、厕、錐磨"
-        , '大門對廚房' : "傳統風水上講求“藏風聚氣”故此大門不宜對著廚房鋁門窗工程宅急便"
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+# Define path to the feng shui knowledge base and its prebuilt n-gram index
+DATA_DIR = ROOT / 'data'
+FENG_SHUI_FILE = DATA_DIR / 'feng_shui.json'
+FENG_SHUI_INDEX_FILE = DATA_DIR / 'feng_shui.index.json'
+INDEX_FORMAT_VERSION = 1
+
+# Matches scoring below this are left to the web search
+FENG_SHUI_MIN_SCORE = float(os.getenv("FENG_SHUI_MIN_SCORE", "0.5"))
+
+# Discount of a match scored by how much of the alias the question contains
+ALIAS_COVERAGE_WEIGHT = 0.8
+# A fuzzy match shares this many bigrams with the alias, or at least half of them,
+# so a single character or a common word like 大門 is not a feng shui problem by itself
+FENG_SHUI_MIN_SHARED_BIGRAMS = int(os.getenv("FENG_SHUI_MIN_SHARED_BIGRAMS", "2"))
+
+NO_RESULT = "目前沒有相關資料，搜尋網路上資料來做回覆"
+
+
+def clean_problem(text: str) -> str:
+    """Keep the CJK characters only, as the tool input used to be cleaned."""
+    return re.sub(r'[^\u4e00-\u9fff]', '', text or "")
+
+
+def char_ngrams(text: str) -> List[str]:
+    """Distinct characters and character bigrams of `text`."""
+    grams = dict.fromkeys(text)
+    grams.update(dict.fromkeys(text[i:i + 2] for i in range(len(text) - 1)))
+    return list(grams)
+
+
+def build_index(entries: List[Dict[str, Any]], source_sha256: str = "") -> Dict[str, Any]:
+    """
+    Inverted index over the names and synonyms of the knowledge base entries.
+
+    Every alias (a name or a synonym) is split into characters and bigrams;
+    `postings` maps a gram to the aliases containing it, `idf` weighs rare
+    grams higher and `norms` is each alias' total gram weight.
+    """
+    aliases: List[Tuple[str, int]] = []
+    for number, entry in enumerate(entries):
+        for alias in dict.fromkeys(clean_problem(alias) for alias in [entry["name"], *entry.get("synonyms", [])]):
+            if alias:
+                aliases.append((alias, number))
+
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for alias_number, (alias, _) in enumerate(aliases):
+        for gram in char_ngrams(alias):
+            postings[gram].append(alias_number)
+
+    idf = {gram: round(math.log(1 + len(aliases) / len(numbers)), 6) for gram, numbers in postings.items()}
+    norms = [round(sum(idf[gram] for gram in char_ngrams(alias)), 6) for alias, _ in aliases]
+    return {
+        "format": INDEX_FORMAT_VERSION,
+        "source_sha256": source_sha256,
+        "aliases": aliases,
+        "postings": dict(postings),
+        "idf": idf,
+        "norms": norms,
     }
-    problem = re.sub(r'[^\u4e00-\u9fff]', '', problem)
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def write_index(source: Path = FENG_SHUI_FILE, target: Path = FENG_SHUI_INDEX_FILE) -> int:
+    """Build the index of a knowledge base file and save it next to it; returns the number of aliases."""
+    with Path(source).open("r", encoding="utf-8") as f:
+        entries = json.load(f)
+    index = build_index(entries, _sha256(Path(source)))
+    with Path(target).open("w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"Feng shui index built from {Path(source).name} ({len(entries)} entries, {len(index['aliases'])} aliases)")
+    return len(index["aliases"])
+
+
+class FengShuiKnowledgeBase:
+    """
+    File-backed feng shui knowledge base with ranked fuzzy lookup.
+
+    An exact name or synonym is a dict lookup. Anything else is scored
+    against every alias sharing a character or bigram with it: the idf
+    weight of the shared grams over the geometric mean of both sides'
+    weights, so partial names, extra words and single typos still rank the
+    right entry first. Aliases sharing too few bigrams with the question
+    are skipped, a lone 門 or 大門 matches nothing. The prebuilt index is used when it matches the
+    knowledge base file, otherwise it is rebuilt in memory.
+    """
+
+    def __init__(self, path: Path = FENG_SHUI_FILE, index_path: Path = FENG_SHUI_INDEX_FILE):
+        self.path = Path(path)
+        self.index_path = Path(index_path)
+        self.entries: List[Dict[str, Any]] = []
+        self._exact: Dict[str, int] = {}
+        self._index: Dict[str, Any] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_stale(self) -> bool:
+        """True if refresh() has to (re)load the knowledge base file."""
+        return self._file_signature() != self._signature
+
+    def refresh(self) -> None:
+        """Load the knowledge base if it was never loaded or the file changed."""
+        if self._file_signature() == self._signature:
+            return
+        with self._lock:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+
+            with self.path.open("r", encoding="utf-8") as f:
+                entries = json.load(f)
+            sha256 = _sha256(self.path)
+
+            index = None
+            if self.index_path.exists():
+                with self.index_path.open("r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("format") != INDEX_FORMAT_VERSION or index.get("source_sha256") != sha256:
+                    print(f"Feng shui index {self.index_path.name} is out of date, rebuilding it in memory")
+                    index = None
+            if index is None:
+                index = build_index(entries, sha256)
+
+            self.entries = entries
+            self._index = index
+            self._exact = {alias: number for alias, number in index["aliases"]}
+            self._signature = signature
+            print(f"Feng shui knowledge base loaded from {self.path.name} ({len(entries)} entries)")
+
+    def search(self, problem: str, top_k: int = 3, min_score: float = FENG_SHUI_MIN_SCORE) -> List[Tuple[float, Dict[str, Any]]]:
+        """Best matching entries for a problem description as (score, entry), highest score first."""
+        self.refresh()
+        problem = clean_problem(problem)
+        if not problem:
+            return []
+
+        number = self._exact.get(problem)
+        if number is not None:
+            return [(1.0, self.entries[number])]
+
+        index = self._index
+        idf, postings = index["idf"], index["postings"]
+        grams = char_ngrams(problem)
+        # Grams unknown to the index still count towards the query weight
+        unknown_weight = math.log(1 + len(index["aliases"]))
+        query_norm = sum(idf.get(gram, unknown_weight) for gram in grams)
+
+        shared: Dict[int, float] = defaultdict(float)
+        shared_bigrams: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            weight = idf.get(gram)
+            if weight is not None:
+                for alias_number in postings[gram]:
+                    shared[alias_number] += weight
+                    if len(gram) == 2:
+                        shared_bigrams[alias_number] += 1
+
+        best: Dict[int, float] = {}
+        for alias_number, weight in shared.items():
+            alias = index["aliases"][alias_number][0]
+            bigrams = shared_bigrams[alias_number]
+            if bigrams < FENG_SHUI_MIN_SHARED_BIGRAMS and 2 * bigrams < len(set(alias[i:i + 2] for i in range(len(alias) - 1))):
+                continue
+            alias_norm = index["norms"][alias_number]
+            # A long question containing most of an alias still matches it, slightly discounted
+            score = max(weight / math.sqrt(query_norm * alias_norm), ALIAS_COVERAGE_WEIGHT * weight / alias_norm)
+            number = index["aliases"][alias_number][1]
+            if score > best.get(number, 0.0):
+                best[number] = score
+
+        ranked = sorted(((score, number) for number, score in best.items() if score >= min_score), key=lambda item: (-item[0], item[1]))
+        return [(round(score, 4), self.entries[number]) for score, number in ranked[:top_k]]
+
+
+    def find_aliases(self, text: str) -> List[Tuple[str, str]]:
+        """(alias, entry name) of every name or synonym contained in `text`, longest alias first."""
+        self.refresh()
+        text = clean_problem(text)
+        found = [(alias, self.entries[number]["name"]) for alias, number in self._exact.items() if alias in text]
+        return sorted(found, key=lambda item: -len(item[0]))
+
+
+_KNOWLEDGE_BASE = FengShuiKnowledgeBase()
+
+
+def find_fengshui_aliases(text: str) -> List[Tuple[str, str]]:
+    """The knowledge base names and synonyms a text mentions, as (alias, entry name)."""
+    return _KNOWLEDGE_BASE.find_aliases(text)
+
+
+def search_fengshui(problem: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    """Ranked knowledge base matches: name, score and advice of each."""
+    return [
+        {"name": entry["name"], "score": score, "advice": entry["advice"]}
+        for score, entry in _KNOWLEDGE_BASE.search(problem, top_k)
+    ]
+
+
+def get_fengshui_advice(problem:str):
+    problem = clean_problem(problem)
     print("'{0}'風水建議資料搜尋中 .....".format(problem))
 
-    if problem in fenshui_advice:
-        return fenshui_advice[problem] 
-    else :
-        return "目前沒有相關資料，搜尋網路上資料來做回覆"
+    matches = _KNOWLEDGE_BASE.search(problem, top_k=1)
+    if not matches:
+        return NO_RESULT
+
+    score, entry = matches[0]
+    if score == 1.0:
+        return entry["advice"]
+    # A fuzzy match names the problem it found, so the answer can say what it is about
+    return f"{entry['name']}：{entry['advice']}"
+
+
+async def aget_fengshui_advice(problem: str):
+    """Async version of get_fengshui_advice, the knowledge base file is only (re)loaded and indexed off the event loop."""
+    if _KNOWLEDGE_BASE.is_stale():
+        await asyncio.to_thread(_KNOWLEDGE_BASE.refresh)
+    # The lookup itself is in memory
+    return get_fengshui_advice(problem)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the n-gram index of the feng shui knowledge base.")
+    parser.add_argument("--source", type=Path, default=FENG_SHUI_FILE)
+    parser.add_argument("--target", type=Path, default=FENG_SHUI_INDEX_FILE)
+    args = parser.parse_args()
+
+    write_index(args.source, args.target)
@@ -0,0 +1,66 @@
+from typing import Deque, List, Optional, Tuple
+from collections import deque
+from pathlib import Path
+from dotenv import load_dotenv
+import threading
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.lru_cache import LRUCache
+
+# Turns kept per user, matches the LIMIT of get_user_messages
+HISTORY_TURNS = 5
+# Users whose recent turns are kept in memory
+HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "10000"))
+
+# (user_message, agent_message)
+Turn = Tuple[str, str]
+
+
+class ConversationHistoryCache:
+    """
+    Per-user ring buffer of the most recent conversation turns.
+
+    Filled from the database on the first lookup of a user, after the queued
+    chat turns were flushed, and then kept up to date write-through by
+    save_data, so history lookups for active users never reach PostgreSQL. Users are evicted least recently used first.
+    One lock guards the rings, so concurrent webhook workers never read a ring while it is appended to.
+    """
+
+    def __init__(self, max_users: int = HISTORY_CACHE_USERS, turns: int = HISTORY_TURNS):
+        self.turns = turns
+        self._users = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[List[Turn]]:
+        """Return the cached turns newest first (like the SQL query), or None on a miss."""
+        with self._lock:
+            ring: Optional[Deque[Turn]] = self._users.get(user_id)
+            if ring is None:
+                return None
+            return list(reversed(ring))
+
+    def put(self, user_id: str, rows: List[Turn]) -> None:
+        """Cache the rows loaded from the database, given newest first."""
+        ring = deque(reversed([tuple(row) for row in rows]), maxlen=self.turns)
+        with self._lock:
+            self._users.set(user_id, ring)
+
+    def append(self, user_id: str, user_message: str, agent_message: str) -> None:
+        """Add a new turn for a cached user; unknown users are loaded from the database later."""
+        with self._lock:
+            ring: Optional[Deque[Turn]] = self._users.peek(user_id)
+            if ring is not None:
+                ring.append((user_message, agent_message))
+
+    def stats(self):
+        return self._users.stats()
+
+
+history_cache = ConversationHistoryCache()
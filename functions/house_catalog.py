@@ -0,0 +1,272 @@
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable
+from pathlib import Path
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from itertools import islice
+import threading
+import heapq
+import json
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+# Define path to house.json
+DATA_DIR = ROOT / 'data'
+HOUSE_FILE = DATA_DIR / 'house.json'
+
+
+def page_bounds(lo: int, hi: int, offset: int, limit: Optional[int], descending: bool) -> Tuple[int, int]:
+    """
+    Ascending [start, stop) slice of the matches [lo, hi) holding one page.
+
+    A descending page is taken from the expensive end; callers reverse it.
+    """
+    if descending:
+        stop = max(hi - offset, lo)
+        start = lo if limit is None else max(stop - limit, lo)
+    else:
+        start = min(lo + offset, hi)
+        stop = hi if limit is None else min(start + limit, hi)
+    return start, stop
+
+
+def _price(house: Dict[str, Any]) -> int:
+    return house["Price"]
+
+
+class CatalogBackend(ABC):
+    """
+    Interface shared by every house catalog backend (JSON, compiled, SQLite, PostgreSQL).
+
+    `search` returns plain dicts with City, District, Price and CaseName,
+    cheapest first. `version` changes whenever the backend saw new data, so
+    cached results keyed on it are never served across a reload, and reload
+    listeners are called after each change.
+    """
+
+    # True when search does blocking I/O (a database round trip) and has to run off the event loop
+    blocking_search = False
+
+    def __init__(self, path: Any):
+        self.path = path
+        self.version = 0
+        self._reload_listeners: List[Callable[["CatalogBackend"], None]] = []
+
+    def add_reload_listener(self, listener: Callable[["CatalogBackend"], None]) -> None:
+        """Register a callback that is invoked after every (re)load of the catalog."""
+        self._reload_listeners.append(listener)
+
+    def _notify_reload(self) -> None:
+        for listener in self._reload_listeners:
+            listener(self)
+
+    def is_stale(self) -> bool:
+        """Return True if refresh() has new data to load."""
+        return False
+
+    def refresh(self) -> None:
+        """Pick up changed data, bumping `version`; a no-op for backends that are always current."""
+
+    @abstractmethod
+    def search(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int
+    ) -> List[Dict[str, Any]]:
+        """Return the houses of a (City, District) whose price lies in the inclusive range, cheapest first."""
+
+    def search_page(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Total number of matches plus one page of them, in price order.
+
+        Descending order is the exact reverse of ascending. Backends override
+        this so that only the rows of the page are ever built.
+        """
+        houses = self.search(city_county, district, price_lower_limit, price_upper_limit)
+        start, stop = page_bounds(0, len(houses), offset, limit, descending)
+        page = houses[start:stop]
+        if descending:
+            page.reverse()
+        return len(houses), page
+
+    def search_areas(
+        self,
+        areas: Sequence[Tuple[str, str]],
+        price_lower_limit: int,
+        price_upper_limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Houses of several (City, District) areas, cheapest first.
+
+        Every area's postings are already sorted by price, so this is a k-way
+        heap merge; equal prices keep the order of `areas`.
+        """
+        if len(areas) == 1:
+            return self.search(*areas[0], price_lower_limit, price_upper_limit)
+        postings = [self.search(city, district, price_lower_limit, price_upper_limit) for city, district in areas]
+        return list(heapq.merge(*postings, key=_price))
+
+    def search_areas_page(
+        self,
+        areas: Sequence[Tuple[str, str]],
+        price_lower_limit: int,
+        price_upper_limit: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        search_page over several areas: the total of all of them plus one merged page.
+
+        Only the first offset + limit houses of an area can end up on the
+        page, so no area builds more rows than that. Descending order is the
+        exact reverse of search_areas.
+        """
+        if len(areas) == 1:
+            return self.search_page(*areas[0], price_lower_limit, price_upper_limit, offset, limit, descending)
+
+        depth = None if limit is None else offset + limit
+        total, postings = 0, []
+        # Reversed area order keeps ties in the exact reverse of the ascending merge
+        for city, district in (reversed(areas) if descending else areas):
+            count, rows = self.search_page(city, district, price_lower_limit, price_upper_limit, 0, depth, descending)
+            total += count
+            if rows:
+                postings.append(rows)
+        merged = heapq.merge(*postings, key=_price, reverse=descending)
+        return total, list(islice(merged, offset, depth))
+
+
+class HouseCatalog(CatalogBackend):
+    """
+    Process-wide, in-memory view of a house catalog file.
+
+    The file is parsed once and only re-parsed when its mtime (or size) changes.
+    Houses are indexed by (City, District); every posting list is sorted by
+    price so a price range lookup is a dict hit plus a bisect slice.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(Path(path))
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+        # (City, District) -> (sorted prices, houses in the same order)
+        self._index: Dict[Tuple[str, str], Tuple[List[int], List[Dict[str, Any]]]] = {}
+
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _build_index(self, house_data: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Tuple[List[int], List[Dict[str, Any]]]]:
+        grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for house in house_data:
+            grouped.setdefault((house["City"], house["District"]), []).append(house)
+
+        index = {}
+        for key, houses in grouped.items():
+            # Stable sort keeps the file order for houses with the same price
+            houses.sort(key=lambda house: house["Price"])
+            index[key] = ([house["Price"] for house in houses], houses)
+        return index
+
+    def is_stale(self) -> bool:
+        """Return True if the catalog was never loaded or the file changed since the last load."""
+        return self._file_signature() != self._signature
+
+    def refresh(self) -> None:
+        """Load the catalog if it has never been loaded or the file changed on disk."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            # Another thread may have reloaded while we were waiting
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+
+            with self.path.open("r", encoding="utf-8") as f:
+                house_data = json.load(f)
+
+            self._index = self._build_index(house_data)
+            self._signature = signature
+            self.version += 1
+            print(f"House catalog loaded from {self.path.name} ({len(house_data)} houses, version {self.version})")
+
+        self._notify_reload()
+
+    def search(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int
+    ) -> List[Dict[str, Any]]:
+        """Return the houses of a (City, District) whose price lies in the inclusive range, cheapest first."""
+        self.refresh()
+
+        postings = self._index.get((city_county, district))
+        if postings is None:
+            return []
+
+        prices, houses = postings
+        lo = bisect_left(prices, price_lower_limit)
+        hi = bisect_right(prices, price_upper_limit)
+
+        # Hand out copies so callers can never mutate the shared index
+        return [dict(house) for house in houses[lo:hi]]
+
+    def search_page(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Total number of matches plus one page of them; only the page's houses are copied."""
+        self.refresh()
+
+        postings = self._index.get((city_county, district))
+        if postings is None:
+            return 0, []
+
+        prices, houses = postings
+        lo = bisect_left(prices, price_lower_limit)
+        # An inverted price range matches nothing
+        hi = max(bisect_right(prices, price_upper_limit), lo)
+        start, stop = page_bounds(lo, hi, offset, limit, descending)
+
+        page = [dict(house) for house in houses[start:stop]]
+        if descending:
+            page.reverse()
+        return hi - lo, page
+
+
+_CATALOGS: Dict[Path, HouseCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_house_catalog(path: Path = HOUSE_FILE) -> HouseCatalog:
+    """Return the shared HouseCatalog for a catalog file, creating it on first use."""
+    # Looked up by the path as given first, resolving it costs a few syscalls per search
+    catalog = _CATALOGS.get(path)
+    if catalog is None:
+        resolved = Path(path).resolve()
+        with _CATALOGS_LOCK:
+            catalog = _CATALOGS.get(resolved) or _CATALOGS.setdefault(resolved, HouseCatalog(resolved))
+            _CATALOGS[path] = catalog
+    return catalog
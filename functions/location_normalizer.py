@@ -0,0 +1,309 @@
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+from functools import lru_cache
+from pathlib import Path
+import unicodedata
+import threading
+import json
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+# Define path to the city/district reference data
+DATA_DIR = ROOT / 'data'
+CITY_COUNTY_FILE = DATA_DIR / 'CityCountyData.json'
+
+# Resolved (city, district) inputs kept in memory
+LOCATION_CACHE_SIZE = int(os.getenv("LOCATION_CACHE_SIZE", "4096"))
+
+# Traditional -> simplified for every character of CityCountyData.json that differs,
+# used to accept simplified spellings of the place names
+SIMPLIFIED_CHARACTERS = str.maketrans({
+    "來": "来", "內": "内", "勢": "势", "區": "区", "員": "员", "國": "国", "圍": "围", "園": "园",
+    "壇": "坛", "壢": "坜", "壯": "壮", "壽": "寿", "學": "学", "寧": "宁", "寶": "宝", "將": "将",
+    "巒": "峦", "島": "岛", "峽": "峡", "崙": "仑", "嶼": "屿", "庫": "库", "廟": "庙", "彌": "弥",
+    "後": "后", "復": "复", "恆": "恒", "愛": "爱", "東": "东", "棲": "栖", "楊": "杨", "榮": "荣",
+    "樂": "乐", "樹": "树", "橋": "桥", "橫": "横", "歸": "归", "滿": "满", "濃": "浓", "濱": "滨",
+    "灣": "湾", "烏": "乌", "營": "营", "獅": "狮", "瑪": "玛", "結": "结", "綠": "绿", "線": "线",
+    "縣": "县", "羅": "罗", "義": "义", "腳": "脚", "臺": "台", "興": "兴", "莊": "庄", "華": "华",
+    "萬": "万", "蓮": "莲", "蘆": "芦", "蘇": "苏", "蘭": "兰", "裡": "里", "觀": "观", "豐": "丰",
+    "貢": "贡", "車": "车", "軍": "军", "連": "连", "達": "达", "邊": "边", "鄉": "乡", "釣": "钓",
+    "銅": "铜", "鎮": "镇", "鑼": "锣", "長": "长", "門": "门", "間": "间", "關": "关", "雙": "双",
+    "雲": "云", "霧": "雾", "頂": "顶", "頭": "头", "館": "馆", "馬": "马", "魚": "鱼", "鳥": "鸟",
+    "鳳": "凤", "鶯": "莺", "鹽": "盐", "麥": "麦", "龍": "龙", "龜": "龟",
+})
+
+CITY_SUFFIXES = ("市", "縣")
+DISTRICT_SUFFIXES = ("區", "鄉", "鎮", "市")
+ENGLISH_SUFFIXES = ("district", "dist", "township", "city", "county", "islands")
+
+
+def clean_text(text: Optional[str]) -> str:
+    """Full-width to half-width, no whitespace, lower case."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return "".join(text.split()).lower()
+
+
+def _english_key(text: str) -> str:
+    return "".join(ch for ch in clean_text(text) if ch.isalnum())
+
+
+def _english_aliases(name: str, extra_suffix: str = "") -> Set[str]:
+    # "Zhongzheng Dist." -> zhongzhengdist, zhongzheng and zhongzhengdistrict
+    key = _english_key(name)
+    aliases = {key}
+    for suffix in ENGLISH_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            base = key[:-len(suffix)]
+            aliases.update({base, base + extra_suffix})
+    return aliases
+
+
+def _chinese_aliases(name: str, suffixes: Tuple[str, ...]) -> Set[str]:
+    forms = {name, name.replace("臺", "台"), name.translate(SIMPLIFIED_CHARACTERS)}
+    aliases = set(forms)
+    if name.endswith(suffixes) and len(name) > 2:
+        # "臺北" for "臺北市", "中正" for "中正區"; one-character stems like "東" are too ambiguous
+        aliases.update(form[:-1] for form in forms)
+    return aliases
+
+
+# Chinese names this short are never corrected: one changed character (中山區 -> 中區, 臺北縣 -> 臺北市)
+# is as likely another real place as a typo
+FUZZY_MIN_CJK_LENGTH = 4
+
+
+def one_substitution(a: str, b: str) -> bool:
+    """True if two strings of the same length differ in exactly one character."""
+    return len(a) == len(b) and sum(ca != cb for ca, cb in zip(a, b)) == 1
+
+
+class _AliasMap:
+    """Alias -> canonical value; an alias shared by different values is ambiguous and dropped."""
+
+    def __init__(self):
+        self._values: Dict[str, Set[Any]] = {}
+        self.exact: Dict[str, Any] = {}
+
+    def add(self, alias: str, value: Any) -> None:
+        if alias:
+            self._values.setdefault(alias, set()).add(value)
+
+    def build(self, canonical: Dict[str, Any]) -> None:
+        # Canonical names always win over another value's alias
+        self.exact = {alias: next(iter(values)) for alias, values in self._values.items() if len(values) == 1}
+        self.exact.update(canonical)
+
+    def get(self, alias: str) -> Optional[Any]:
+        return self.exact.get(alias)
+
+    def closest(self, text: str) -> Optional[Any]:
+        """
+        The value of the alias one substituted character away from `text`, if exactly one value is.
+
+        Short Chinese names are never corrected, see FUZZY_MIN_CJK_LENGTH.
+        """
+        if not text.isascii() and len(text) < FUZZY_MIN_CJK_LENGTH:
+            return None
+        matches = {value for alias, value in self.exact.items() if one_substitution(text, alias)}
+        return next(iter(matches)) if len(matches) == 1 else None
+
+
+class LocationNormalizer:
+    """
+    Maps free-form city and district input to the canonical names of CityCountyData.json.
+
+    Accepted spellings are 台/臺 variants, names without their 市/縣 or
+    區/鄉/鎮/市 suffix, simplified characters, English names (with or without
+    "City"/"Dist."), zip codes and a city and district written in one string.
+    Exact aliases are dict lookups; only unknown input falls back to a
+    single substituted character, never for 2-3 character Chinese names, and
+    normalize_location memoizes the results. Anything else is returned as
+    given, so a place that does not exist finds nothing.
+    """
+
+    def __init__(self, areas: Iterable[Dict[str, Any]]):
+        self.cities: List[str] = []
+        self.districts: Dict[str, List[str]] = {}
+        self.zip_codes: Dict[Tuple[str, str], str] = {}
+        self.areas_by_zip: Dict[str, List[Tuple[str, str]]] = {}
+        self._city_aliases = _AliasMap()
+        self._district_aliases: Dict[str, _AliasMap] = {}
+        self._global_district_aliases = _AliasMap()
+        self._city_trie: Dict[str, Any] = {}
+
+        for city in areas:
+            city_name = city["CityName"]
+            self.cities.append(city_name)
+            self.districts[city_name] = []
+            aliases = _chinese_aliases(city_name, CITY_SUFFIXES) | _english_aliases(city.get("CityEngName", ""))
+            for alias in aliases:
+                self._city_aliases.add(alias, city_name)
+
+            district_aliases = self._district_aliases[city_name] = _AliasMap()
+            for area in city["AreaList"]:
+                name = area["AreaName"]
+                self.districts[city_name].append(name)
+                self.zip_codes[(city_name, name)] = area["ZipCode"]
+                self.areas_by_zip.setdefault(area["ZipCode"], []).append((city_name, name))
+                for alias in _chinese_aliases(name, DISTRICT_SUFFIXES) | _english_aliases(area.get("AreaEngName", ""), "district"):
+                    district_aliases.add(alias, name)
+                    self._global_district_aliases.add(alias, (city_name, name))
+            district_aliases.build({name: name for name in self.districts[city_name]})
+
+        self._city_aliases.build({name: name for name in self.cities})
+        self._global_district_aliases.build({})
+
+        # Character trie over the Chinese city aliases, to split "台北市中正區" into city and district
+        for alias, city_name in self._city_aliases.exact.items():
+            if alias.isascii():
+                continue
+            node = self._city_trie
+            for ch in alias:
+                node = node.setdefault(ch, {})
+            node[""] = city_name
+
+    def _split_city_prefix(self, text: str) -> Tuple[Optional[str], str]:
+        """Longest city alias at the start of `text`, plus the rest of the text."""
+        node, found, end = self._city_trie, None, 0
+        for i, ch in enumerate(text):
+            node = node.get(ch)
+            if node is None:
+                break
+            if "" in node:
+                found, end = node[""], i + 1
+        if text[end:].startswith(CITY_SUFFIXES):
+            # 臺北縣 is not 臺北市 with a district 縣, it names no current city
+            return None, text
+        return found, text[end:]
+
+    def resolve_city(self, text: str) -> Optional[str]:
+        text = clean_text(text)
+        if not text:
+            return None
+        return self._city_aliases.get(text) or self._city_aliases.closest(text)
+
+    def resolve_district(self, city: str, text: str) -> Optional[str]:
+        text = clean_text(text)
+        aliases = self._district_aliases.get(city)
+        if not text or aliases is None:
+            return None
+        if text.isdigit():
+            return next((district for zip_city, district in self.areas_by_zip.get(text, []) if zip_city == city), None)
+        return aliases.get(text) or aliases.closest(text)
+
+    def normalize(self, city_county: Optional[str], district: Optional[str]) -> Tuple[str, str]:
+        """
+        Canonical (City, District) for the given input.
+
+        Parts that cannot be resolved are returned cleaned, with 台 written as
+        臺, so an unknown place still finds nothing instead of a wrong place.
+        """
+        city_text, district_text = clean_text(city_county), clean_text(district)
+
+        # A zip code alone identifies the area when it is not shared
+        for text in (district_text, city_text):
+            if text.isdigit() and len(self.areas_by_zip.get(text, [])) == 1:
+                return self.areas_by_zip[text][0]
+
+        city = self._city_aliases.get(city_text) if city_text else None
+        if city is None and city_text:
+            prefix_city, rest = self._split_city_prefix(city_text)
+            if prefix_city is not None and rest:
+                city, district_text = prefix_city, district_text or rest
+            else:
+                city = self._city_aliases.closest(city_text)
+
+        if city is None:
+            # District without (a recognizable) city, usable when the district name is unique
+            area = self._global_district_aliases.get(district_text) if district_text else None
+            if area is not None and not city_text:
+                return area
+            return city_text.replace("台", "臺"), district_text.replace("台", "臺")
+
+        if not district_text:
+            return city, ""
+        return city, self.resolve_district(city, district_text) or district_text.replace("台", "臺")
+
+    def find_areas(self, text: str) -> Tuple[Tuple[str, str], ...]:
+        """
+        Every (City, District) named in a free-form sentence, sorted.
+
+        A city without any of its districts in the text counts as (City, "").
+        Without a city, a district name counts for every city having such a
+        district, e.g. 中正區 for both 臺北市 and 基隆市. English names are not
+        looked for.
+        """
+        text = clean_text(text)
+        cities = set()
+        for start in range(len(text)):
+            city, _ = self._split_city_prefix(text[start:])
+            if city is not None:
+                cities.add(city)
+
+        areas = set()
+        for city in cities or self.cities:
+            found = {
+                district for alias, district in self._district_aliases[city].exact.items()
+                if not alias.isascii() and alias in text
+            }
+            if found or cities:
+                areas.update((city, district) for district in found or [""])
+        return tuple(sorted(areas))
+
+    def strip_areas(self, text: str) -> str:
+        """`text` cleaned like find_areas sees it, without the names of the areas it finds."""
+        text = clean_text(text)
+        areas = self.find_areas(text)
+        cities = {city for city, _ in areas}
+        aliases = {alias for alias, city in self._city_aliases.exact.items() if city in cities}
+        for city, district in areas:
+            if district:
+                aliases.update(alias for alias, name in self._district_aliases[city].exact.items() if name == district)
+        # Longest first, so 中正區 goes as a whole before 中正 is looked for
+        for alias in sorted(aliases, key=len, reverse=True):
+            if not alias.isascii():
+                text = text.replace(alias, "")
+        return text
+
+    def areas_in_zip_range(self, lower: str, upper: str) -> List[Tuple[str, str]]:
+        """Every (City, District) whose zip code lies in the inclusive range, in zip code order; none for a non-numeric bound."""
+        try:
+            lower, upper = int(lower), int(upper)
+        except (TypeError, ValueError):
+            return []
+        return [
+            area
+            for code in sorted(self.areas_by_zip, key=int)
+            if lower <= int(code) <= upper
+            for area in self.areas_by_zip[code]
+        ]
+
+
+_NORMALIZER: Optional[LocationNormalizer] = None
+_NORMALIZER_LOCK = threading.Lock()
+
+
+def get_location_normalizer(path: Path = CITY_COUNTY_FILE) -> LocationNormalizer:
+    """Return the process-wide LocationNormalizer, building it from CityCountyData.json on first use."""
+    global _NORMALIZER
+    if _NORMALIZER is None:
+        with _NORMALIZER_LOCK:
+            if _NORMALIZER is None:
+                with Path(path).open("r", encoding="utf-8") as f:
+                    _NORMALIZER = LocationNormalizer(json.load(f))
+    return _NORMALIZER
+
+
+@lru_cache(maxsize=LOCATION_CACHE_SIZE)
+def normalize_location(city_county: Optional[str], district: Optional[str]) -> Tuple[str, str]:
+    """Memoized LocationNormalizer.normalize on the shared normalizer."""
+    return get_location_normalizer().normalize(city_county, district)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python functions/location_normalizer.py <city> [district]")
+        sys.exit(1)
+    print(normalize_location(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else ""))
@@ -0,0 +1,255 @@
+from typing import Any, Callable, List, Optional, Tuple
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+import psycopg2
+import threading
+import atexit
+import queue
+import json
+import time
+import uuid
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.postgresql_pool import get_pool, PostgresConnectionPool
+from functions.tracing import span
+
+DATA_DIR = ROOT / 'data'
+
+# Flush pending messages after this many seconds or this many turns, whichever comes first
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", "1.0"))
+CHAT_FLUSH_SIZE = int(os.getenv("CHAT_FLUSH_SIZE", "100"))
+CHAT_FLUSH_RETRIES = int(os.getenv("CHAT_FLUSH_RETRIES", "3"))
+# Turns that could not be written are kept here and replayed once the database is back
+CHAT_SPILL_FILE = Path(os.getenv("CHAT_SPILL_FILE", DATA_DIR / 'chat_message_spill.jsonl'))
+# Turns the database rejected (bad data), kept for inspection and never retried
+CHAT_DEAD_LETTER_FILE = Path(os.getenv("CHAT_DEAD_LETTER_FILE", DATA_DIR / 'chat_message_dead_letter.jsonl'))
+
+# Errors caused by the rows themselves, retrying the same rows cannot succeed
+DATA_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+# (user_id, user_message, agent_message, timestamp, turn_id)
+ChatTurn = Tuple[str, str, str, datetime, str]
+
+
+class ChatMessageWriter:
+    """
+    Write-behind persistence for chat turns.
+
+    `enqueue` only puts the user/agent message pair on a queue; a background
+    thread inserts the pending pairs with one multi-row INSERT per table.
+    Batches failing on the connection are retried with backoff and then
+    spilled to a JSON Lines file, which is replayed in its own batch on the
+    next flush. Batches the database rejects are not retried: they are
+    inserted turn by turn and the rejected turns go to a dead letter file.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = CHAT_FLUSH_INTERVAL,
+        flush_size: int = CHAT_FLUSH_SIZE,
+        max_retries: int = CHAT_FLUSH_RETRIES,
+        spill_file: Path = CHAT_SPILL_FILE,
+        dead_letter_file: Path = CHAT_DEAD_LETTER_FILE,
+        pool_getter: Callable[[], PostgresConnectionPool] = get_pool
+    ):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_retries = max_retries
+        self.spill_file = Path(spill_file)
+        self.dead_letter_file = Path(dead_letter_file)
+        self.pool_getter = pool_getter
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stopped = False
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="chat-message-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, user_id: str, user_message: str, agent_message: str, timestamp: datetime, turn_id: Optional[str] = None) -> str:
+        """Queue one chat turn for the next batch and return its turn id."""
+        turn_id = turn_id or uuid.uuid4().hex
+        self._ensure_thread()
+        self._queue.put((user_id, user_message, agent_message, timestamp, turn_id))
+        return turn_id
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write every queued turn now; returns False if the flush did not finish in time."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush the queue and stop the background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._stopped = True
+        self.flush(timeout)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        pending: List[ChatTurn] = []
+        waiters: List[threading.Event] = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    pending.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if waiters or due or len(pending) >= self.flush_size:
+                if pending:
+                    self._write_with_retry(pending)
+                pending, deadline = [], None
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+                if self._stopped and self._queue.empty():
+                    return
+
+    def _insert(self, turns: List[ChatTurn]) -> None:
+        with span("sql.insert_chat_turns", turns=len(turns)), self.pool_getter().connection() as conn:
+            cursor = conn.cursor()
+            execute_values(
+                cursor,
+                "INSERT INTO usermessage(user_id,user_message,timestamp,turn_id) VALUES %s",
+                [(user_id, user_message, timestamp, turn_id) for user_id, user_message, _, timestamp, turn_id in turns],
+            )
+            execute_values(
+                cursor,
+                "INSERT INTO agentmessage(user_id,agent_message,timestamp,turn_id) VALUES %s",
+                [(user_id, agent_message, timestamp, turn_id) for user_id, _, agent_message, timestamp, turn_id in turns],
+            )
+            conn.commit()
+            cursor.close()
+
+    def _write_with_retry(self, turns: List[ChatTurn]) -> None:
+        # Spilled turns go in their own batch, a bad old row must not hold back new turns
+        if self.spill_file.exists() and not self._replay_spill():
+            # Still unreachable, queue the new turns behind them without waiting in backoff
+            self._spill(turns, self.spill_file)
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._insert(turns)
+                print(f"PostgreSQL Inserting Success ({len(turns)} chat turns)")
+                return
+            except DATA_ERRORS as error:
+                # Retrying cannot fix the data, find the bad rows instead
+                print(f"Error PostgreSQL Inserting Fail (rejected batch): {error}")
+                self._spill(self._insert_one_by_one(turns), self.spill_file)
+                return
+            except (Exception, psycopg2.Error) as error:
+                print(f"Error PostgreSQL Inserting Fail (attempt {attempt + 1}): {error}")
+                if attempt < self.max_retries:
+                    time.sleep(min(0.5 * 2 ** attempt, 10))
+
+        self._spill(turns, self.spill_file)
+
+    def _replay_spill(self) -> bool:
+        """Insert the spilled turns once; returns False if the database is still unreachable."""
+        spilled = self._read_spill()
+        try:
+            if spilled:
+                self._insert(spilled)
+                print(f"PostgreSQL replayed {len(spilled)} spilled chat turns")
+            self.spill_file.unlink()
+            return True
+        except DATA_ERRORS as error:
+            print(f"Error PostgreSQL Replaying Fail (rejected batch): {error}")
+        except (Exception, psycopg2.Error) as error:
+            print(f"Error PostgreSQL Replaying Fail: {error}")
+            return False
+
+        remaining = self._insert_one_by_one(spilled)
+        self.spill_file.unlink()
+        self._spill(remaining, self.spill_file)
+        return not remaining
+
+    def _insert_one_by_one(self, turns: List[ChatTurn]) -> List[ChatTurn]:
+        """Insert turn by turn, moving rejected turns to the dead letter file; returns the turns left unwritten."""
+        for index, turn in enumerate(turns):
+            try:
+                self._insert([turn])
+            except DATA_ERRORS as error:
+                print(f"Error PostgreSQL Inserting Fail (turn {turn[4]} rejected): {error}")
+                self._spill([turn], self.dead_letter_file)
+            except (Exception, psycopg2.Error) as error:
+                print(f"Error PostgreSQL Inserting Fail: {error}")
+                return turns[index:]
+        return []
+
+    def _read_spill(self) -> List[ChatTurn]:
+        if not self.spill_file.exists():
+            return []
+        turns = []
+        with self.spill_file.open("r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    turns.append((row["user_id"], row["user_message"], row["agent_message"], datetime.fromisoformat(row["timestamp"]), row["turn_id"]))
+        return turns
+
+    def _spill(self, turns: List[ChatTurn], path: Path) -> None:
+        if not turns:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            for user_id, user_message, agent_message, timestamp, turn_id in turns:
+                row = {
+                    "user_id": user_id,
+                    "user_message": user_message,
+                    "agent_message": agent_message,
+                    "timestamp": timestamp.isoformat(),
+                    "turn_id": turn_id,
+                }
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        print(f"Spilled {len(turns)} chat turns to {path.name}")
+
+
+_WRITER: Optional[ChatMessageWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_chat_message_writer() -> ChatMessageWriter:
+    """Return the process-wide ChatMessageWriter, creating it on first use."""
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = ChatMessageWriter()
+    return _WRITER
+
+
+@atexit.register
+def flush_chat_messages() -> None:
+    """Shutdown hook: write every queued chat turn before the process exits."""
+    if _WRITER is not None:
+        _WRITER.close()
@@ -1,6 +1,9 @@
 import psycopg2
+import asyncpg
+import asyncio
 from dotenv import load_dotenv
 import os
+import sys
 from datetime import datetime
 from pathlib import Path
 
@@ -10,48 +13,43 @@ ROOT = FILE.parents[1]
 load_dotenv(ROOT / '.env')
 
 SQL_URL = os.getenv("SQL_URL")
+# Seconds a history cache miss waits for the queued chat turns to be written
+HISTORY_FLUSH_TIMEOUT = float(os.getenv("HISTORY_FLUSH_TIMEOUT", "5"))
 
-def save_data(user : dict ,  agent : dict):
-    user_insert_sql = '''
-            INSERT INTO usermessage(user_id,user_message,timestamp)
-            VALUES ( %s , %s , %s )
-            RETURNING *;
-    '''
-    agent_insert_sql = '''
-            INSERT INTO agentmessage(user_id,agent_message,timestamp)
-            VALUES ( %s , %s , %s )
-            RETURNING *;
-    '''
-    
-    try:
-        # connect to database
-        conn = psycopg2.connect(SQL_URL)
-        cursor = conn.cursor()
-        
-        # Formate
-        timestamp_dt = datetime.fromtimestamp(user['timestamp'] / 1000.0) 
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.postgresql_pool import get_pool, get_async_pool
+from functions.message_writer import get_chat_message_writer
+from functions.history_cache import history_cache
+from functions.tracing import span
 
-        user_save_data = (user['user_id'],user['user_message'],timestamp_dt,)
-        agent_save_data = (user['user_id'],agent['agent_message'],timestamp_dt,)
+def save_data(user : dict ,  agent : dict):
+    """
+    Queue a user/agent message pair for the write-behind writer.
 
-        cursor.execute(user_insert_sql , user_save_data)
-        print('#user: '+ str(cursor.fetchall()))
-        cursor.execute(agent_insert_sql , agent_save_data)
-        print("#agent: "+ str(cursor.fetchall()))
-        conn.commit()
+    Returns immediately; the pair is inserted by the background flusher in a
+    multi-row batch (see functions/message_writer.py).
+    """
+    # Formate
+    timestamp_dt = datetime.fromtimestamp(user['timestamp'] / 1000.0) 
 
-        cursor.close()
-        conn.close()
-        print(f"PostgreSQL Inserting Success")
-        
-    except (Exception, psycopg2.Error) as error:
-        print(f"Error PostgreSQL Inserting Fail: {error}")
+    get_chat_message_writer().enqueue(user['user_id'], user['user_message'], agent['agent_message'], timestamp_dt)
+    # Write-through so the next history lookup of this user is served from memory
+    history_cache.append(user['user_id'], user['user_message'], agent['agent_message'])
 
 def get_user_messages( user_id : str):
     user_target = (user_id,)
+    # Active users are served from the in-process ring buffer
+    cached = history_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # Turns of this user may still sit in the write-behind queue, write them
+    # first so the ring cached below is not missing them
+    get_chat_message_writer().flush(HISTORY_FLUSH_TIMEOUT)
+
     # Use JOIN to get Messages by user_id
     # The value contain user and agent
-    # Time can be the condition to descide which one needed to group togather . 
+    # turn_id links a user message to its answer, (user_id, timestamp) is indexed
     sql_join = '''
         SELECT 
             usermessage.user_message,
@@ -59,8 +57,7 @@ def get_user_messages( user_id : str):
         FROM 
             usermessage
         INNER JOIN 
-            agentmessage ON usermessage.user_id = agentmessage.user_id 
-            AND usermessage.timestamp = agentmessage.timestamp
+            agentmessage ON agentmessage.turn_id = usermessage.turn_id
         WHERE 
             usermessage.user_id = %s 
         ORDER BY 
@@ -69,20 +66,62 @@ def get_user_messages( user_id : str):
     '''
 
     try :
-        conn = psycopg2.connect(SQL_URL)
-        cursor = conn.cursor()
-        cursor.execute(sql_join ,  user_target)
-        data_list = cursor.fetchall()
+        with span("sql.get_user_messages"), get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql_join ,  user_target)
+            data_list = cursor.fetchall()
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
         print(f"PostgreSQL Selecting Success")
+        history_cache.put(user_id, data_list)
         return data_list
 
     except (Exception, psycopg2.Error) as error:
          print(f"Error PostgreSQL Selecting Fail: {error}")
 
+async def asave_data(user : dict ,  agent : dict):
+    """Async counterpart of save_data, queuing never blocks the event loop."""
+    save_data(user, agent)
+
+async def aget_user_messages( user_id : str):
+    """Async counterpart of get_user_messages using the asyncpg pool."""
+    cached = history_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # Same as get_user_messages, without blocking the event loop while waiting
+    await asyncio.to_thread(get_chat_message_writer().flush, HISTORY_FLUSH_TIMEOUT)
+
+    sql_join = '''
+        SELECT 
+            usermessage.user_message,
+            agentmessage.agent_message
+        FROM 
+            usermessage
+        INNER JOIN 
+            agentmessage ON agentmessage.turn_id = usermessage.turn_id
+        WHERE 
+            usermessage.user_id = $1 
+        ORDER BY 
+            usermessage.timestamp DESC
+        LIMIT 5;
+    '''
+
+    try :
+        with span("sql.get_user_messages"):
+            pool = await get_async_pool()
+            rows = await pool.fetch(sql_join, user_id)
+
+        print(f"PostgreSQL Selecting Success")
+        # Same shape as get_user_messages: a list of (user_message, agent_message)
+        data_list = [tuple(row) for row in rows]
+        history_cache.put(user_id, data_list)
+        return data_list
+
+    except (Exception, asyncpg.PostgresError) as error:
+         print(f"Error PostgreSQL Selecting Fail: {error}")
+
 if __name__ == "__main__":
 
     user_id = "U50103dd3166e13e2ffa18b6b2266c77f"
@@ -102,4 +141,5 @@ if __name__ == "__main__":
     }
 
     save_data(user,  agent)
+    get_chat_message_writer().flush()
     print(get_user_messages(user_id))
\ No newline at end of file
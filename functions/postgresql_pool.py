@@ -0,0 +1,255 @@
+from typing import Any, Callable, List, Optional, Tuple
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from psycopg2.pool import PoolError
+import psycopg2
+import asyncpg
+import asyncio
+import threading
+import weakref
+import time
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+SQL_URL = os.getenv("SQL_URL")
+SQL_POOL_MIN = int(os.getenv("SQL_POOL_MIN", "1"))
+SQL_POOL_MAX = int(os.getenv("SQL_POOL_MAX", "10"))
+# Idle connections older than this (seconds) are pinged before being handed out
+SQL_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("SQL_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Errors that mean the connection itself is unusable and must not go back to the pool
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PostgresConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    Keeps at least `minconn` connections warm and never opens more than
+    `maxconn`; callers block until a connection is free. Connections that were
+    closed by the server, or that fail a `SELECT 1` ping after sitting idle,
+    are dropped and transparently replaced with a fresh one.
+
+    `connect` defaults to psycopg2.connect and can be swapped for a stand-in
+    factory so the pool can be exercised without a database.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str],
+        minconn: int = SQL_POOL_MIN,
+        maxconn: int = SQL_POOL_MAX,
+        connect: Callable[[Optional[str]], Any] = psycopg2.connect,
+        health_check_interval: float = SQL_POOL_HEALTH_CHECK_INTERVAL,
+        timeout: Optional[float] = 30.0
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[Any, float]] = []  # (connection, returned at)
+        self._size = 0  # idle + checked out connections
+        self._closed = False
+        self._prefilled = False
+
+    def _prefill(self) -> None:
+        with self._cond:
+            if self._prefilled:
+                return
+            self._prefilled = True
+            missing = max(self.minconn - self._size, 0)
+            self._size += missing
+
+        for filled in range(missing):
+            try:
+                conn = self._connect(self.dsn)
+            except Exception:
+                # Give back every slot not filled yet and let a later getconn prefill again
+                with self._cond:
+                    self._size -= missing - filled
+                    self._prefilled = False
+                    self._cond.notify_all()
+                raise
+            self.putconn(conn)
+
+    def _is_healthy(self, conn: Any, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self, timeout: Optional[float] = None) -> Any:
+        """Check out a healthy connection, blocking up to `timeout` seconds when the pool is exhausted."""
+        if not self._prefilled:
+            self._prefill()
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolError(f"no connection available within {timeout} seconds")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                # A slot was reserved above, open a new connection for it
+                try:
+                    return self._connect(self.dsn)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, returned_at):
+                return conn
+
+            # Dropped socket or failed ping, replace it on the next iteration
+            print("PostgreSQL pool: discarding a broken connection")
+            self._discard(conn)
+
+    def putconn(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Context manager that checks a connection out and always gives it back.
+
+        Connection-level errors drop the connection instead of returning it.
+        Callers are responsible for calling `conn.commit()`.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def closeall(self) -> None:
+        """Close every idle connection and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_POOL: Optional[PostgresConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> PostgresConnectionPool:
+    """Return the process-wide PostgreSQL pool for SQL_URL, creating it on first use."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = PostgresConnectionPool(SQL_URL)
+    return _POOL
+
+
+def set_pool(pool: Optional[PostgresConnectionPool]) -> None:
+    """Replace the process-wide pool, e.g. with one pointing at a local or stand-in database."""
+    global _POOL
+    with _POOL_LOCK:
+        old_pool, _POOL = _POOL, pool
+    if old_pool is not None and old_pool is not pool:
+        old_pool.closeall()
+
+
+# asyncpg pools are bound to the event loop that created them
+_ASYNC_POOLS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Future]" = weakref.WeakKeyDictionary()
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    """Return the asyncpg pool for SQL_URL on the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    future = _ASYNC_POOLS.get(loop)
+    if future is None:
+        # Concurrent callers await the same creation instead of racing
+        future = asyncio.ensure_future(
+            asyncpg.create_pool(SQL_URL, min_size=SQL_POOL_MIN, max_size=SQL_POOL_MAX)
+        )
+        _ASYNC_POOLS[loop] = future
+
+    try:
+        return await future
+    except Exception:
+        if _ASYNC_POOLS.get(loop) is future:
+            del _ASYNC_POOLS[loop]
+        raise
+
+
+async def close_async_pool() -> None:
+    """Close the asyncpg pool of the running event loop, if one was created or is being created."""
+    future = _ASYNC_POOLS.pop(asyncio.get_running_loop(), None)
+    if future is None:
+        return
+    try:
+        # A pool still being created is waited for, otherwise it would be left open
+        pool = await future
+    except Exception:
+        return
+    await pool.close()
@@ -1,58 +1,204 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Union
 from pathlib import Path
-from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import sqlite3
+import time
 import json
+import os
 
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[1]  
-SAVE_SEARCH_LOG_FILE = True
+# Append every search result to SEARCH_LOG_FILE, for debugging; off in production
+SAVE_SEARCH_LOG_FILE = os.getenv("SAVE_SEARCH_LOG_FILE", "false").lower() in ("1", "true", "yes")
 
 # Define path to house.json
 DATA_DIR = ROOT / 'data'
 HOUSE_FILE = DATA_DIR / 'house.json'
-SEARCH_LOG_FILE = DATA_DIR / "search_house_log.json"
+SEARCH_LOG_FILE = DATA_DIR / "search_house_log.jsonl"
+# Memory-mapped build of house.json, see functions/compiled_catalog.py
+COMPILED_HOUSE_FILE = DATA_DIR / 'house.catalog'
+# SQLite build of house.json, see functions/sql_catalog.py
+HOUSE_SQLITE_FILE = Path(os.getenv("HOUSE_SQLITE_FILE", DATA_DIR / 'house.sqlite3'))
 
-# Define the directory path for reservations
-RESERVATION_DIR = Path('./data/reservation')
+# auto | json | compiled | sqlite | postgres
+#   auto - the compiled catalog when it is up to date with house.json, else house.json
+HOUSE_CATALOG_BACKEND = os.getenv("HOUSE_CATALOG_BACKEND", "auto")
+CATALOG_BACKENDS = ("auto", "json", "compiled", "sqlite", "postgres")
+
+# Seconds "auto" keeps using house.json after finding no up-to-date compiled catalog
+COMPILED_CATALOG_RECHECK_INTERVAL = float(os.getenv("COMPILED_CATALOG_RECHECK_INTERVAL", "30"))
+
+# Reservations database, see functions/reservation_store.py
+RESERVATION_DB_FILE = Path(os.getenv("RESERVATION_DB_FILE", DATA_DIR / 'reservations.sqlite3'))
+
+# Memoized search results, dropped whenever the catalog is reloaded
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+
+# Paged search, see search_house_page
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+SEARCH_PAGE_MAX = int(os.getenv("SEARCH_PAGE_MAX", "50"))
+SEARCH_SORT_ORDERS = ("price_asc", "price_desc")
+HOUSE_FIELDS = ("City", "District", "Price", "CaseName")
 
 from typing import List, Dict, Any
 import json
 from pathlib import Path
+import sys
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.house_catalog import get_house_catalog
+from functions.compiled_catalog import get_compiled_house_catalog
+from functions.sql_catalog import get_sqlite_house_catalog, get_postgres_house_catalog
+from functions.search_log import get_search_log_writer
+from functions.lru_cache import LRUCache
+from functions.tracing import span
+from functions.reservation_store import get_reservation_store
+from functions.location_normalizer import get_location_normalizer, normalize_location
+
+
+def add_catalog_reload_listener(listener) -> None:
+    """Call `listener(catalog)` whenever any of the file-backed house catalogs is (re)loaded."""
+    get_house_catalog(HOUSE_FILE).add_reload_listener(listener)
+    get_compiled_house_catalog(COMPILED_HOUSE_FILE).add_reload_listener(listener)
+    get_sqlite_house_catalog(HOUSE_SQLITE_FILE).add_reload_listener(listener)
+
+
+search_cache = LRUCache(SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+add_catalog_reload_listener(lambda catalog: search_cache.clear())
+
+if HOUSE_CATALOG_BACKEND not in CATALOG_BACKENDS:
+    raise ValueError(f"Unknown HOUSE_CATALOG_BACKEND {HOUSE_CATALOG_BACKEND!r}, expected one of {CATALOG_BACKENDS}")
 
+# (house.json, compiled file, mtime_ns, size) without a usable compiled catalog, and until when to trust that
+_compiled_fallback: Optional[Tuple[Optional[Tuple[Any, ...]], float]] = None
 
-def log_search_results(results: List[Dict[str, Any]]) -> None:
+# Per-request list collecting the results of every search_house call, see capture_search_results
+_search_capture: ContextVar[Optional[List[List[Dict[str, Any]]]]] = ContextVar("search_capture", default=None)
+
+
+@contextmanager
+def capture_search_results():
+    """
+    Collect the results of every search_house call made in the current context.
+
+    Tool calls run by the agent inherit the context, so concurrent requests
+    each see only their own searches, unlike the shared search log.
+    """
+    captured: List[List[Dict[str, Any]]] = []
+    token = _search_capture.set(captured)
+    try:
+        yield captured
+    finally:
+        _search_capture.reset(token)
+
+
+def log_search_results(results: Union[List[Dict[str, Any]], Dict[str, Any]]) -> None:
     """
-    Appends a list of search results to the search_house_log.json file.
+    Appends a list of search results, or one page of them with its total, to the search_house_log.jsonl file.
+
+    The entry is handed to a background writer that appends one JSON line per
+    search, so this call never re-reads or rewrites the existing log.
     
     Args:
-        results: A list of dictionaries containing house search results.
+        results: A list of dictionaries containing house search results, or a
+            {"total", "offset", "results"} page from search_house_page.
     """
-    # Load existing log data or initialize a new list
-    if SEARCH_LOG_FILE.exists():
-        with SEARCH_LOG_FILE.open("r", encoding="utf-8") as f:
-            log_data = json.load(f)
-    else:
-        log_data = []
+    get_search_log_writer(SEARCH_LOG_FILE).append(results)
 
-    # Append the new results directly
-    log_data.append(results)
 
-    # Save the updated log data back to the file
-    with SEARCH_LOG_FILE.open("w", encoding="utf-8") as f:
-        json.dump(log_data, f, ensure_ascii=False, indent=4)
+def resolve_search_areas(
+    city_county: Optional[str],
+    district: Optional[str] = None,
+    districts: Optional[List[str]] = None,
+    zip_range: Optional[Tuple[str, str]] = None
+) -> Tuple[Tuple[str, str], ...]:
+    """
+    The canonical (City, District) areas one search covers.
+
+      zip_range  every area whose zip code lies in the inclusive range,
+                 restricted to city_county when one is given
+      districts  those districts of city_county (plus `district` if set)
+      otherwise  `district` of city_county, or the whole city without one
+    """
+    normalizer = get_location_normalizer()
+    if zip_range:
+        areas = normalizer.areas_in_zip_range(*zip_range)
+        city = normalize_location(city_county, None)[0] if city_county else None
+        if city in normalizer.districts:
+            areas = [area for area in areas if area[0] == city]
+        return tuple(areas)
+
+    names = [name for name in [district, *(districts or [])] if name]
+    if names:
+        # dict.fromkeys drops duplicates and keeps the order asked for
+        return tuple(dict.fromkeys(normalize_location(city_county, name) for name in names))
+
+    city, district = normalize_location(city_county, None)
+    if district:
+        # "臺北市中正區" or a zip code given as the city
+        return ((city, district),)
+    # City-wide: the city's districts in CityCountyData.json order; an unknown city matches nothing
+    return tuple((city, name) for name in normalizer.districts.get(city, [])) or ((city, ""),)
+
+
+def get_catalog():
+    """
+    Catalog backend used by search_house, selected by HOUSE_CATALOG_BACKEND.
+
+    With "auto" this is the compiled, memory-mapped catalog when it was built
+    from the current house.json, otherwise the JSON catalog. A missing or
+    outdated compiled catalog is remembered until house.json changes or
+    COMPILED_CATALOG_RECHECK_INTERVAL seconds pass.
+    """
+    if HOUSE_CATALOG_BACKEND == "json":
+        return get_house_catalog(HOUSE_FILE)
+    if HOUSE_CATALOG_BACKEND == "compiled":
+        return get_compiled_house_catalog(COMPILED_HOUSE_FILE)
+    if HOUSE_CATALOG_BACKEND == "sqlite":
+        return get_sqlite_house_catalog(HOUSE_SQLITE_FILE)
+    if HOUSE_CATALOG_BACKEND == "postgres":
+        return get_postgres_house_catalog()
+
+    global _compiled_fallback
+    try:
+        stat = HOUSE_FILE.stat()
+        source = (HOUSE_FILE, COMPILED_HOUSE_FILE, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        source = None
+    # No usable compiled catalog for this house.json: skip looking for it on every search
+    fallback = _compiled_fallback
+    if source is not None and fallback is not None and fallback[0] == source and time.monotonic() < fallback[1]:
+        return get_house_catalog(HOUSE_FILE)
+
+    catalog = get_compiled_house_catalog(COMPILED_HOUSE_FILE)
+    try:
+        catalog.refresh()
+        if catalog.matches_source(HOUSE_FILE):
+            _compiled_fallback = None
+            return catalog
+    except FileNotFoundError:
+        pass
+    _compiled_fallback = (source, time.monotonic() + COMPILED_CATALOG_RECHECK_INTERVAL)
+    return get_house_catalog(HOUSE_FILE)
+
+
+def search_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the search result cache."""
+    return search_cache.stats()
 
 
 def search_house(
     city_county: str, 
-    district: str,
+    district: Optional[str] = None,
     price_upper_limit: Optional[int] = None,
-    price_lower_limit: Optional[int] = None
+    price_lower_limit: Optional[int] = None,
+    districts: Optional[List[str]] = None,
+    zip_range: Optional[Tuple[str, str]] = None
 ) -> List[Dict[str, Any]]:
-    """Search houses based on city, district, and price range."""
-
-    # Read house data from house.json
-    with HOUSE_FILE.open("r", encoding="utf-8") as f:
-        house_data = json.load(f)
+    """Search houses based on city, district (or several, or a zip code range), and price range."""
 
     # Set default values if limits are not provided
     if price_lower_limit is None:
@@ -60,18 +206,146 @@ def search_house(
     if price_upper_limit is None:
         price_upper_limit = 999999
 
-    # Filter houses based on provided criteria
-    results = [
-        house for house in house_data
-        if house["City"] == city_county
-        and house["District"] == district
-        and price_lower_limit <= house["Price"] <= price_upper_limit
-    ]
+    # Pick up a changed catalog file first, a reload also clears the cache
+    catalog = get_catalog()
+    catalog.refresh()
+
+    areas = resolve_search_areas(city_county, district, districts, zip_range)
+    # Hand out copies so callers can never mutate the cached results
+    results = [dict(house) for house in _search_areas(catalog, areas, price_lower_limit, price_upper_limit)]
+    record_search_results(results)
+    return results
+
+
+def _search_areas(catalog, areas: Tuple[Tuple[str, str], ...], price_lower_limit: int, price_upper_limit: int) -> List[Dict[str, Any]]:
+    """Every match of the areas cheapest first, shared through search_cache; do not mutate."""
+    key = (catalog.path, catalog.version, areas, int(price_lower_limit), int(price_upper_limit))
+    cached = search_cache.get(key)
+    if cached is None:
+        # Merge the (City, District) postings of the shared, indexed catalog
+        with span("catalog.search", catalog=type(catalog).__name__, areas=len(areas)):
+            cached = catalog.search_areas(*key[2:])
+        search_cache.set(key, cached)
+    return cached
+
+
+def record_search_results(results: List[Dict[str, Any]]) -> None:
+    """Hand the results of one search to capture_search_results and the search log."""
+    captured = _search_capture.get()
+    if captured is not None:
+        captured.append(results)
 
     if SAVE_SEARCH_LOG_FILE is True:
         log_search_results(results)
 
-    return results
+
+def search_house_page(
+    city_county: str,
+    district: Optional[str] = None,
+    price_upper_limit: Optional[int] = None,
+    price_lower_limit: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    sort: str = "price_asc",
+    fields: Optional[List[str]] = None,
+    districts: Optional[List[str]] = None,
+    zip_range: Optional[Tuple[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    One page of the search_house matches plus their total count.
+
+    The catalog backend only builds the rows of the requested page, so a
+    district with thousands of matches costs no more than a small one, and
+    `fields` trims every row to what the caller needs. A city-wide,
+    multi-district or zip code range search merges the per-district pages.
+    While results are captured, the full ascending match list is recorded
+    like search_house does, whatever page and order were asked for; the
+    search log only gets the page and the total.
+
+    Returns:
+        {"total": all matches, "offset": ..., "limit": ..., "results": the page}
+    """
+    if sort not in SEARCH_SORT_ORDERS:
+        raise ValueError(f"sort must be one of {SEARCH_SORT_ORDERS}, got {sort!r}")
+    if fields:
+        unknown = [field for field in fields if field not in HOUSE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}, expected any of {HOUSE_FIELDS}")
+
+    # Set default values if limits are not provided
+    if price_lower_limit is None:
+        price_lower_limit = 0
+    if price_upper_limit is None:
+        price_upper_limit = 999999
+    offset = max(int(offset or 0), 0)
+    limit = SEARCH_PAGE_SIZE if limit is None else min(max(int(limit), 1), SEARCH_PAGE_MAX)
+
+    catalog = get_catalog()
+    catalog.refresh()
+
+    areas = resolve_search_areas(city_county, district, districts, zip_range)
+    descending = sort == "price_desc"
+    key = (catalog.path, catalog.version, "page", areas, int(price_lower_limit), int(price_upper_limit), offset, limit, descending)
+    cached = search_cache.get(key)
+    if cached is None:
+        with span("catalog.search_page", catalog=type(catalog).__name__, areas=len(areas)):
+            cached = catalog.search_areas_page(*key[3:6], offset=offset, limit=limit, descending=descending)
+        search_cache.set(key, cached)
+
+    total, page = cached
+    results = [dict(house) for house in page]
+    if _search_capture.get() is not None:
+        # The evaluation compares every match cheapest first, not the page the agent saw
+        record_search_results([dict(house) for house in _search_areas(catalog, areas, price_lower_limit, price_upper_limit)])
+    elif SAVE_SEARCH_LOG_FILE is True:
+        log_search_results({"total": total, "offset": offset, "results": results})
+
+    if fields:
+        results = [{field: house[field] for field in fields} for house in results]
+    return {"total": total, "offset": offset, "limit": limit, "results": results}
+
+
+async def asearch_house(
+    city_county: str, 
+    district: Optional[str] = None,
+    price_upper_limit: Optional[int] = None,
+    price_lower_limit: Optional[int] = None,
+    districts: Optional[List[str]] = None,
+    zip_range: Optional[Tuple[str, str]] = None
+) -> List[Dict[str, Any]]:
+    """Async version of search_house, the catalog file is only (re)parsed off the event loop."""
+    args = (city_county, district, price_upper_limit, price_lower_limit, districts, zip_range)
+    catalog = get_catalog()
+    if catalog.blocking_search:
+        # SQL backends do a database round trip per search
+        return await asyncio.to_thread(search_house, *args)
+    if catalog.is_stale():
+        await asyncio.to_thread(catalog.refresh)
+
+    # The lookup is in memory and logging is queued, neither blocks the loop
+    return search_house(*args)
+
+
+async def asearch_house_page(
+    city_county: str,
+    district: Optional[str] = None,
+    price_upper_limit: Optional[int] = None,
+    price_lower_limit: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    sort: str = "price_asc",
+    fields: Optional[List[str]] = None,
+    districts: Optional[List[str]] = None,
+    zip_range: Optional[Tuple[str, str]] = None
+) -> Dict[str, Any]:
+    """Async version of search_house_page, with the same event loop rules as asearch_house."""
+    args = (city_county, district, price_upper_limit, price_lower_limit, offset, limit, sort, fields, districts, zip_range)
+    catalog = get_catalog()
+    if catalog.blocking_search:
+        return await asyncio.to_thread(search_house_page, *args)
+    if catalog.is_stale():
+        await asyncio.to_thread(catalog.refresh)
+    return search_house_page(*args)
 
 
 def user_reserve(
@@ -80,39 +354,43 @@ def user_reserve(
     phone: str, 
     description: Optional[str] = None
 ) -> str:
-    """Create a reservation entry in a JSON file with the current timestamp and name as the filename."""
+    """Store a reservation in the reservation database under a new unique reservation id."""
 
     # Check for required fields
     if not date or not name or not phone:
         raise ValueError("Date, name, and phone are required fields.")
 
-    # Ensure the reservation directory exists
-    RESERVATION_DIR.mkdir(parents=True, exist_ok=True)
-
-    # Prepare reservation data
-    reservation_data: Dict[str, Any] = {
-        "date": date,
-        "name": name,
-        "phone": phone,
-        "description": description or ""  # Use an empty string if no description is provided
-    }
-
-    # Generate a unique file name using current time and name
-    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_name = name.replace(" ", "_")  # Replace spaces with underscores in the name
-    file_path = RESERVATION_DIR / f"{current_time}_{safe_name}.json"
-
-    # Save the reservation data to the JSON file
-    with file_path.open("w", encoding="utf-8") as f:
-        json.dump([reservation_data], f, ensure_ascii=False, indent=4)
-    
-    # Check if the file was successfully created
-    if file_path.exists():
-        print(f"Reservation saved successfully for {date} in file: {file_path.name}")
-        return '預約成功'
-    else:
+    try:
+        reservation = get_reservation_store(RESERVATION_DB_FILE).add(date, name, phone, description)
+    except sqlite3.Error as error:
+        print(f"Error Reservation Saving Fail: {error}")
         return '預約失敗，請稍後再試'
 
+    print(f"Reservation saved successfully for {date} with id: {reservation['reservation_id']}")
+    return f"預約成功，預約編號：{reservation['reservation_id']}"
+
+
+def list_reservations(
+    date: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    phone: Optional[str] = None,
+    limit: Optional[int] = 100,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
+    """Reservations filtered by date (YYYY-MM-DD-HH, or a whole YYYY-MM-DD day), date range and/or phone, ordered by date."""
+    return get_reservation_store(RESERVATION_DB_FILE).query(date, date_from, date_to, phone, limit, offset)
+
+
+async def auser_reserve(
+    date: str, 
+    name: str, 
+    phone: str, 
+    description: Optional[str] = None
+) -> str:
+    """Async version of user_reserve, the database write runs in a worker thread."""
+    return await asyncio.to_thread(user_reserve, date, name, phone, description)
+
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+import argparse
+import threading
+import sqlite3
+import uuid
+import json
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.tracing import span
+
+# Define path to the reservation database and the directory of the old one-file-per-booking JSON files
+DATA_DIR = ROOT / 'data'
+RESERVATION_DB_FILE = Path(os.getenv("RESERVATION_DB_FILE", DATA_DIR / 'reservations.sqlite3'))
+LEGACY_RESERVATION_DIR = DATA_DIR / 'reservation'
+RESERVATION_TABLE = "reservation"
+RESERVATION_FIELDS = ("reservation_id", "date", "name", "phone", "description", "created_at")
+
+# Legacy files are named <YYYYmmdd_HHMMSS>_<name>.json
+LEGACY_TIME_FORMAT = "%Y%m%d_%H%M%S"
+# Bookings are stored as YYYY-MM-DD-HH, the format of the reservation tool; filters may give the day only
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def _next_day(value: str) -> Optional[str]:
+    """The day after a YYYY-MM-DD filter value, or None when it is not a whole day."""
+    try:
+        return (datetime.strptime(value, DAY_FORMAT) + timedelta(days=1)).strftime(DAY_FORMAT)
+    except ValueError:
+        return None
+
+
+class ReservationStore:
+    """
+    Reservations in one SQLite file, indexed by date and phone.
+
+    Every booking gets a random uuid4 `reservation_id`, so bookings made in the
+    same second under the same name no longer overwrite each other. Every
+    thread keeps its own connection; the database runs in WAL mode so lookups
+    are not blocked by a booking being written.
+    """
+
+    def __init__(self, path: Path = RESERVATION_DB_FILE):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        if not self._ready:
+            self._setup(conn)
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        # Create the table and its indexes once per process
+        with self._lock:
+            if self._ready:
+                return
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {RESERVATION_TABLE} (
+                        reservation_id TEXT PRIMARY KEY,
+                        date TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        phone TEXT NOT NULL,
+                        description TEXT NOT NULL DEFAULT '',
+                        created_at TEXT NOT NULL,
+                        source TEXT UNIQUE
+                    )
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {RESERVATION_TABLE}_date ON {RESERVATION_TABLE} (date, created_at)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {RESERVATION_TABLE}_phone ON {RESERVATION_TABLE} (phone, created_at)")
+            self._ready = True
+
+    @staticmethod
+    def _new_row(date: str, name: str, phone: str, description: Optional[str], created_at: Optional[str] = None, source: Optional[str] = None) -> Tuple[Any, ...]:
+        created_at = created_at or datetime.now().isoformat(timespec="seconds")
+        return (uuid.uuid4().hex, date, name, phone, description or "", created_at, source)
+
+    def add(self, date: str, name: str, phone: str, description: Optional[str] = None) -> Dict[str, Any]:
+        """Store one reservation and return it, including its new reservation_id."""
+        row = self._new_row(date, name, phone, description)
+        conn = self._connection()
+        with span("sql.add_reservation"), conn:
+            conn.execute(f"INSERT INTO {RESERVATION_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        return dict(zip(RESERVATION_FIELDS, row))
+
+    def add_many(self, reservations: Iterable[Dict[str, Any]]) -> List[str]:
+        """Store several reservations in one transaction and return their ids."""
+        rows = [
+            self._new_row(r["date"], r["name"], r["phone"], r.get("description"), r.get("created_at"), r.get("source"))
+            for r in reservations
+        ]
+        conn = self._connection()
+        with span("sql.add_reservations", rows=len(rows)), conn:
+            # Rows whose source file was already imported are skipped
+            conn.executemany(f"INSERT OR IGNORE INTO {RESERVATION_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return [row[0] for row in rows]
+
+    def get(self, reservation_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            f"SELECT {', '.join(RESERVATION_FIELDS)} FROM {RESERVATION_TABLE} WHERE reservation_id = ?", (reservation_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    @staticmethod
+    def _filters(date: Optional[str], date_from: Optional[str], date_to: Optional[str], phone: Optional[str]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if date is not None:
+            next_day = _next_day(date)
+            if next_day is None:
+                clauses.append("date = ?")
+                params.append(date)
+            else:
+                # Every hour of the day: 2024-10-26 <= 2024-10-26-HH < 2024-10-27
+                clauses.append("date >= ? AND date < ?")
+                params.extend([date, next_day])
+        if date_from is not None:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            next_day = _next_day(date_to)
+            if next_day is None:
+                clauses.append("date <= ?")
+                params.append(date_to)
+            else:
+                clauses.append("date < ?")
+                params.append(next_day)
+        if phone is not None:
+            clauses.append("phone = ?")
+            params.append(phone)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        date: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        phone: Optional[str] = None,
+        limit: Optional[int] = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Reservations matching every given filter, ordered by date then booking time.
+
+        Bookings are stored as the YYYY-MM-DD-HH the reservation tool asks
+        for and compare as strings. A filter given as a YYYY-MM-DD day covers
+        every hour of it: `date` matches the whole day and `date_to` includes
+        it. `limit=None` returns all matches.
+        """
+        where, params = self._filters(date, date_from, date_to, phone)
+        sql = f"SELECT {', '.join(RESERVATION_FIELDS)} FROM {RESERVATION_TABLE}{where} ORDER BY date, created_at LIMIT ? OFFSET ?"
+        with span("sql.query_reservations"):
+            rows = self._connection().execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, date: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None, phone: Optional[str] = None) -> int:
+        where, params = self._filters(date, date_from, date_to, phone)
+        return self._connection().execute(f"SELECT COUNT(*) FROM {RESERVATION_TABLE}{where}", params).fetchone()[0]
+
+    def migrate_json_dir(self, directory: Path = LEGACY_RESERVATION_DIR) -> int:
+        """
+        Import the legacy `<YYYYmmdd_HHMMSS>_<name>.json` reservation files.
+
+        Each file name is stored as the row's source, so running the migration
+        again skips files that were already imported. The files are left in
+        place. Returns the number of reservations imported.
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            print(f"No reservation directory at {directory}")
+            return 0
+
+        before = self.count()
+        reservations = []
+        for file_path in sorted(directory.glob("*.json")):
+            try:
+                with file_path.open("r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as error:
+                print(f"Error reading reservation file {file_path.name}: {error}")
+                continue
+
+            try:
+                created_at = datetime.strptime(file_path.stem[:15], LEGACY_TIME_FORMAT)
+            except ValueError:
+                created_at = datetime.fromtimestamp(file_path.stat().st_mtime)
+            # Files hold a list with one reservation, keep every entry just in case
+            entries = entries if isinstance(entries, list) else [entries]
+            for index, entry in enumerate(entries):
+                reservations.append({
+                    **entry,
+                    "created_at": created_at.isoformat(timespec="seconds"),
+                    "source": file_path.name if index == 0 else f"{file_path.name}#{index}",
+                })
+
+        self.add_many(reservations)
+        imported = self.count() - before
+        print(f"Reservations migrated from {directory} ({imported} imported, {len(reservations) - imported} already present)")
+        return imported
+
+
+_STORES: Dict[Path, ReservationStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_reservation_store(path: Path = RESERVATION_DB_FILE) -> ReservationStore:
+    """Return the shared ReservationStore for a database file, creating it on first use."""
+    store = _STORES.get(path)
+    if store is None:
+        resolved = Path(path).resolve()
+        with _STORES_LOCK:
+            store = _STORES.get(resolved) or _STORES.setdefault(resolved, ReservationStore(resolved))
+            _STORES[path] = store
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate or list the reservations database.")
+    parser.add_argument("--db", type=Path, default=RESERVATION_DB_FILE)
+    parser.add_argument("--migrate", type=Path, nargs="?", const=LEGACY_RESERVATION_DIR, default=None, help="import the legacy JSON reservation files of a directory")
+    parser.add_argument("--date", default=None)
+    parser.add_argument("--phone", default=None)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    store = get_reservation_store(args.db)
+    if args.migrate is not None:
+        store.migrate_json_dir(args.migrate)
+    else:
+        for reservation in store.query(date=args.date, phone=args.phone, limit=args.limit):
+            print(json.dumps(reservation, ensure_ascii=False))
@@ -0,0 +1,279 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from dotenv import load_dotenv
+import unicodedata
+import threading
+import time
+import sys
+import re
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.location_normalizer import get_location_normalizer
+from functions.feng_shui_functions import clean_problem, find_fengshui_aliases
+from functions.real_estate_functions import add_catalog_reload_listener, resolve_search_areas
+from functions.tracing import register_gauges
+
+# Off by default: a hit answers a LINE user without calling the model at all
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Minimum bigram similarity (Dice) of the remaining wording of two questions with the same signature
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.8"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+
+# Tools whose answer only depends on their arguments; reserve_house_viewing books a
+# viewing and turns without any tool call depend on the conversation, neither is cached
+CACHEABLE_TOOLS = ("search_house", "FengShui_advice", "tavily_search_results_json")
+# Answers built from house catalog data, dropped when the catalog is reloaded
+CATALOG_TOOLS = ("search_house",)
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+# A number of the signature together with the range word after it, as in 900到2900
+SIGNATURE_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?(?:[到至~-](?=\d))?")
+# Politeness and filler words that do not change what is asked; 要 is kept after a negation (不要)
+FILLER_PATTERN = re.compile(r"請問|麻煩|幫我|幫忙|我要|我想|想要|一下|可以|(?<![不沒別])要|請|找|的|呢|嗎|吧|啊|呀|喔")
+
+# (places, numbers, feng shui problems)
+Signature = Tuple[Tuple[Tuple[str, str], ...], Tuple[str, ...], Tuple[str, ...]]
+
+
+def normalize_question(question: str) -> str:
+    """Full-width to half-width, lower case, 台 written as 臺, letters and digits only."""
+    question = unicodedata.normalize("NFKC", question or "").lower().replace("台", "臺")
+    return "".join(ch for ch in question if ch.isalnum())
+
+
+def question_numbers(question: str) -> Tuple[str, ...]:
+    # "0900" and "900" are the same price
+    numbers = NUMBER_PATTERN.findall(unicodedata.normalize("NFKC", question or ""))
+    return tuple(sorted({number.lstrip("0") or "0" for number in numbers}))
+
+
+def question_signature(question: str) -> Signature:
+    """
+    The places, numbers and feng shui problems a question names.
+
+    Only questions with the same signature are compared, so 中正區 900~2900
+    never answers 中正區 900~3000 or 大安區 900~2900, and 床頭靠窗 never
+    answers 壓樑, however similar the wording is.
+    """
+    problems = tuple(sorted({name for _, name in find_fengshui_aliases(question)}))
+    return get_location_normalizer().find_areas(question), question_numbers(question), problems
+
+
+def question_wording(question: str) -> str:
+    """
+    What a question says besides its signature, compared between questions.
+
+    Places, numbers, feng shui problems and filler words are removed, so
+    我要找台北市中正區 900~2900, 幫我找台北中正 900~2900 and 900到2900 in
+    中正區 all come down to the same few words.
+    """
+    text = get_location_normalizer().strip_areas(question)
+    for alias, _ in find_fengshui_aliases(text):
+        text = text.replace(alias, "")
+    return FILLER_PATTERN.sub("", normalize_question(SIGNATURE_NUMBER_PATTERN.sub("", text)))
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+# (user id for answers given with that user's earlier messages or None for everyone, normalized question)
+EntryKey = Tuple[Optional[str], str]
+
+
+class _Entry:
+    __slots__ = ("key", "bucket", "grams", "answer", "tools", "expires_at")
+
+    def __init__(self, key: EntryKey, signature: Signature, wording: str, answer: str, tools: Set[str], expires_at: float):
+        self.key = key
+        self.bucket = (key[0], signature)
+        self.grams = _bigrams(wording)
+        self.answer = answer
+        self.tools = tools
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Answers of earlier LINE turns, reused for near-identical questions.
+
+    Questions are grouped by their signature (places, numbers and feng shui
+    problems); inside a group a bigram inverted index finds the cached
+    question with the most similar remaining wording and its answer is
+    reused when the Dice similarity reaches `threshold`. A turn is only
+    stored when it called cacheable tools with arguments that come from the
+    question itself (the places and prices it names, the feng shui problem
+    it mentions, no later page). When the conversation had earlier messages
+    the answer may still lean on them, so it is stored for that user only.
+    Entries expire after `ttl` seconds, the oldest are evicted beyond
+    `maxsize`, and answers built from the house catalog are dropped on every
+    catalog reload.
+    """
+
+    def __init__(self, threshold: float = RESPONSE_CACHE_THRESHOLD, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[EntryKey, _Entry]" = OrderedDict()
+        # (user id or None, signature) -> bigram -> keys of the cached questions whose wording contains it
+        self._index: Dict[Tuple[Optional[str], Signature], Dict[str, Set[EntryKey]]] = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, entry: _Entry) -> None:
+        del self._entries[entry.key]
+        postings = self._index[entry.bucket]
+        for gram in entry.grams:
+            postings[gram].discard(entry.key)
+            if not postings[gram]:
+                del postings[gram]
+        if not postings:
+            del self._index[entry.bucket]
+
+    def _closest(self, user_id: Optional[str], text: str, signature: Signature, wording: str) -> Optional[_Entry]:
+        entry = self._entries.get((user_id, text))
+        # "9.5" and "95" normalize to the same text but not the same signature
+        if entry is not None and entry.bucket[1] == signature:
+            return entry
+        postings = self._index.get((user_id, signature))
+        if not postings:
+            return None
+
+        grams = _bigrams(wording)
+        shared: Dict[EntryKey, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in postings.get(gram, ()):
+                shared[candidate] += 1
+        best, best_score = None, self.threshold
+        for candidate, count in shared.items():
+            entry = self._entries[candidate]
+            score = 2 * count / (len(grams) + len(entry.grams))
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def lookup(self, question: str, user_id: Optional[str] = None) -> Optional[str]:
+        """
+        The cached answer of the most similar question with the same signature, if any.
+
+        With `user_id` only the answers stored for that user are searched: a
+        question asked after earlier messages must not get an answer given
+        without them. Without it only the shared answers are.
+        """
+        text = normalize_question(question)
+        signature, wording = (question_signature(question), question_wording(question)) if text else (None, "")
+        with self._lock:
+            entry = self._closest(user_id, text, signature, wording) if text else None
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(entry)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry.key)
+            self.hits += 1
+            return entry.answer
+
+    @staticmethod
+    def cacheable(text: str, signature: Signature, tool_calls: List[Dict[str, Any]]) -> bool:
+        """True if every tool call of the turn is cacheable and its arguments come from the question."""
+        areas, numbers, _ = signature
+        if not tool_calls:
+            return False
+        for call in tool_calls:
+            name, args = call["name"], call.get("args") or {}
+            if name not in CACHEABLE_TOOLS:
+                return False
+            if name == "search_house":
+                if args.get("offset"):
+                    return False
+                prices = [args.get("price_lower_limit"), args.get("price_upper_limit")]
+                if any(price is not None and str(int(price)) not in numbers for price in prices):
+                    return False
+                zip_codes = [args.get("zip_code_from"), args.get("zip_code_to")]
+                if args.get("zip_code_from"):
+                    if any(code and code.lstrip("0") not in numbers for code in zip_codes):
+                        return False
+                    continue
+                searched = resolve_search_areas(args.get("city_county"), args.get("district"), args.get("districts"))
+                if not all(area in areas or (area[0], "") in areas for area in searched):
+                    return False
+            elif name == "FengShui_advice":
+                if clean_problem(args.get("feng_shui_name", "")) not in text:
+                    return False
+        return True
+
+    def store(self, question: str, answer: str, tool_calls: List[Dict[str, Any]], user_id: Optional[str] = None) -> bool:
+        """
+        Cache the answer of a turn given the tool calls it made; returns False when it is not cacheable.
+
+        Pass `user_id` when the conversation had earlier messages, the answer
+        is then only reused for that user.
+        """
+        text = normalize_question(question)
+        signature = question_signature(question)
+        if not text or not answer or not self.cacheable(text, signature, tool_calls):
+            with self._lock:
+                self.skipped += 1
+            return False
+
+        key = (user_id, text)
+        tools = {call["name"] for call in tool_calls}
+        entry = _Entry(key, signature, question_wording(question), answer, tools, time.monotonic() + self.ttl)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                self._remove(old)
+            self._entries[key] = entry
+            postings = self._index.setdefault(entry.bucket, defaultdict(set))
+            for gram in entry.grams:
+                postings[gram].add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries.values())))
+            self.stores += 1
+        return True
+
+    def invalidate(self, tools: Optional[Tuple[str, ...]] = None) -> int:
+        """Drop the answers that used any of `tools` (every answer without it); returns how many."""
+        with self._lock:
+            stale = [entry for entry in self._entries.values() if tools is None or entry.tools.intersection(tools)]
+            for entry in stale:
+                self._remove(entry)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "skipped": self.skipped,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache()
+add_catalog_reload_listener(lambda catalog: response_cache.invalidate(CATALOG_TOOLS))
+register_gauges("response_cache", response_cache.stats)
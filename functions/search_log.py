@@ -0,0 +1,143 @@
+from typing import List, Dict, Any, Optional
+from pathlib import Path
+import threading
+import atexit
+import queue
+import json
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+# Define path to the search log (JSON Lines, one search per line)
+DATA_DIR = ROOT / 'data'
+SEARCH_LOG_FILE = DATA_DIR / "search_house_log.jsonl"
+
+# When to fsync the log file:
+#   "never"  - leave it to the OS page cache
+#   "batch"  - once after every batch written by the background thread
+#   "always" - after every single line
+FSYNC_POLICIES = ("never", "batch", "always")
+SEARCH_LOG_FSYNC = os.getenv("SEARCH_LOG_FSYNC", "batch")
+
+_STOP = object()
+
+
+class SearchLogWriter:
+    """
+    Append-only JSON Lines writer for search results.
+
+    Callers only enqueue an entry; a background thread drains the queue in
+    batches and appends one line per entry, so logging a search costs O(1)
+    no matter how long the history already is.
+    """
+
+    def __init__(self, path: Path, fsync_policy: str = SEARCH_LOG_FSYNC, max_batch: int = 256):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}, got {fsync_policy!r}")
+
+        self.path = Path(path)
+        self.fsync_policy = fsync_policy
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="search-log-writer", daemon=True)
+                self._thread.start()
+
+    def append(self, entry: Any) -> None:
+        """Queue one log entry (e.g. the list of houses returned by one search)."""
+        self._ensure_thread()
+        self._queue.put(entry)
+
+    def flush(self) -> None:
+        """Block until every queued entry has been written to the file."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def clear(self) -> None:
+        """Drop every logged entry, leaving an empty log file."""
+        self.flush()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.open("w", encoding="utf-8").close()
+
+    def close(self) -> None:
+        """Write the remaining entries and stop the background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        stopping = False
+
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self.path.open("a", encoding="utf-8") as f:
+                    for entry in batch:
+                        if entry is _STOP:
+                            stopping = True
+                            continue
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                        if self.fsync_policy == "always":
+                            f.flush()
+                            os.fsync(f.fileno())
+                    if self.fsync_policy == "batch":
+                        f.flush()
+                        os.fsync(f.fileno())
+            except (OSError, TypeError, ValueError) as error:
+                print(f"Error writing search log: {error}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+def read_search_log(path: Path = SEARCH_LOG_FILE) -> List[Any]:
+    """
+    Load a search log as a list of entries.
+
+    `.jsonl` files are read line by line; any other file is treated as the
+    legacy format (one JSON array written with json.dump).
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix != ".jsonl":
+            return json.load(f)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_WRITERS: Dict[Path, SearchLogWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def get_search_log_writer(path: Path = SEARCH_LOG_FILE) -> SearchLogWriter:
+    """Return the shared SearchLogWriter for a log file, creating it on first use."""
+    path = Path(path).resolve()
+    writer = _WRITERS.get(path)
+    if writer is None:
+        with _WRITERS_LOCK:
+            writer = _WRITERS.setdefault(path, SearchLogWriter(path))
+    return writer
+
+
+@atexit.register
+def _close_search_log_writers() -> None:
+    for writer in list(_WRITERS.values()):
+        writer.close()
@@ -0,0 +1,317 @@
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from pathlib import Path
+from dotenv import load_dotenv
+import argparse
+import threading
+import weakref
+import sqlite3
+import json
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.house_catalog import CatalogBackend
+from functions.tracing import span
+
+# Define path to house.json and the SQLite catalog built from it
+DATA_DIR = ROOT / 'data'
+HOUSE_FILE = DATA_DIR / 'house.json'
+HOUSE_SQLITE_FILE = Path(os.getenv("HOUSE_SQLITE_FILE", DATA_DIR / 'house.sqlite3'))
+HOUSE_TABLE = "house"
+IMPORT_BATCH_SIZE = 10000
+
+# Served straight from the (city, district, price) index, ties keep the import order.
+# City and district are known from the arguments, so only price and case_name are fetched.
+SQLITE_SEARCH_QUERY = f"""
+    SELECT price, case_name FROM {HOUSE_TABLE}
+    WHERE city = ? AND district = ? AND price BETWEEN ? AND ?
+    ORDER BY price, id
+"""
+SQLITE_COUNT_QUERY = f"""
+    SELECT COUNT(*) FROM {HOUSE_TABLE}
+    WHERE city = ? AND district = ? AND price BETWEEN ? AND ?
+"""
+# Pages: descending is the exact reverse of ascending; LIMIT -1 means no limit
+SQLITE_PAGE_QUERIES = {
+    False: SQLITE_SEARCH_QUERY.replace("ORDER BY price, id", "ORDER BY price, id LIMIT ? OFFSET ?"),
+    True: SQLITE_SEARCH_QUERY.replace("ORDER BY price, id", "ORDER BY price DESC, id DESC LIMIT ? OFFSET ?"),
+}
+
+# Server-side prepared statements, created once per pooled connection
+POSTGRES_WHERE = "WHERE city = $1 AND district = $2 AND price BETWEEN $3 AND $4"
+POSTGRES_PREPARED_STATEMENTS = {
+    "search_house_stmt": f"(text, text, integer, integer) AS SELECT price, case_name FROM {HOUSE_TABLE} {POSTGRES_WHERE} ORDER BY price, id",
+    "count_house_stmt": f"(text, text, integer, integer) AS SELECT COUNT(*) FROM {HOUSE_TABLE} {POSTGRES_WHERE}",
+    "page_house_asc_stmt": f"(text, text, integer, integer, bigint, bigint) AS SELECT price, case_name FROM {HOUSE_TABLE} {POSTGRES_WHERE} ORDER BY price, id LIMIT $5 OFFSET $6",
+    "page_house_desc_stmt": f"(text, text, integer, integer, bigint, bigint) AS SELECT price, case_name FROM {HOUSE_TABLE} {POSTGRES_WHERE} ORDER BY price DESC, id DESC LIMIT $5 OFFSET $6",
+}
+
+
+def _rows_to_houses(city: str, district: str, rows: Iterable[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    return [{"City": city, "District": district, "Price": price, "CaseName": case_name} for price, case_name in rows]
+
+
+def _read_houses(source: Path) -> Iterator[Tuple[str, str, int, str]]:
+    with Path(source).open("r", encoding="utf-8") as f:
+        houses = (json.loads(line) for line in f if line.strip()) if Path(source).suffix == ".jsonl" else json.load(f)
+        for house in houses:
+            yield house["City"], house["District"], int(house["Price"]), house["CaseName"]
+
+
+def _batches(rows: Iterator[Tuple[str, str, int, str]], size: int = IMPORT_BATCH_SIZE) -> Iterator[List[Tuple[str, str, int, str]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class SqliteHouseCatalog(CatalogBackend):
+    """
+    House catalog in a SQLite file, queried through a (city, district, price) index.
+
+    The catalog does not have to fit in memory and several processes can read
+    the same file. Every thread keeps its own read-only connection, and
+    sqlite3 reuses the compiled search statement from its statement cache.
+    Rewriting the file bumps `version` like a reload of the JSON catalog.
+    """
+
+    blocking_search = True
+
+    def __init__(self, path: Path = HOUSE_SQLITE_FILE):
+        super().__init__(Path(path))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None
+
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def setup(self) -> None:
+        """Create the house table and its search index if they do not exist."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {HOUSE_TABLE} (
+                    id INTEGER PRIMARY KEY,
+                    city TEXT NOT NULL,
+                    district TEXT NOT NULL,
+                    price INTEGER NOT NULL,
+                    case_name TEXT NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {HOUSE_TABLE}_city_district_price ON {HOUSE_TABLE} (city, district, price)")
+
+    def import_houses(self, source: Path = HOUSE_FILE) -> int:
+        """Replace the catalog with the houses of a JSON (or JSON Lines) file, returning how many were imported."""
+        self.setup()
+        imported = 0
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(f"DELETE FROM {HOUSE_TABLE}")
+            for batch in _batches(_read_houses(source)):
+                conn.executemany(f"INSERT INTO {HOUSE_TABLE} (city, district, price, case_name) VALUES (?, ?, ?, ?)", batch)
+                imported += len(batch)
+            conn.execute("ANALYZE")
+        print(f"House catalog imported from {Path(source).name} into {self.path.name} ({imported} houses)")
+        return imported
+
+    def is_stale(self) -> bool:
+        return self._file_signature() != self._signature
+
+    def refresh(self) -> None:
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            self._signature = signature
+            self.version += 1
+        self._notify_reload()
+
+    def search(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int
+    ) -> List[Dict[str, Any]]:
+        """Return the houses of a (City, District) whose price lies in the inclusive range, cheapest first."""
+        with span("sql.search_house", backend="sqlite"):
+            rows = self._connection().execute(SQLITE_SEARCH_QUERY, (city_county, district, price_lower_limit, price_upper_limit))
+            return _rows_to_houses(city_county, district, rows)
+
+    def search_page(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Total number of matches (counted on the index) plus one LIMIT/OFFSET page of them."""
+        conn = self._connection()
+        params = (city_county, district, price_lower_limit, price_upper_limit)
+        with span("sql.search_house_page", backend="sqlite"):
+            total = conn.execute(SQLITE_COUNT_QUERY, params).fetchone()[0]
+            rows = conn.execute(SQLITE_PAGE_QUERIES[descending], params + (-1 if limit is None else limit, offset))
+            return total, _rows_to_houses(city_county, district, rows)
+
+
+class PostgresHouseCatalog(CatalogBackend):
+    """
+    House catalog in the project's PostgreSQL database, shared by every node.
+
+    Searches borrow connections from the shared pool (functions.postgresql_pool)
+    and run a server-side prepared statement, prepared once per connection.
+    The database gives no cheap change signal, so `version` stays fixed and
+    cached results expire through the search cache TTL instead.
+    """
+
+    blocking_search = True
+
+    def __init__(self):
+        super().__init__(f"postgresql:{HOUSE_TABLE}")
+        # Connections that already ran PREPARE, forgotten when the pool drops them
+        self._prepared: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+    def setup(self) -> None:
+        """Create the house table and its search index if they do not exist."""
+        from functions.postgresql_pool import get_pool
+
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {HOUSE_TABLE} (
+                    id SERIAL PRIMARY KEY,
+                    city VARCHAR(20) NOT NULL,
+                    district VARCHAR(20) NOT NULL,
+                    price INTEGER NOT NULL,
+                    case_name VARCHAR(255) NOT NULL
+                )
+            """)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {HOUSE_TABLE}_city_district_price ON {HOUSE_TABLE} (city, district, price, id)")
+            conn.commit()
+            cursor.close()
+
+    def import_houses(self, source: Path = HOUSE_FILE) -> int:
+        """Replace the catalog with the houses of a JSON (or JSON Lines) file, returning how many were imported."""
+        from functions.postgresql_pool import get_pool
+        from psycopg2.extras import execute_values
+
+        self.setup()
+        imported = 0
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"TRUNCATE {HOUSE_TABLE} RESTART IDENTITY")
+            for batch in _batches(_read_houses(source)):
+                execute_values(cursor, f"INSERT INTO {HOUSE_TABLE} (city, district, price, case_name) VALUES %s", batch)
+                imported += len(batch)
+            cursor.execute(f"ANALYZE {HOUSE_TABLE}")
+            conn.commit()
+            cursor.close()
+        print(f"House catalog imported from {Path(source).name} into PostgreSQL ({imported} houses)")
+        return imported
+
+    def search(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int
+    ) -> List[Dict[str, Any]]:
+        """Return the houses of a (City, District) whose price lies in the inclusive range, cheapest first."""
+        [rows] = self._execute(("search_house_stmt", (city_county, district, price_lower_limit, price_upper_limit)))
+        return _rows_to_houses(city_county, district, rows)
+
+    def search_page(
+        self,
+        city_county: str,
+        district: str,
+        price_lower_limit: int,
+        price_upper_limit: int,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Total number of matches (counted on the index) plus one LIMIT/OFFSET page of them."""
+        params = (city_county, district, price_lower_limit, price_upper_limit)
+        statement = "page_house_desc_stmt" if descending else "page_house_asc_stmt"
+        total, rows = self._execute(("count_house_stmt", params), (statement, params + (limit, offset)))
+        return total[0][0], _rows_to_houses(city_county, district, rows)
+
+    def _execute(self, *statements: Tuple[str, Tuple[Any, ...]]) -> List[List[Tuple[Any, ...]]]:
+        """Run prepared statements on one pooled connection, returning the rows of each."""
+        from functions.postgresql_pool import get_pool
+
+        with span("sql.execute", backend="postgres", statements=[name for name, _ in statements]), get_pool().connection() as conn:
+            cursor = conn.cursor()
+            if conn not in self._prepared:
+                for name, definition in POSTGRES_PREPARED_STATEMENTS.items():
+                    cursor.execute(f"PREPARE {name} {definition}")
+                # Prepared statements live for the session, commit so the pool's rollback keeps them
+                conn.commit()
+                self._prepared.add(conn)
+            results = []
+            for name, params in statements:
+                cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+                results.append(cursor.fetchall())
+            cursor.close()
+        return results
+
+
+_SQLITE_CATALOGS: Dict[Path, SqliteHouseCatalog] = {}
+_POSTGRES_CATALOG: Optional[PostgresHouseCatalog] = None
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_sqlite_house_catalog(path: Path = HOUSE_SQLITE_FILE) -> SqliteHouseCatalog:
+    """Return the shared SqliteHouseCatalog for a database file, creating it on first use."""
+    catalog = _SQLITE_CATALOGS.get(path)
+    if catalog is None:
+        resolved = Path(path).resolve()
+        with _CATALOGS_LOCK:
+            catalog = _SQLITE_CATALOGS.get(resolved) or _SQLITE_CATALOGS.setdefault(resolved, SqliteHouseCatalog(resolved))
+            _SQLITE_CATALOGS[path] = catalog
+    return catalog
+
+
+def get_postgres_house_catalog() -> PostgresHouseCatalog:
+    """Return the process-wide PostgresHouseCatalog."""
+    global _POSTGRES_CATALOG
+    if _POSTGRES_CATALOG is None:
+        with _CATALOGS_LOCK:
+            if _POSTGRES_CATALOG is None:
+                _POSTGRES_CATALOG = PostgresHouseCatalog()
+    return _POSTGRES_CATALOG
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import house.json into the SQLite or PostgreSQL catalog backend.")
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--source", type=Path, default=HOUSE_FILE)
+    parser.add_argument("--target", type=Path, default=HOUSE_SQLITE_FILE, help="SQLite file, ignored for postgres")
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        get_sqlite_house_catalog(args.target).import_houses(args.source)
+    else:
+        get_postgres_house_catalog().import_houses(args.source)
@@ -0,0 +1,340 @@
+from typing import Any, Callable, Dict, List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from uuid import UUID
+from dotenv import load_dotenv
+import functools
+import inspect
+import threading
+import bisect
+import atexit
+import uuid
+import json
+import time
+import sys
+import os
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.search_log import get_search_log_writer
+
+# Off by default, a disabled span costs one flag check
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Optional JSON Lines file receiving every finished span
+TRACE_SPAN_FILE = os.getenv("TRACE_SPAN_FILE")
+# Optional file the histograms are written to at exit, `.json` or OpenMetrics text otherwise
+TRACE_METRICS_FILE = os.getenv("TRACE_METRICS_FILE")
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Id shared by every span of one request (e.g. one LINE message)
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets, safe to observe from any thread."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+            self._errors += error
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts, total, errors = list(self._counts), self._sum, self._errors
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return {
+            "count": running,
+            "sum_s": round(total, 6),
+            "errors": errors,
+            "buckets": {str(le): n for le, n in zip(self.buckets + ("+Inf",), cumulative)},
+        }
+
+
+_HISTOGRAMS: Dict[str, LatencyHistogram] = {}
+_HISTOGRAMS_LOCK = threading.Lock()
+
+
+def get_histogram(name: str) -> LatencyHistogram:
+    histogram = _HISTOGRAMS.get(name)
+    if histogram is None:
+        with _HISTOGRAMS_LOCK:
+            histogram = _HISTOGRAMS.setdefault(name, LatencyHistogram())
+    return histogram
+
+
+class Span:
+    """One timed operation; ending it feeds the histogram of its name and the span file."""
+
+    __slots__ = ("name", "attributes", "correlation_id", "span_id", "parent_id", "started_at", "_started")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"] = None):
+        self.name = name
+        self.attributes = attributes
+        self.correlation_id = correlation_id.get()
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    def end(self, error: Optional[BaseException] = None) -> float:
+        duration = time.perf_counter() - self._started
+        get_histogram(self.name).observe(duration, error is not None)
+        if TRACE_SPAN_FILE:
+            get_search_log_writer(Path(TRACE_SPAN_FILE)).append({
+                "name": self.name,
+                "correlation_id": self.correlation_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "started_at": self.started_at,
+                "duration_ms": round(duration * 1000, 3),
+                "error": repr(error) if error is not None else None,
+                "attributes": self.attributes,
+            })
+        return duration
+
+
+class _SpanContext:
+    __slots__ = ("name", "attributes", "_span", "_token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self._span = Span(self.name, self.attributes, _current_span.get())
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+        self._span.end(exc)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def set_tracing(enabled: bool, span_file: Optional[str] = None) -> None:
+    """Switch tracing on or off at runtime, e.g. for a benchmark or a debugging session."""
+    global TRACING_ENABLED, TRACE_SPAN_FILE
+    TRACING_ENABLED = enabled
+    if span_file is not None:
+        TRACE_SPAN_FILE = str(span_file)
+
+
+def span(name: str, **attributes: Any):
+    """
+    Context manager timing the enclosed block as span `name`.
+
+        with span("sql.get_user_messages", user_id=user_id):
+            ...
+
+    Spans opened inside it become its children. Returns a shared no-op
+    context when tracing is disabled.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _SpanContext(name, attributes)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator running every call of a function (or coroutine function) inside a span."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not TRACING_ENABLED:
+                    return await func(*args, **kwargs)
+                with _SpanContext(span_name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return func(*args, **kwargs)
+            with _SpanContext(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace_request(request_id: Optional[str] = None):
+    """
+    Bind a correlation id to everything run in this context and yield it.
+
+    An id already bound by an outer request is kept, so the webhook server and
+    the agent functions it calls share one id.
+    """
+    current = correlation_id.get()
+    if current is not None and request_id is None:
+        yield current
+        return
+    token = correlation_id.set(request_id or uuid.uuid4().hex)
+    try:
+        yield correlation_id.get()
+    finally:
+        correlation_id.reset(token)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler turning agent steps, model calls and tool calls into spans.
+
+    Spans are named `step.<node>` for LangGraph nodes, `model` for chat model
+    calls and `tool.<name>` for tools. They are tracked by run id because
+    callbacks arrive as separate start/end calls.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._spans: Dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID, name: str, attributes: Dict[str, Any]) -> None:
+        self._spans[run_id] = Span(name, attributes, _current_span.get())
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.end(error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs) -> None:
+        # Only the node runs themselves, not the runnables nested in them
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and not node.startswith("__") and (name or kwargs.get("name")) == node:
+            self._start(run_id, f"step.{node}", {"step": (metadata or {}).get("langgraph_step")})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start(run_id, "model", {"messages": sum(len(batch) for batch in messages)})
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, name=None, **kwargs) -> None:
+        tool_name = name or (serialized or {}).get("name", "unknown")
+        self._start(run_id, f"tool.{tool_name}", {})
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+
+_CALLBACK_HANDLER = TracingCallbackHandler()
+
+
+def tracing_callbacks() -> List[BaseCallbackHandler]:
+    """Callbacks to put in an agent config, empty when tracing is disabled."""
+    return [_CALLBACK_HANDLER] if TRACING_ENABLED else []
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Histograms of every span name seen so far, as plain JSON data."""
+    with _HISTOGRAMS_LOCK:
+        histograms = dict(_HISTOGRAMS)
+    return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+
+_GAUGES: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_gauges(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """Expose the numeric values of `provider()` (e.g. cache stats) as `<name>{key="..."}` gauges on /metrics."""
+    _GAUGES[name] = provider
+
+
+def gauges_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: provider() for name, provider in sorted(_GAUGES.items())}
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_openmetrics() -> str:
+    """The histograms in the OpenMetrics text format served on /metrics."""
+    lines = [
+        "# TYPE span_duration_seconds histogram",
+        "# UNIT span_duration_seconds seconds",
+        "# HELP span_duration_seconds Duration of traced spans.",
+    ]
+    snapshot = metrics_snapshot()
+    for name, data in snapshot.items():
+        label = _label(name)
+        for le, count in data["buckets"].items():
+            lines.append(f'span_duration_seconds_bucket{{span="{label}",le="{le}"}} {count}')
+        lines.append(f'span_duration_seconds_count{{span="{label}"}} {data["count"]}')
+        lines.append(f'span_duration_seconds_sum{{span="{label}"}} {data["sum_s"]}')
+    lines.append("# TYPE span_errors counter")
+    lines.append("# HELP span_errors Spans that ended with an exception.")
+    for name, data in snapshot.items():
+        lines.append(f'span_errors_total{{span="{_label(name)}"}} {data["errors"]}')
+    for name, values in gauges_snapshot().items():
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'{name}{{key="{_label(key)}"}} {value}')
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: Path) -> None:
+    """Write the histograms to `path`, as JSON for a .json file and OpenMetrics text otherwise."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            json.dump(metrics_snapshot(), f, ensure_ascii=False, indent=4)
+        else:
+            f.write(render_openmetrics())
+
+
+@atexit.register
+def _write_metrics_file() -> None:
+    if TRACING_ENABLED and TRACE_METRICS_FILE:
+        write_metrics(Path(TRACE_METRICS_FILE))
@@ -0,0 +1,245 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from concurrent.futures import Future
+from pathlib import Path
+from dotenv import load_dotenv
+import unicodedata
+import threading
+import asyncio
+import sqlite3
+import json
+import time
+import sys
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+load_dotenv(ROOT / '.env')
+
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.lru_cache import LRUCache
+from functions.tracing import span
+
+# Define path to the on-disk web search cache, it survives restarts
+DATA_DIR = ROOT / 'data'
+WEB_SEARCH_CACHE_FILE = Path(os.getenv("WEB_SEARCH_CACHE_FILE", DATA_DIR / 'web_search_cache.sqlite3'))
+WEB_SEARCH_CACHE_TABLE = "web_search"
+
+# Cached results expire after WEB_SEARCH_CACHE_TTL seconds (one day by default)
+WEB_SEARCH_CACHE_ENABLED = os.getenv("WEB_SEARCH_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "86400"))
+WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "1024"))
+
+# Punctuation a query may end with without changing what is searched
+TRAILING_PUNCTUATION = "?!.,;:。？！，；：、~～ "
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a query: full-width to half-width, lower case, single spaces, no trailing punctuation."""
+    query = unicodedata.normalize("NFKC", query or "")
+    return " ".join(query.lower().split()).rstrip(TRAILING_PUNCTUATION)
+
+
+class WebSearchCache:
+    """
+    Web search results in an in-memory LRU in front of a SQLite file.
+
+    A lookup checks the LRU, then the file; results found on disk are put
+    back in the LRU with their remaining lifetime. Both layers expire entries
+    after `ttl` seconds, so a restarted process reuses yesterday's searches
+    but never older ones. Concurrent searches for the same normalized query
+    share one call to the search backend (single flight), in threads as well
+    as in coroutines. Only results that are not error strings are stored.
+    """
+
+    def __init__(self, path: Optional[Path] = WEB_SEARCH_CACHE_FILE, ttl: float = WEB_SEARCH_CACHE_TTL, maxsize: int = WEB_SEARCH_CACHE_SIZE):
+        self.path = Path(path) if path is not None else None
+        self.ttl = ttl
+        self.searches = 0
+        self.shared = 0
+        self.disk_hits = 0
+        self._memory = LRUCache(maxsize, ttl=ttl)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+        self._inflight: Dict[str, Future] = {}
+        self._async_inflight: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        if not self._ready:
+            self._setup(conn)
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if self._ready:
+                return
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {WEB_SEARCH_CACHE_TABLE} (
+                        key TEXT PRIMARY KEY,
+                        result TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {WEB_SEARCH_CACHE_TABLE}_expires_at ON {WEB_SEARCH_CACHE_TABLE} (expires_at)")
+            self._ready = True
+
+    def get(self, query: str) -> Optional[Any]:
+        """Cached result of a query, or None when it is not cached or expired."""
+        key = normalize_query(query)
+        result = self._memory.get(key)
+        if result is not None or self.path is None:
+            return result
+        return self._read(key)
+
+    def _read(self, key: str) -> Optional[Any]:
+        """Result of a normalized query from the cache file, copied into memory on a hit."""
+        try:
+            row = self._connection().execute(
+                f"SELECT result, expires_at FROM {WEB_SEARCH_CACHE_TABLE} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as error:
+            print(f"Error Web Search Cache Reading Fail: {error}")
+            return None
+        remaining = row[1] - time.time() if row is not None else 0
+        if remaining <= 0:
+            return None
+        result = json.loads(row[0])
+        self.disk_hits += 1
+        self._memory.set(key, result, ttl=remaining)
+        return result
+
+    def set(self, query: str, result: Any) -> None:
+        key = normalize_query(query)
+        self._memory.set(key, result)
+        if self.path is None:
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {WEB_SEARCH_CACHE_TABLE} VALUES (?, ?, ?)",
+                    (key, json.dumps(result, ensure_ascii=False), time.time() + self.ttl)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as error:
+            # Still cached in memory, only the restart survival is lost
+            print(f"Error Web Search Cache Saving Fail: {error}")
+
+    @staticmethod
+    def cacheable(result: Any) -> bool:
+        # Search tools report failures as a string instead of raising
+        return result is not None and not isinstance(result, str)
+
+    def get_or_search(self, query: str, search: Callable[[], Any]) -> Any:
+        """Cached result of `query`, running `search()` once for all threads asking at the same time."""
+        result = self.get(query)
+        if result is not None:
+            return result
+
+        key = normalize_query(query)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            self.searches += 1
+            with span("web_search"):
+                result = search()
+            if self.cacheable(result):
+                self.set(query, result)
+            future.set_result(result)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return result
+
+    async def aget_or_search(self, query: str, search: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Coroutine version of get_or_search; coroutines of one event loop share one search.
+
+        The cache file is read and written in a worker thread, never on the event loop.
+        """
+        normalized = normalize_query(query)
+        result = self._memory.get(normalized)
+        if result is None and self.path is not None:
+            result = await asyncio.to_thread(self._read, normalized)
+        if result is not None:
+            return result
+
+        loop = asyncio.get_running_loop()
+        key = (loop, normalized)
+        future = self._async_inflight.get(key)
+        if future is not None:
+            self.shared += 1
+            # shield: a cancelled waiter must not cancel the search of the others
+            return await asyncio.shield(future)
+
+        future = self._async_inflight[key] = loop.create_future()
+        try:
+            self.searches += 1
+            with span("web_search"):
+                result = await search()
+            if self.cacheable(result):
+                await asyncio.to_thread(self.set, query, result)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._async_inflight.pop(key, None)
+        return result
+
+    def purge_expired(self) -> int:
+        """Delete the expired rows of the cache file; returns how many were deleted."""
+        if self.path is None:
+            return 0
+        conn = self._connection()
+        with conn:
+            return conn.execute(f"DELETE FROM {WEB_SEARCH_CACHE_TABLE} WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self.path is not None:
+            conn = self._connection()
+            with conn:
+                conn.execute(f"DELETE FROM {WEB_SEARCH_CACHE_TABLE}")
+
+    def stats(self) -> Dict[str, Any]:
+        """LRU counters, hits served from the file, searches actually sent and calls that joined one in flight."""
+        return {**self._memory.stats(), "disk_hits": self.disk_hits, "searches": self.searches, "shared": self.shared}
+
+
+_CACHES: Dict[Path, WebSearchCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_web_search_cache(path: Path = WEB_SEARCH_CACHE_FILE) -> WebSearchCache:
+    """Return the shared WebSearchCache for a cache file, creating it on first use."""
+    cache = _CACHES.get(path)
+    if cache is None:
+        resolved = Path(path).resolve()
+        with _CACHES_LOCK:
+            cache = _CACHES.get(resolved) or _CACHES.setdefault(resolved, WebSearchCache(resolved))
+            _CACHES[path] = cache
+    return cache
@@ -1,6 +1,8 @@
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Mapping, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
+import argparse
 import json
 
 # File path constants
@@ -9,6 +11,14 @@ ROOT: Path = FILE.parents[1]
 DATA_DIR: Path = ROOT / 'data'
 HOUSE_FILE: Path = DATA_DIR / 'house.json'
 
+# Generator settings
+PRICE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+OUTPUT_FORMATS = ("json", "jsonl", "parquet", "binary")
+FORMAT_SUFFIXES = {".json": "json", ".jsonl": "jsonl", ".parquet": "parquet", ".bin": "binary"}
+HOUSE_COLUMNS = ["City", "District", "Price", "CaseName"]
+# Record layout of the binary format, `area` indexes the sidecar area table
+HOUSE_RECORD_DTYPE = np.dtype([("area", "<i4"), ("price", "<i4"), ("house_id", "<i8")])
+
 # Load city and county data function
 def load_city_county_to_pandas() -> pd.DataFrame:
     """Load city and county data from a JSON file into a pandas DataFrame."""
@@ -36,6 +46,175 @@ def load_city_county_to_pandas() -> pd.DataFrame:
     df: pd.DataFrame = pd.DataFrame(city_data)
     return df
 
+# Listings per district function
+def listing_counts(
+    areas: pd.DataFrame,
+    listings_per_district: Union[int, Mapping[Tuple[str, str], int]] = 3,
+    total: Optional[int] = None
+) -> np.ndarray:
+    """Number of listings for every row of `areas`, either fixed, per (City, District), or `total` spread evenly."""
+    if total is not None:
+        counts = np.full(len(areas), total // len(areas), dtype=np.int64)
+        counts[: total % len(areas)] += 1
+        return counts
+    if isinstance(listings_per_district, Mapping):
+        keys = zip(areas["CityName"], areas["AreaName"])
+        return np.array([listings_per_district.get(key, 0) for key in keys], dtype=np.int64)
+    return np.full(len(areas), listings_per_district, dtype=np.int64)
+
+# Draw prices function
+def draw_prices(
+    rng: np.random.Generator,
+    distribution: str,
+    position: np.ndarray,
+    price_range: Tuple[int, int],
+    fixed_prices: Tuple[int, ...],
+    lognormal_sigma: float
+) -> np.ndarray:
+    """Prices for one chunk; `position` is the index of each listing within its district."""
+    low, high = price_range
+    if distribution == "fixed":
+        # Cycle through fixed_prices inside every district, like the original sample
+        prices = np.asarray(fixed_prices)[position % len(fixed_prices)]
+    elif distribution == "uniform":
+        prices = rng.integers(low, high, size=len(position), endpoint=True)
+    elif distribution == "lognormal":
+        # Median at the geometric mean of the range, with a long tail of expensive houses
+        median = np.sqrt(low * high)
+        prices = np.clip(np.rint(rng.lognormal(np.log(median), lognormal_sigma, size=len(position))), low, high)
+    else:
+        raise ValueError(f"distribution must be one of {PRICE_DISTRIBUTIONS}, got {distribution!r}")
+    return prices.astype(np.int32)
+
+# Generate house chunks function
+def generate_house_chunks(
+    listings_per_district: Union[int, Mapping[Tuple[str, str], int]] = 3,
+    total: Optional[int] = None,
+    distribution: str = "fixed",
+    seed: int = 0,
+    chunk_size: int = 1_000_000,
+    price_range: Tuple[int, int] = (100, 10000),
+    fixed_prices: Tuple[int, ...] = (1000, 2000, 3000),
+    lognormal_sigma: float = 0.6
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield synthetic houses as DataFrames of at most `chunk_size` rows, built with
+    NumPy vectorization instead of a Python loop per house.
+
+    Houses are ordered district by district and numbered from 1; the index is
+    the house id and AreaCode the row of the district in CityCountyData.json.
+    The same arguments (seed and chunk_size included) give the same data.
+    """
+    if distribution not in PRICE_DISTRIBUTIONS:
+        raise ValueError(f"distribution must be one of {PRICE_DISTRIBUTIONS}, got {distribution!r}")
+
+    areas = load_city_county_to_pandas()
+    counts = listing_counts(areas, listings_per_district, total)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    cities = pd.Categorical(areas["CityName"])
+    districts = pd.Categorical(areas["AreaName"])
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, int(offsets[-1]), chunk_size):
+        house_index = np.arange(start, min(start + chunk_size, int(offsets[-1])))
+        # Districts without listings have equal offsets and are skipped by side="right"
+        area = np.searchsorted(offsets, house_index, side="right") - 1
+        prices = draw_prices(rng, distribution, house_index - offsets[area], price_range, fixed_prices, lognormal_sigma)
+        house_id = house_index + 1
+
+        yield pd.DataFrame({
+            "City": pd.Categorical.from_codes(cities.codes[area], cities.categories),
+            "District": pd.Categorical.from_codes(districts.codes[area], districts.categories),
+            "Price": prices,
+            "CaseName": "house_" + pd.Series(house_id, index=house_id).astype(str),
+            "AreaCode": area.astype(np.int32),
+        }, index=pd.Index(house_id, name="HouseId"))
+
+# Binary area table path function
+def binary_area_table_path(path: Path) -> Path:
+    """Sidecar JSON holding the (City, District) of every area code of a binary house file."""
+    return path.with_name(path.name + ".areas.json")
+
+# Write house data function
+def write_house_data(chunks: Iterable[pd.DataFrame], path: Path, fmt: str = "json") -> int:
+    """
+    Stream generated chunks to `path`, keeping only one chunk in memory.
+
+    Formats: a JSON array like house.json, JSON Lines, Parquet (needs pyarrow),
+    or binary HOUSE_RECORD_DTYPE records plus a sidecar area table.
+    Returns the number of houses written.
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"fmt must be one of {OUTPUT_FORMATS}, got {fmt!r}")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+
+    if fmt in ("json", "jsonl"):
+        with path.open("w", encoding="utf-8") as f:
+            if fmt == "json":
+                f.write("[")
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                lines = chunk[HOUSE_COLUMNS].to_json(orient="records", lines=True, force_ascii=False).rstrip("\n")
+                if fmt == "json":
+                    f.write(("\n" if written == 0 else ",\n") + lines.replace("\n", ",\n"))
+                else:
+                    f.write(lines + "\n")
+                written += len(chunk)
+            if fmt == "json":
+                f.write("\n]\n")
+
+    elif fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Writing parquet needs pyarrow, install it with `pip install pyarrow`") from e
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk[HOUSE_COLUMNS], preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    else:
+        with path.open("wb") as f:
+            for chunk in chunks:
+                records = np.empty(len(chunk), dtype=HOUSE_RECORD_DTYPE)
+                records["area"] = chunk["AreaCode"].to_numpy()
+                records["price"] = chunk["Price"].to_numpy()
+                records["house_id"] = chunk.index.to_numpy()
+                f.write(records.tobytes())
+                written += len(chunk)
+
+        areas = load_city_county_to_pandas()
+        with binary_area_table_path(path).open("w", encoding="utf-8") as f:
+            json.dump({
+                "dtype": HOUSE_RECORD_DTYPE.descr,
+                "areas": [[city, district] for city, district in zip(areas["CityName"], areas["AreaName"])]
+            }, f, ensure_ascii=False)
+
+    print(f"House data written to {path} ({written} houses, {fmt})")
+    return written
+
+# Read binary house data function
+def read_house_binary(path: Path) -> Tuple[np.ndarray, List[Tuple[str, str]]]:
+    """Memory-map a binary house file, returning its records and the (City, District) of every area code."""
+    path = Path(path)
+    with binary_area_table_path(path).open("r", encoding="utf-8") as f:
+        areas = [tuple(area) for area in json.load(f)["areas"]]
+    records = np.memmap(path, dtype=HOUSE_RECORD_DTYPE, mode="r")
+    return records, areas
+
 # Create house sample function
 def create_house_sample():
     """Create house sample data if house.json does not already exist in the data directory."""
@@ -43,31 +222,48 @@ def create_house_sample():
     if HOUSE_FILE.exists():
         print(f"{HOUSE_FILE} already exists. Skipping creation.")
         return
-    
-    # Load city and county data
-    df = load_city_county_to_pandas()
-
-    # Prepare sample house data
-    house_data: List[Dict[str, Any]] = []
-    prices = [1000, 2000, 3000]  # Prices in tens of millions
-    house_id = 1  # Initialize a unique ID for each house
-
-    for _, row in df.iterrows():
-        for price in prices:
-            house_data.append({
-                "City": row["CityName"],
-                "District": row["AreaName"],
-                "Price": price,
-                "CaseName": f"house_{house_id}"  # Generate unique house name with ID
-            })
-            house_id += 1  # Increment ID for each house
 
-    # Save the generated data to house.json
-    with HOUSE_FILE.open("w", encoding="utf-8") as f:
-        json.dump(house_data, f, ensure_ascii=False, indent=4)
-    
+    # 3 fixed prices (tens of millions) per district, house_1, house_2, ... in district order
+    write_house_data(generate_house_chunks(listings_per_district=3, distribution="fixed"), HOUSE_FILE, "json")
+
     print(f"House sample data created and saved to {HOUSE_FILE}")
 
+# Generate synthetic house records function
+def generate_house_records(total: int, seed: int = 0, price_range: Tuple[int, int] = (100, 10000)) -> Iterator[Dict[str, Any]]:
+    """
+    Yield `total` synthetic houses as dicts, spread evenly over every (City, District),
+    with uniformly random prices in `price_range` (tens of millions).
+    """
+    for chunk in generate_house_chunks(total=total, distribution="uniform", seed=seed, price_range=price_range):
+        yield from chunk[HOUSE_COLUMNS].to_dict("records")
+
 # Run the function if executed as a script
 if __name__ == "__main__":
-    create_house_sample()
+    parser = argparse.ArgumentParser(description="Create data/house.json, or stream a synthetic catalog of any size to --output.")
+    parser.add_argument("--output", type=Path, default=None, help="file to generate, e.g. data/house_10m.jsonl")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="defaults to the --output suffix")
+    parser.add_argument("--listings-per-district", type=int, default=3)
+    parser.add_argument("--total", type=int, default=None, help="total houses spread evenly over all districts, overrides --listings-per-district")
+    parser.add_argument("--distribution", choices=PRICE_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--price-range", type=int, nargs=2, default=[100, 10000], metavar=("LOW", "HIGH"))
+    parser.add_argument("--lognormal-sigma", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.output is None:
+        create_house_sample()
+    else:
+        fmt = args.format or FORMAT_SUFFIXES.get(args.output.suffix)
+        if fmt is None:
+            parser.error(f"cannot infer the format of {args.output.name}, pass --format")
+        chunks = generate_house_chunks(
+            listings_per_district=args.listings_per_district,
+            total=args.total,
+            distribution=args.distribution,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            price_range=tuple(args.price_range),
+            lognormal_sigma=args.lognormal_sigma
+        )
+        write_house_data(chunks, args.output, fmt)
@@ -2,6 +2,7 @@ from pathlib import Path
 import psycopg2
 from dotenv import load_dotenv
 import os
+import sys
 from datetime import datetime
 
 # Load environment variables
@@ -10,29 +11,30 @@ ROOT = FILE.parents[1]
 load_dotenv(ROOT / '.env')
 SQL_URL = os.getenv("SQL_URL")
 
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.postgresql_pool import get_pool
+
 def postgres_test():
     """Test connection to PostgreSQL."""
     try:
-        conn = psycopg2.connect(SQL_URL)
-        print(conn)
-        print(type(conn))
-        print("Connected to the PostgreSQL database")
-        conn.close()
+        with get_pool().connection() as conn:
+            print(conn)
+            print(type(conn))
+            print("Connected to the PostgreSQL database")
     except (Exception, psycopg2.Error) as error:
         print(f"Error connecting to PostgreSQL: {error}")
 
 def table_exists(table_name):
     """Check if a table exists in the database."""
     try:
-        conn = psycopg2.connect(SQL_URL)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT EXISTS (SELECT FROM pg_tables WHERE tablename=%s);", 
-            (table_name.lower(),)
-        )
-        exists = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT EXISTS (SELECT FROM pg_tables WHERE tablename=%s);", 
+                (table_name.lower(),)
+            )
+            exists = cursor.fetchone()[0]
+            cursor.close()
         return exists
     except (Exception, psycopg2.Error) as error:
         print(f"Error checking if table exists: {error}")
@@ -42,60 +44,94 @@ def create_table():
     """Create UserMessage and AgentMessage tables if they do not exist."""
     try:
         if not table_exists("usermessage"):
-            conn = psycopg2.connect(SQL_URL)
-            cursor = conn.cursor()
-
-            create_user_table_query = """
-                CREATE TABLE IF NOT EXISTS UserMessage (
-                    user_id VARCHAR(40),
-                    user_message VARCHAR(500),
-                    timestamp TIMESTAMP   
-                );
-            """
-            cursor.execute(create_user_table_query)
-
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+
+                create_user_table_query = """
+                    CREATE TABLE IF NOT EXISTS UserMessage (
+                        user_id VARCHAR(40),
+                        user_message TEXT,
+                        timestamp TIMESTAMP,
+                        turn_id VARCHAR(32)
+                    );
+                """
+                cursor.execute(create_user_table_query)
+
+                conn.commit()
+                cursor.close()
             print("UserMessage table created successfully.")
         else:
             print("UserMessage table already exists.")
 
         if not table_exists("agentmessage"):
-            conn = psycopg2.connect(SQL_URL)
-            cursor = conn.cursor()
-
-            create_agent_table_query = """
-                CREATE TABLE IF NOT EXISTS AgentMessage (
-                    user_id VARCHAR(40),
-                    agent_message VARCHAR(500),
-                    timestamp TIMESTAMP   
-                );
-            """
-            cursor.execute(create_agent_table_query)
-
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+
+                create_agent_table_query = """
+                    CREATE TABLE IF NOT EXISTS AgentMessage (
+                        user_id VARCHAR(40),
+                        agent_message TEXT,
+                        timestamp TIMESTAMP,
+                        turn_id VARCHAR(32)
+                    );
+                """
+                cursor.execute(create_agent_table_query)
+
+                conn.commit()
+                cursor.close()
             print("AgentMessage table created successfully.")
         else:
             print("AgentMessage table already exists.")
+
+        create_indexes()
     except (Exception, psycopg2.Error) as error:
         print(f"Error creating tables: {error}")
 
+def create_indexes():
+    """
+    Add the turn id and the history lookup indexes, also to tables created before they existed,
+    and widen the message columns of older tables to TEXT.
+
+    A turn id links one user message to its agent answer. Rows written before
+    the column existed get md5(user_id || timestamp), which is identical for
+    both halves of a turn.
+    """
+    migration_queries = [
+        "ALTER TABLE usermessage ADD COLUMN IF NOT EXISTS turn_id VARCHAR(32);",
+        "ALTER TABLE agentmessage ADD COLUMN IF NOT EXISTS turn_id VARCHAR(32);",
+        # Answers longer than 500 characters used to be rejected, VARCHAR -> TEXT needs no table rewrite
+        "ALTER TABLE usermessage ALTER COLUMN user_message TYPE TEXT;",
+        "ALTER TABLE agentmessage ALTER COLUMN agent_message TYPE TEXT;",
+        "UPDATE usermessage SET turn_id = md5(user_id || timestamp::text) WHERE turn_id IS NULL;",
+        "UPDATE agentmessage SET turn_id = md5(user_id || timestamp::text) WHERE turn_id IS NULL;",
+        # Latest turns of a user: index range scan instead of a sort over the whole table
+        "CREATE INDEX IF NOT EXISTS usermessage_user_id_timestamp_idx ON usermessage (user_id, timestamp DESC);",
+        "CREATE INDEX IF NOT EXISTS agentmessage_user_id_timestamp_idx ON agentmessage (user_id, timestamp DESC);",
+        "CREATE INDEX IF NOT EXISTS agentmessage_turn_id_idx ON agentmessage (turn_id);",
+    ]
+    try:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            for query in migration_queries:
+                cursor.execute(query)
+            conn.commit()
+            cursor.close()
+        print("Message indexes created successfully.")
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error creating indexes: {error}")
+
 def show_db_table():
     """Show all tables in the database."""
     try:
-        conn = psycopg2.connect(SQL_URL)
-        cursor = conn.cursor()
-        show_query = "SELECT tablename FROM pg_catalog.pg_tables WHERE schemaname='public';"
-        cursor.execute(show_query)
-        tables = cursor.fetchall()
-        print("Tables in the database:")
-        for table in tables:
-            print(table[0])
-        cursor.close()
-        conn.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            show_query = "SELECT tablename FROM pg_catalog.pg_tables WHERE schemaname='public';"
+            cursor.execute(show_query)
+            tables = cursor.fetchall()
+            print("Tables in the database:")
+            for table in tables:
+                print(table[0])
+            cursor.close()
     except (Exception, psycopg2.Error) as error:
         print(f"Error showing tables: {error}")
 
@@ -104,21 +140,20 @@ def insert_test():
     curr_dt = datetime.now()
     timestamp = int(round(curr_dt.timestamp()))
     try:
-        conn = psycopg2.connect(SQL_URL)
-        cursor = conn.cursor()
-
-        insert_sql = '''
-            INSERT INTO usermessage(user_id, user_message, timestamp)
-            VALUES ('useridtest123451', 'Goodbye world', %s)
-            RETURNING *;
-        '''
-        timestamp_dt = datetime.fromtimestamp(timestamp)
-        cursor.execute(insert_sql, (timestamp_dt,))
-        conn.commit()
-
-        print(cursor.fetchall())
-        cursor.close()
-        conn.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+
+            insert_sql = '''
+                INSERT INTO usermessage(user_id, user_message, timestamp)
+                VALUES ('useridtest123451', 'Goodbye world', %s)
+                RETURNING *;
+            '''
+            timestamp_dt = datetime.fromtimestamp(timestamp)
+            cursor.execute(insert_sql, (timestamp_dt,))
+            conn.commit()
+
+            print(cursor.fetchall())
+            cursor.close()
         print("PostgreSQL Inserting Success")
     except (Exception, psycopg2.Error) as error:
         print(f"Error PostgreSQL Inserting Fail: {error}")
@@ -138,15 +173,14 @@ def get_user_messages(user_id: str):
             AND usermessage.timestamp = agentmessage.timestamp;
     '''
     try:
-        conn = psycopg2.connect(SQL_URL)
-        cursor = conn.cursor()
-        cursor.execute(sql_join, user_target)
-        data_list = cursor.fetchall()
-        for user_row in data_list:
-            print(user_row[0])
-            print(user_row[1])
-        cursor.close()
-        conn.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql_join, user_target)
+            data_list = cursor.fetchall()
+            for user_row in data_list:
+                print(user_row[0])
+                print(user_row[1])
+            cursor.close()
         print("PostgreSQL Selecting Success")
     except (Exception, psycopg2.Error) as error:
         print(f"Error PostgreSQL Selecting Fail: {error}")
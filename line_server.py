@@ -0,0 +1,304 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parent
+
+load_dotenv(ROOT / '.env')
+
+from functions.tracing import metrics_snapshot, render_openmetrics, span, trace_request
+
+# Optional, when set the X-Line-Signature header of every webhook call is verified
+LINE_CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
+# Number of agent turns processed concurrently
+LINE_SERVER_WORKERS = int(os.getenv("LINE_SERVER_WORKERS", "8"))
+# Queued messages above this depth are rejected with 429
+LINE_SERVER_MAX_QUEUE = int(os.getenv("LINE_SERVER_MAX_QUEUE", "256"))
+# Seconds to wait for queued messages on shutdown
+LINE_SERVER_DRAIN_TIMEOUT = float(os.getenv("LINE_SERVER_DRAIN_TIMEOUT", "30"))
+# Sent once a streamed turn starts calling tools, empty disables the acknowledgement
+LINE_ACK_MESSAGE = os.getenv("LINE_ACK_MESSAGE", "收到，正在為您查詢，請稍候…")
+
+Handler = Callable[[str, str, int], Awaitable[str]]
+ReplyHandler = Callable[[Dict[str, Any], str], Awaitable[None]]
+StreamHandler = Callable[[str, str, int], AsyncIterator[Dict[str, Any]]]
+
+
+async def print_reply(message: Dict[str, Any], answer: str) -> None:
+    """Default reply hook, plug the LINE Messaging API reply call in here."""
+    print(f"Agent -> {message['user_id']}: {answer}")
+
+
+async def print_ack(message: Dict[str, Any], text: str) -> None:
+    """
+    Default acknowledgement hook.
+
+    A LINE reply token can only be used once, so with the Messaging API the
+    acknowledgement goes out with `message["reply_token"]` and the reply hook
+    sends the final answer as a push message.
+    """
+    print(f"Agent ack -> {message['user_id']}: {text}")
+
+
+class LineWebhookServer:
+    """
+    ASGI front-end that runs agent turns for LINE webhook events.
+
+    Incoming text messages are put on a bounded queue and answered by a fixed
+    pool of worker tasks. A per-user lock keeps one user's messages in order
+    while different users are served in parallel. When the queue is full the
+    webhook answers 429, and on shutdown the queue is drained before exiting.
+
+    With a `stream_handler` (the default is astream_line_agent) turns are
+    streamed: as soon as the agent calls its first tool the `ack` hook sends
+    `ack_message`, and the final answer follows through `reply`.
+    """
+
+    def __init__(
+        self,
+        handler: Optional[Handler] = None,
+        reply: ReplyHandler = print_reply,
+        workers: int = LINE_SERVER_WORKERS,
+        max_queue: int = LINE_SERVER_MAX_QUEUE,
+        drain_timeout: float = LINE_SERVER_DRAIN_TIMEOUT,
+        channel_secret: Optional[str] = LINE_CHANNEL_SECRET,
+        shutdown_hooks: Optional[List[Callable[[], None]]] = None,
+        stream_handler: Optional[StreamHandler] = None,
+        ack: ReplyHandler = print_ack,
+        ack_message: str = LINE_ACK_MESSAGE
+    ):
+        if handler is None and stream_handler is None:
+            from agent_main import astream_line_agent
+            from functions.message_writer import flush_chat_messages
+            stream_handler = astream_line_agent
+            # Persist the write-behind chat turns once the queue is drained
+            shutdown_hooks = [flush_chat_messages] if shutdown_hooks is None else shutdown_hooks
+
+        self.handler = handler
+        self.reply = reply
+        self.stream_handler = stream_handler
+        self.ack = ack
+        self.ack_message = ack_message
+        self.workers = workers
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.channel_secret = channel_secret
+        self.shutdown_hooks = shutdown_hooks or []
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.acknowledged = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._user_locks: Dict[str, List[Any]] = {}  # user_id -> [lock, holders]
+        self._accepting = False
+
+    async def start(self) -> None:
+        """Create the queue and spawn the worker tasks on the running loop."""
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._accepting = True
+        print(f"LINE webhook server started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Stop accepting messages, wait for the queued ones, stop the workers and run the shutdown hooks."""
+        self._accepting = False
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"LINE webhook server: {self._queue.qsize()} messages left after drain timeout")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        for hook in self.shutdown_hooks:
+            await asyncio.to_thread(hook)
+        print("LINE webhook server stopped")
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _acquire_user_lock(self, user_id: str) -> asyncio.Lock:
+        entry = self._user_locks.get(user_id)
+        if entry is None:
+            entry = self._user_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_user_lock(self, user_id: str) -> None:
+        entry = self._user_locks[user_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            # Nobody is waiting for this user any more
+            del self._user_locks[user_id]
+
+    async def _worker(self) -> None:
+        while True:
+            message = await self._queue.get()
+            user_id = message["user_id"]
+            # No await between get() and the lock request, so waiters queue up
+            # on the user's lock in the same order the messages arrived
+            lock = self._acquire_user_lock(user_id)
+            try:
+                async with lock:
+                    # One correlation id per LINE message, shared by every span of its turn
+                    with trace_request(), span("line_message"):
+                        if self.stream_handler is not None:
+                            answer = await self._stream_turn(message)
+                        else:
+                            answer = await self.handler(user_id, message["question"], message["timestamp"])
+                        with span("line_reply"):
+                            await self.reply(message, answer)
+                self.processed += 1
+            except Exception as error:
+                self.failed += 1
+                print(f"Error handling message from {user_id}: {error}")
+            finally:
+                self._release_user_lock(user_id)
+                self._queue.task_done()
+
+    async def _stream_turn(self, message: Dict[str, Any]) -> str:
+        """Run a streamed turn, acknowledging it on the first tool call, and return the final answer."""
+        answer = ""
+        ack_task: Optional[asyncio.Task] = None
+        async for event in self.stream_handler(message["user_id"], message["question"], message["timestamp"]):
+            if event["event"] == "tool_start" and ack_task is None and self.ack_message:
+                # Sent alongside the tool calls instead of holding up the stream
+                ack_task = asyncio.create_task(self.ack(message, self.ack_message))
+            elif event["event"] == "final":
+                answer = event["content"]
+
+        if ack_task is not None:
+            # The acknowledgement must be out before the answer, but its failure must not lose the answer
+            [result] = await asyncio.gather(ack_task, return_exceptions=True)
+            if isinstance(result, Exception):
+                print(f"Error acknowledging message from {message['user_id']}: {result}")
+            else:
+                self.acknowledged += 1
+        return answer
+
+    def _verify_signature(self, body: bytes, signature: Optional[str]) -> bool:
+        if not self.channel_secret:
+            return True
+        if signature is None:
+            return False
+        digest = hmac.new(self.channel_secret.encode("utf-8"), body, hashlib.sha256).digest()
+        return hmac.compare_digest(base64.b64encode(digest).decode("utf-8"), signature)
+
+    @staticmethod
+    def parse_events(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Extract the text messages of a LINE webhook payload."""
+        messages = []
+        for event in payload.get("events", []):
+            if event.get("type") != "message" or event.get("message", {}).get("type") != "text":
+                continue
+            messages.append({
+                "user_id": event["source"]["userId"],
+                "question": event["message"]["text"],
+                "timestamp": event.get("timestamp", int(datetime.now().timestamp() * 1000)),
+                "reply_token": event.get("replyToken"),
+            })
+        return messages
+
+    def enqueue(self, messages: List[Dict[str, Any]]) -> int:
+        """Queue messages all-or-nothing, returning the HTTP status for the webhook call."""
+        if not self._accepting:
+            return 503
+        if self._queue.qsize() + len(messages) > self.max_queue:
+            self.rejected += len(messages)
+            return 429
+        for message in messages:
+            self._queue.put_nowait(message)
+        return 200
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "acknowledged": self.acknowledged,
+            "active_users": len(self._user_locks),
+        }
+
+    async def _handle_http(self, scope, receive, send) -> None:
+        method, path = scope["method"], scope["path"]
+
+        if method == "GET" and path == "/health":
+            await self._respond(send, 200, self.stats())
+            return
+        if method == "GET" and path == "/metrics":
+            await self._respond_text(send, 200, render_openmetrics(), "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            return
+        if method == "GET" and path == "/metrics.json":
+            await self._respond(send, 200, metrics_snapshot())
+            return
+        if method != "POST" or path != "/webhook":
+            await self._respond(send, 404, {"error": "not found"})
+            return
+
+        body = b""
+        while True:
+            event = await receive()
+            body += event.get("body", b"")
+            if not event.get("more_body"):
+                break
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        if not self._verify_signature(body, headers.get("x-line-signature")):
+            await self._respond(send, 403, {"error": "invalid signature"})
+            return
+
+        try:
+            messages = self.parse_events(json.loads(body or b"{}"))
+        except (ValueError, KeyError, TypeError) as error:
+            await self._respond(send, 400, {"error": f"invalid payload: {error}"})
+            return
+
+        status = self.enqueue(messages)
+        await self._respond(send, status, {"accepted": len(messages) if status == 200 else 0})
+
+    @staticmethod
+    async def _respond(send, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if status == 429:
+            headers.append((b"retry-after", b"1"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _respond_text(send, status: int, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        headers = [(b"content-type", content_type.encode("latin-1")), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                event = await receive()
+                if event["type"] == "lifespan.startup":
+                    await self.start()
+                    await send({"type": "lifespan.startup.complete"})
+                elif event["type"] == "lifespan.shutdown":
+                    await self.stop()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        elif scope["type"] == "http":
+            await self._handle_http(scope, receive, send)
+
+
+# Run with: uvicorn line_server:app --host 0.0.0.0 --port 8000
+app = LineWebhookServer()
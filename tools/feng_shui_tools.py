@@ -9,7 +9,7 @@ import sys
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[1]
 sys.path.insert(0, str(ROOT))  # for import modules
-from functions.feng_shui_functions import get_fengshui_advice
+from functions.feng_shui_functions import get_fengshui_advice, aget_fengshui_advice
 
 class FengShuiRecommendationInput(BaseModel):
     feng_shui_name: str = Field(
@@ -18,6 +18,7 @@ class FengShuiRecommendationInput(BaseModel):
             此變數 feng_shui_name 是風水類型的名稱需要關鍵字即可不要有其他符號例如 /n，
             一律採用繁體中文輸入，例如對門煞
             記得遇到錯字請自動修正 
+            找不到確切名稱時也可以直接輸入問題描述，例如大門對著廚房
         """
     )
 
@@ -38,5 +39,7 @@ class FengShuiRecommendationTool(BaseTool):
         target = get_fengshui_advice(feng_shui_name)
         return target
 
-    def _arun(self, feng_shui_name: str):
-        raise NotImplementedError("This tool does not support async")
+    async def _arun(self, feng_shui_name: str):
+        # The first call loads and indexes feng_shui.json in a thread, later lookups are in memory
+        target = await aget_fengshui_advice(feng_shui_name)
+        return target
@@ -1,23 +1,32 @@
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
-from typing import Optional, Type, Dict
+from typing import Optional, Type, Dict, List, Literal
 from pathlib import Path
 import sys
 
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[1]  
 sys.path.insert(0, str(ROOT))   # for import modules 
-from functions.real_estate_functions import search_house, user_reserve
+from functions.real_estate_functions import search_house_page, user_reserve, asearch_house_page, auser_reserve, SEARCH_PAGE_SIZE, SEARCH_PAGE_MAX
+
+# 3 到 5 碼的郵遞區號
+ZIP_CODE_PATTERN = r"^\d{3,5}$"
 
 # 描述字典
 descriptions: Dict[str, str] = {
     "base_input": "一律採用繁體中文輸入，這個變數 city_county 是臺灣的縣/市名稱。",
     "full_name_city": "採用完整名稱作為輸入，例如：台中->臺中市、台北->臺北市、雲林->雲林縣。",
     "full_name_district": "這個變數 district 是臺灣的區域名稱，採用完整名稱作為輸入，例如：西區、中正區、大安區。",
+    "city_wide": "使用者沒有指定區域時不要填 district，會直接搜尋整個縣市，不需要逐區呼叫。",
+    "districts": "districts 可一次搜尋同一縣市的多個區域，例如：['中正區', '大安區']，不需要逐區呼叫。",
+    "zip_range": "zip_code_from / zip_code_to 是郵遞區號範圍 (含頭尾)，例如 100 到 116，只給 zip_code_from 時只搜尋該郵遞區號。",
     "font_correction": '記得 "台" 跟 "臺" 是相同意思，但一律採用 "臺" 作為標準，遇到錯字請自動修正為標準輸入。',
     "price_upper": "price_upper_limit 代表預算的金額上限，該變數的單位為萬。",
     "price_lower": "price_lower_limit 代表預算的金額下限，該變數的單位為萬。",
-    "unit_example": "舉例來說：'十萬' -> 10 , '1000萬' -> 1000 , '50000000' -> 5000。"
+    "unit_example": "舉例來說：'十萬' -> 10 , '1000萬' -> 1000 , '50000000' -> 5000。",
+    "paging": f"結果會分頁回傳，limit 是每頁筆數 (預設 {SEARCH_PAGE_SIZE}，最多 {SEARCH_PAGE_MAX})，offset 是略過的筆數。回傳的 total 是符合條件的總數，使用者想看更多時再以 offset 取下一頁。",
+    "sort": "sort 為排序方式：price_asc 由便宜到貴 (預設)，price_desc 由貴到便宜。",
+    "fields": "fields 可只取需要的欄位 (City, District, Price, CaseName)，不填則回傳全部欄位。"
 }
 
 # 定義模型
@@ -27,10 +36,16 @@ class RealEstateSearchInput(BaseModel):
         description=f"{descriptions['base_input']}\n{descriptions['full_name_city']}\n{descriptions['font_correction']}"
     )
     
-    district: str = Field(
+    district: Optional[str] = Field(
         None,
-        description=f"{descriptions['full_name_district']}\n{descriptions['font_correction']}"
+        description=f"{descriptions['full_name_district']}\n{descriptions['font_correction']}\n{descriptions['city_wide']}"
     )
+
+    districts: Optional[List[str]] = Field(None, description=descriptions['districts'])
+
+    zip_code_from: Optional[str] = Field(None, pattern=ZIP_CODE_PATTERN, description=descriptions['zip_range'])
+
+    zip_code_to: Optional[str] = Field(None, pattern=ZIP_CODE_PATTERN, description=descriptions['zip_range'])
  
     price_upper_limit: Optional[int] = Field(
         None,
@@ -42,6 +57,14 @@ class RealEstateSearchInput(BaseModel):
         description=f"{descriptions['price_lower']}\n{descriptions['unit_example']}\n如果對方有提供可以選擇放入。"
     )
 
+    limit: Optional[int] = Field(None, ge=1, le=SEARCH_PAGE_MAX, description=descriptions['paging'])
+
+    offset: int = Field(0, ge=0, description=descriptions['paging'])
+
+    sort: Literal["price_asc", "price_desc"] = Field("price_asc", description=descriptions['sort'])
+
+    fields: Optional[List[Literal["City", "District", "Price", "CaseName"]]] = Field(None, description=descriptions['fields'])
+
 class RealEstateSearchTool(BaseTool):
     name: str = 'search_house'  # 確保這裡有類型註釋 
     description: str = "這是一個幫助使用者找到屬於自己想要的房屋資訊的程式。 (請不要詢問區域與價格以外的條件，台灣地區皆屬範圍內)"  # 提供類型註釋 
@@ -49,12 +72,20 @@ class RealEstateSearchTool(BaseTool):
     args_schema: Type[BaseModel] = RealEstateSearchInput
     
 
-    def _run(self, city_county: str, district: str = None, price_upper_limit: Optional[int] = None, price_lower_limit: Optional[int] = None):
-        target = search_house(city_county, district, price_upper_limit, price_lower_limit)
+    # Only one page of matches goes back into the model context, with the total count
+    def _run(self, city_county: str, district: str = None, price_upper_limit: Optional[int] = None, price_lower_limit: Optional[int] = None,
+             limit: Optional[int] = None, offset: int = 0, sort: str = "price_asc", fields: Optional[List[str]] = None,
+             districts: Optional[List[str]] = None, zip_code_from: Optional[str] = None, zip_code_to: Optional[str] = None):
+        zip_range = (zip_code_from, zip_code_to or zip_code_from) if zip_code_from else None
+        target = search_house_page(city_county, district, price_upper_limit, price_lower_limit, offset, limit, sort, fields, districts, zip_range)
         return target
 
-    def _arun(self, city_county: str, district: str, price_upper_limit: Optional[int], price_lower_limit: Optional[int]):
-        raise NotImplementedError("This tool does not support async")
+    async def _arun(self, city_county: str, district: str = None, price_upper_limit: Optional[int] = None, price_lower_limit: Optional[int] = None,
+                    limit: Optional[int] = None, offset: int = 0, sort: str = "price_asc", fields: Optional[List[str]] = None,
+                    districts: Optional[List[str]] = None, zip_code_from: Optional[str] = None, zip_code_to: Optional[str] = None):
+        zip_range = (zip_code_from, zip_code_to or zip_code_from) if zip_code_from else None
+        target = await asearch_house_page(city_county, district, price_upper_limit, price_lower_limit, offset, limit, sort, fields, districts, zip_range)
+        return target
 
 
 class RealEstateReserveInput(BaseModel):
@@ -69,8 +100,9 @@ class RealEstateReserveTool(BaseTool):
 
     args_schema: Type[BaseModel] = RealEstateReserveInput
 
-    def _run(self, date: str, name: str, phone: str, other_des: Optional[str] = None) -> str:
-        return user_reserve(date, name, phone, description=other_des)
+    # Argument names must match RealEstateReserveInput, the tool passes them as keywords
+    def _run(self, date: str, name: str, phone: str, description: Optional[str] = None) -> str:
+        return user_reserve(date, name, phone, description=description)
 
-    def _arun(self, date: str, name: str, phone: str, other_des: Optional[str] = None):
-        raise NotImplementedError("This tool does not support async")
+    async def _arun(self, date: str, name: str, phone: str, description: Optional[str] = None) -> str:
+        return await auser_reserve(date, name, phone, description=description)
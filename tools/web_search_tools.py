@@ -0,0 +1,39 @@
+# File: tools/web_search_tools.py
+
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+from typing import Any, Type
+from pathlib import Path
+import sys
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+sys.path.insert(0, str(ROOT))  # for import modules
+from functions.web_search_cache import get_web_search_cache
+
+class WebSearchInput(BaseModel):
+    query: str = Field(..., description="search query to look up")
+
+class CachedWebSearchTool(BaseTool):
+    """
+    Wraps a web search tool (e.g. TavilySearchResults) with WebSearchCache.
+
+    Keeps the name and description of the wrapped tool, so the model sees the
+    same tool; identical queries within the cache TTL never reach the network.
+    """
+
+    name: str = "tavily_search_results_json"
+    description: str = "A search engine. Input should be a search query."
+    args_schema: Type[BaseModel] = WebSearchInput
+    inner: Any = None
+    cache: Any = None
+
+    @classmethod
+    def wrap(cls, inner: BaseTool, cache: Any = None) -> "CachedWebSearchTool":
+        return cls(name=inner.name, description=inner.description, inner=inner, cache=cache or get_web_search_cache())
+
+    def _run(self, query: str):
+        return self.cache.get_or_search(query, lambda: self.inner.invoke({"query": query}))
+
+    async def _arun(self, query: str):
+        return await self.cache.aget_or_search(query, lambda: self.inner.ainvoke({"query": query}))